@@ -0,0 +1,226 @@
+"""Move closed reports out of the hot ``reports`` table into ``reports_archive``
+
+Resolved and Rejected reports not updated for ``--older-than`` days are
+moved by walking the table in primary key order, ``--batch-size`` rows at
+a time, from the first eligible id to the last. Each batch is its own
+short transaction that locks only the rows it moves, with a pause after
+every batch so interactive queries keep the database. Every batch
+re-checks its rows, so the job can be stopped at any point and run again;
+the next run starts at the first report still eligible.
+
+An archived report keeps its id. On engines without FULLTEXT its keyword
+postings move to the archive's own index, its photos stay attached, and
+the statistics counters, which count archived reports too, do not change.
+Searches and the detail view look in the archive only when the hot table
+has no match, a user's own list shows both, and changing an archived
+report's status moves it back first (``restore``).
+
+    python archive.py --older-than 180 --batch-size 500 --pause 0.1
+    python archive.py --dry-run
+"""
+
+import sys
+import time
+import logging
+import argparse
+import datetime
+
+import text_index
+
+CLOSED_STATUSES = ("Resolved", "Rejected")
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 180
+
+# Reports examined per transaction
+DEFAULT_BATCH_SIZE = 500
+
+# Seconds to sleep after each batch that archived any
+DEFAULT_PAUSE = 0.1
+
+# Columns copied between reports and reports_archive
+ARCHIVE_COLUMNS = ("id", "user_id", "issue_type", "severity", "description", "location", "status",
+                   "created_at", "updated_at", "ticket", "latitude", "longitude", "geohash", "duplicate_of")
+
+_CLOSED = ", ".join(["%s"] * len(CLOSED_STATUSES))
+
+
+def cutoff_for(days, now=None):
+    """Return the updated_at before which a closed report is archived"""
+    if days < 0:
+        raise ValueError("The archive age must not be negative")
+    return (now or datetime.datetime.now()).replace(microsecond=0) - datetime.timedelta(days=days)
+
+
+def count_eligible(db, cutoff):
+    """Return how many reports a run with ``cutoff`` would archive"""
+    with db.cursor() as cursor:
+        db.execute(
+            cursor,
+            f"SELECT COUNT(*) FROM reports WHERE status IN ({_CLOSED}) AND updated_at < %s",
+            CLOSED_STATUSES + (cutoff,)
+        )
+        return cursor.fetchone()[0]
+
+
+def eligible_range(db, cutoff):
+    """Return the lowest and highest id a run with ``cutoff`` would archive, or (None, None)"""
+    with db.cursor() as cursor:
+        db.execute(
+            cursor,
+            f"SELECT MIN(id), MAX(id) FROM reports WHERE status IN ({_CLOSED}) AND updated_at < %s",
+            CLOSED_STATUSES + (cutoff,)
+        )
+        return tuple(cursor.fetchone())
+
+
+def count_archived(db):
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT COUNT(*) FROM reports_archive")
+        return cursor.fetchone()[0]
+
+
+def _move(db, cursor, report_ids, source, target, condition="", params=()):
+    """Copy the listed rows of ``source`` that still meet ``condition`` into ``target``,
+    delete them from ``source`` and return their ids
+
+    The rows are locked first where the engine supports it, so nothing can
+    change them between the copy and the delete.
+    """
+    placeholders = ", ".join(["%s"] * len(report_ids))
+    where = f"id IN ({placeholders})" + (f" AND {condition}" if condition else "")
+    db.execute(
+        cursor,
+        f"SELECT id, description, location FROM {source.documents} WHERE {where} ORDER BY id" + db.backend.lock_rows,
+        list(report_ids) + list(params)
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+    moved = [row[0] for row in rows]
+    placeholders = ", ".join(["%s"] * len(moved))
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    db.execute(
+        cursor,
+        f"INSERT INTO {target.documents} ({columns}) SELECT {columns} FROM {source.documents} WHERE id IN ({placeholders})",
+        moved
+    )
+    if not db.backend.native_fulltext:
+        for report_id, description, location in rows:
+            text_index.move_document(db, cursor, report_id, description, location, source, target)
+    # Duplicate signatures go with the row; closed reports have none anyway
+    db.execute(cursor, f"DELETE FROM {source.documents} WHERE id IN ({placeholders})", moved)
+    return moved
+
+
+def archive_batch(db, cutoff, after_id=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Examine the ``batch_size`` reports after ``after_id`` and archive the eligible ones in one transaction
+
+    Returns (ids archived, last id examined), or (None, after_id) at the
+    end of the table.
+    """
+    with db.cursor(commit=True) as cursor:
+        # A plain primary key range, read without locks: filtering in SQL would
+        # let the engine pick the status index and sort every closed report
+        db.execute(
+            cursor,
+            "SELECT id, status, updated_at FROM reports WHERE id > %s ORDER BY id LIMIT %s",
+            (after_id, batch_size)
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return None, after_id
+        candidates = [report_id for report_id, status, updated_at in rows
+                      if status in CLOSED_STATUSES and updated_at is not None and updated_at < cutoff]
+        moved = []
+        if candidates:
+            moved = _move(db, cursor, candidates, text_index.REPORTS, text_index.ARCHIVE,
+                          f"status IN ({_CLOSED}) AND updated_at < %s", CLOSED_STATUSES + (cutoff,))
+    for report_id in moved:
+        db.report_cache.invalidate(report_id)
+    return moved, rows[-1][0]
+
+
+def archive_closed(db, older_than_days=DEFAULT_ARCHIVE_AFTER_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                   pause=DEFAULT_PAUSE, max_reports=None, on_batch=None):
+    """Archive closed reports not updated for ``older_than_days`` and return how many moved
+
+    Only the ids between the first and last eligible report are examined,
+    so a run resumes where a stopped one left off. ``on_batch(archived,
+    seconds)`` is called after each committed batch that archived any.
+    """
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    cutoff = cutoff_for(older_than_days)
+    started = time.perf_counter()
+    archived = 0
+    first_id, end_id = eligible_range(db, cutoff)
+    last_id = first_id - 1 if first_id is not None else None
+    while last_id is not None and last_id < end_id and (max_reports is None or archived < max_reports):
+        size = batch_size if max_reports is None else min(batch_size, max_reports - archived)
+        moved, last_id = archive_batch(db, cutoff, last_id, size)
+        if moved is None:
+            break
+        archived += len(moved)
+        if moved and on_batch:
+            on_batch(archived, time.perf_counter() - started)
+        if pause:
+            time.sleep(pause)
+    logging.info(f"Archived {archived} reports closed before {cutoff} in {time.perf_counter() - started:.1f}s")
+    return archived
+
+
+def restore(db, cursor, report_ids):
+    """Move archived reports back into ``reports`` inside the caller's transaction and return their ids"""
+    return _move(db, cursor, report_ids, text_index.ARCHIVE, text_index.REPORTS)
+
+
+def unlink_attachments(db):
+    """Drop the foreign key from attachments to reports (MySQL names it when the table is created)"""
+    with db.cursor(commit=True) as cursor:
+        db.execute(
+            cursor,
+            """
+            SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'attachments'
+              AND COLUMN_NAME = 'report_id' AND REFERENCED_TABLE_NAME = 'reports'
+            """
+        )
+        for (name,) in cursor.fetchall():
+            db.execute(cursor, f"ALTER TABLE attachments DROP FOREIGN KEY {name}")
+
+
+def print_progress(archived, seconds):
+    print(f"{archived:>10,} reports archived  {seconds:8.1f}s", file=sys.stderr)
+
+
+def main(argv=None):
+    """Command line entry point for the archival job"""
+    import index
+
+    parser = argparse.ArgumentParser(description="Move old closed reports into reports_archive")
+    parser.add_argument("--older-than", type=int, default=index.ARCHIVE_AFTER_DAYS, metavar="DAYS",
+                        help="archive reports closed and unchanged for this many days (default: INFRA_ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="reports moved per transaction")
+    parser.add_argument("--pause", type=float, default=DEFAULT_PAUSE, help="seconds to sleep between batches")
+    parser.add_argument("--max-reports", type=int, help="stop after archiving this many")
+    parser.add_argument("--dry-run", action="store_true", help="only count the reports that would be archived")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    db = index.get_db()
+    try:
+        if args.dry_run:
+            cutoff = cutoff_for(args.older_than)
+            print(f"{count_eligible(db, cutoff)} reports closed before {cutoff} would be archived; "
+                  f"{count_archived(db)} already are.")
+        else:
+            archived = archive_closed(db, args.older_than, args.batch_size, args.pause, args.max_reports,
+                                      print_progress)
+            print(f"Archived {archived} reports.")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
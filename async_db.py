@@ -0,0 +1,158 @@
+"""Asynchronous access to the repositories for overlapping independent queries
+
+Neither mysql.connector nor sqlite3 has a native asyncio interface, so
+``AsyncDatabase`` runs the existing blocking repository methods on a thread
+pool sized to the connection pool. Each call borrows its own pooled
+connection, so calls gathered together run on separate connections at the
+same time.
+
+    adb = AsyncDatabase(db)
+    reports = adb.repository(ReportRepository)
+    page, counts = await asyncio.gather(reports.page_for_user(7), reports.count_for_user(7))
+
+``python async_db.py`` times the statistics aggregates and the per-user
+overview sequentially and concurrently against the configured database.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import functools
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import DEFAULT_PAGE_SIZE, CounterRepository, ReportRepository, UserRepository
+
+
+class AsyncDatabase:
+    """Runs blocking database calls on a thread pool as awaitables"""
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or db.pool.size, thread_name_prefix="async-db")
+
+    async def run(self, function, *args, **kwargs):
+        """Await ``function(*args, **kwargs)`` run on a worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args, **kwargs))
+
+    def repository(self, repository_class):
+        """Wrap a repository class so its methods return awaitables"""
+        return AsyncRepository(self, repository_class(self.db))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+class AsyncRepository:
+    """Exposes every public method of a repository as a coroutine function"""
+
+    def __init__(self, adb, repository):
+        self._adb = adb
+        self._repository = repository
+
+    def __getattr__(self, name):
+        method = getattr(self._repository, name)
+        if name.startswith("_") or not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self._adb.run(method, *args, **kwargs)
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+
+async def live_statistics(adb):
+    """Run every counter aggregate concurrently; same result shape as CounterRepository.actual
+
+    Each aggregate sees its own snapshot, so use CounterRepository.reconcile
+    when the figures must agree with each other exactly.
+    """
+    counters = CounterRepository(adb.db)
+    statements = counters.aggregate_statements()
+    results = await asyncio.gather(*(adb.run(counters.aggregate, sql) for _, sql in statements))
+    counts = {}
+    for (dimension, _), result in zip(statements, results):
+        counts.setdefault(dimension, {}).update(result)
+    return counts
+
+
+async def user_overview(adb, user_id, page_size=DEFAULT_PAGE_SIZE, **position):
+    """Fetch a user's page of reports and their per-status counts concurrently"""
+    reports = adb.repository(ReportRepository)
+    return await asyncio.gather(reports.page_for_user(user_id, page_size, **position), reports.count_for_user(user_id))
+
+
+def sequential_statistics(db):
+    counters = CounterRepository(db)
+    counts = {}
+    for dimension, sql in counters.aggregate_statements():
+        counts.setdefault(dimension, {}).update(counters.aggregate(sql))
+    return counts
+
+
+def sequential_overview(db, user_id, page_size=DEFAULT_PAGE_SIZE):
+    reports = ReportRepository(db)
+    return reports.page_for_user(user_id, page_size), reports.count_for_user(user_id)
+
+
+def _median_ms(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def compare(db, user_id, repeat=20):
+    """Return [(name, sequential_ms, concurrent_ms)] medians for each scenario"""
+    adb = AsyncDatabase(db)
+    try:
+        scenarios = [
+            ("statistics aggregates",
+             lambda: sequential_statistics(db),
+             lambda: asyncio.run(live_statistics(adb))),
+            ("user reports + counts",
+             lambda: sequential_overview(db, user_id),
+             lambda: asyncio.run(user_overview(adb, user_id))),
+        ]
+        results = []
+        for name, sequential, concurrent in scenarios:
+            # Warm the pool and the page cache before timing
+            sequential()
+            concurrent()
+            results.append((name, _median_ms(sequential, repeat), _median_ms(concurrent, repeat)))
+        return results
+    finally:
+        adb.close()
+
+
+def main(argv=None):
+    """Command line entry point for the sequential vs concurrent comparison"""
+    import index
+
+    parser = argparse.ArgumentParser(description="Time independent queries run sequentially and concurrently")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per scenario (default: 20)")
+    parser.add_argument("--username", default="admin", help="user for the per-user overview (default: admin)")
+    args = parser.parse_args(argv)
+
+    db = index.get_db()
+    user_id = UserRepository(db).find_id(args.username)
+    if user_id is None:
+        parser.error(f"Unknown username '{args.username}'")
+    # Concurrency only pays off when queries wait on the server or there are
+    # spare cores; CPU-bound embedded queries on one core just interleave
+    print(f"{db.backend.name} backend, pool size {db.pool.size}, {os.cpu_count()} CPU(s), median of {args.repeat}")
+    print(f"{'scenario':<24}{'sequential':>12}{'concurrent':>12}{'speedup':>9}")
+    for name, sequential_ms, concurrent_ms in compare(db, user_id, args.repeat):
+        print(f"{name:<24}{sequential_ms:>10.2f}ms{concurrent_ms:>10.2f}ms{sequential_ms / concurrent_ms:>8.2f}x")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
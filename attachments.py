@@ -0,0 +1,226 @@
+"""Content-addressed store for photos attached to reports
+
+Only metadata lives in the database (the ``attachments`` table); the bytes
+live under a local directory, one file per distinct content, named by its
+SHA-256 and sharded two levels deep so no directory grows too large:
+
+    <root>/objects/3f/a2/3fa2...e9      the photo
+    <root>/thumbs/3f/a2/3fa2...e9-256   its 256 px thumbnail, made on first request
+    <root>/tmp/                         uploads in progress
+
+Uploads are written and hashed one chunk at a time into ``tmp`` and renamed
+into place when complete, so a photo is never held in memory whole and a
+half-written one is never visible. Sending the same photo twice stores it
+once. The rename happens inside the transaction that records the photo
+(``AttachmentRepository.add(..., place=upload.place)``), and a file is
+deleted only inside the transaction that removes its last row, so an upload
+of the same content can never end up pointing at a deleted file. Reads map the file into memory and hand out slices of the mapping,
+so serving a photo copies nothing into the Python heap. Report queries never
+touch this store.
+
+Thumbnails need Pillow; without it ``thumbnail`` returns None.
+"""
+
+import os
+import mmap
+import hashlib
+import tempfile
+
+try:
+    from PIL import Image # type: ignore
+except ImportError:  # thumbnails are optional
+    Image = None
+
+CHUNK_SIZE = 64 * 1024
+
+# Largest photo accepted
+MAX_ATTACHMENT_BYTES = 10 * 1024 * 1024
+
+# Longest side of a thumbnail in pixels
+THUMBNAIL_SIZE = 256
+
+# Leading bytes of the image formats accepted, and their content types
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+class AttachmentError(ValueError):
+    """Raised for an upload that is empty, too large or not a supported image"""
+
+
+def sniff_content_type(head):
+    """Return the content type of a file from its first bytes, or None if not a supported image"""
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class AttachmentWriter:
+    """One upload in progress: ``write`` chunks, ``commit``, then ``place`` it in the store
+
+    Used as a context manager, whatever was not placed is discarded on exit.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self.sha256 = None
+        self.content_type = None
+        self._head = b""
+        self._hash = hashlib.sha256()
+        descriptor, self._temp_path = tempfile.mkstemp(dir=store.temp_dir)
+        self._file = os.fdopen(descriptor, "wb")
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.store.max_bytes:
+            raise AttachmentError(f"Photos may be at most {self.store.max_bytes // (1024 * 1024)} MiB")
+        if len(self._head) < 16:
+            self._head += bytes(chunk[:16 - len(self._head)])
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self):
+        """Finish and check the upload and return (sha256, size, content_type); ``place`` stores it"""
+        if not self.size:
+            self.abort()
+            raise AttachmentError("The upload is empty")
+        content_type = sniff_content_type(self._head)
+        if content_type is None:
+            self.abort()
+            raise AttachmentError("Only JPEG, PNG, GIF and WebP photos can be attached")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self.sha256, self.content_type = self._hash.hexdigest(), content_type
+        return self.sha256, self.size, content_type
+
+    def place(self):
+        """Move a committed upload into the store, or drop it if the same content is already there"""
+        path = self.store.path(self.sha256)
+        if os.path.exists(path):
+            os.unlink(self._temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._temp_path, path)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self._temp_path):
+            os.unlink(self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.abort()
+        return False
+
+
+class AttachmentStore:
+    """Photo files on local disk, addressed by the SHA-256 of their content"""
+
+    def __init__(self, root, max_bytes=MAX_ATTACHMENT_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.temp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def _sharded(self, kind, name):
+        return os.path.join(self.root, kind, name[:2], name[2:4], name)
+
+    def path(self, name, kind="objects"):
+        """Path of a stored photo, or with ``kind="thumbs"`` of a thumbnail"""
+        return self._sharded(kind, name)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def writer(self):
+        """Start an upload to feed chunk by chunk"""
+        return AttachmentWriter(self)
+
+    def put(self, stream, chunk_size=CHUNK_SIZE):
+        """Read everything from a binary file object into a new upload and return it committed"""
+        writer = self.writer()
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+        return writer
+
+    def chunks(self, name, chunk_size=CHUNK_SIZE, kind="objects"):
+        """Yield a stored photo, or with ``kind="thumbs"`` a thumbnail, as slices of a read-only memory map"""
+        with open(self.path(name, kind), "rb") as file:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapping)
+        try:
+            for start in range(0, len(mapping), chunk_size):
+                yield view[start:start + chunk_size]
+        finally:
+            view.release()
+            try:
+                mapping.close()
+            except BufferError:
+                # A slice is still referenced (by a failed send's traceback, say);
+                # the map is released along with the last one
+                pass
+
+    def thumbnail(self, digest, size=THUMBNAIL_SIZE):
+        """Return the thumbnail name (for ``chunks(..., kind="thumbs")``), making it on first use
+
+        Returns None without Pillow or for an image Pillow cannot read.
+        """
+        if Image is None:
+            return None
+        name = f"{digest}-{size}"
+        path = self._sharded("thumbs", name)
+        if os.path.exists(path):
+            return name
+        descriptor, temp_path = tempfile.mkstemp(dir=self.temp_dir)
+        try:
+            with os.fdopen(descriptor, "wb") as file, Image.open(self.path(digest)) as image:
+                image.thumbnail((size, size))
+                image.convert("RGB").save(file, "JPEG", quality=80)
+        except OSError:
+            os.unlink(temp_path)
+            return None
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return name
+
+    def delete(self, digest):
+        """Remove a photo and its thumbnails once nothing refers to it
+
+        Pass it to ``AttachmentRepository.remove`` so the check and the
+        delete happen in one transaction.
+        """
+        for path in [self.path(digest)] + [
+            os.path.join(os.path.dirname(self._sharded("thumbs", digest)), name)
+            for name in self._thumbnails(digest)
+        ]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _thumbnails(self, digest):
+        directory = os.path.dirname(self._sharded("thumbs", digest))
+        try:
+            return [name for name in os.listdir(directory) if name.startswith(digest + "-")]
+        except FileNotFoundError:
+            return []
@@ -0,0 +1,11 @@
+"""Synthetic data and query timings for the reporting system at scale
+
+``benchmarks.generator`` fills a database with a deterministic synthetic
+population of users and reports; ``benchmarks.harness`` builds one such
+database per size and times the query behind each screen of ``index.py``
+against it, writing the results as JSON for comparison between runs.
+
+    python -m benchmarks.generator --reports 100000        # into the configured database
+    python -m benchmarks.harness --sizes 10000 100000 1000000 --output bench.json
+    python -m benchmarks.harness --sizes 10000 --compare bench.json
+"""
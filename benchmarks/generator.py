@@ -0,0 +1,272 @@
+"""Deterministic synthetic users and reports
+
+The same seed and sizes always produce the same rows, so timings from
+different runs are taken over the same data. The population is skewed the
+way real reports are:
+
+- reports are concentrated on a few users (the top 1% file a tenth of them)
+- Road Damage is the commonest issue type and Public Space Issue the rarest
+- volume grows over the three years covered, and reports arrive by day
+- recent reports are mostly open, older ones mostly resolved or rejected
+- about 60% of locations carry coordinates, clustered in neighbourhoods
+
+Reports go in through ReportRepository.create_many, so the keyword index,
+statistics counters and duplicate links are built exactly as for real
+submissions.
+
+    python -m benchmarks.generator --reports 100000 --users 5000 --seed 7
+"""
+
+import sys
+import time
+import random
+import logging
+import argparse
+import datetime
+
+from storage import ROWS_PER_INSERT, CounterRepository, ReportRepository
+
+DEFAULT_SEED = 20240630
+
+# Reports per user when --users is not given
+REPORTS_PER_USER = 20
+
+# Password of every synthetic user
+PASSWORD = "benchmark"
+
+# The generated reports span the three years up to END
+END = datetime.datetime(2024, 6, 30, 18, 0, 0)
+SPAN = datetime.timedelta(days=3 * 365)
+
+# Reports per create_many call (one transaction each)
+BATCH_SIZE = 5000
+
+ISSUE_WEIGHTS = {
+    "Road Damage": 34,
+    "Power Outage": 24,
+    "Water Issue": 20,
+    "Traffic Signal Problem": 13,
+    "Public Space Issue": 9,
+}
+SEVERITY_WEIGHTS = {"Low": 30, "Medium": 40, "High": 20, "Critical": 10}
+
+# Status weights by the age of a report: (up to this many days old, weights)
+STATUS_BY_AGE = (
+    (14, {"Pending": 60, "In Progress": 30, "Resolved": 8, "Rejected": 2}),
+    (90, {"Pending": 20, "In Progress": 25, "Resolved": 45, "Rejected": 10}),
+    (None, {"Pending": 2, "In Progress": 3, "Resolved": 80, "Rejected": 15}),
+)
+
+# Share of reports filed in each hour of the day
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 7, 9, 9, 8, 7, 7, 7, 7, 8, 9, 9, 7, 5, 4, 3, 2, 1]
+
+# Share of locations given with coordinates
+COORDINATE_SHARE = 0.6
+
+# Neighbourhood centres around Kigali; located reports fall within ~2 km of one
+CENTRES = [
+    (-1.9441, 30.0619), (-1.9536, 30.0921), (-1.9706, 30.1044), (-1.9355, 30.0588),
+    (-1.9500, 30.1263), (-1.9872, 30.1080), (-1.9297, 30.1068), (-1.9680, 30.0633),
+    (-2.0003, 30.0786), (-1.9151, 30.0991), (-1.9568, 30.0405), (-1.9789, 30.1393),
+]
+CENTRE_SPREAD_DEGREES = 0.01
+
+STREETS = [
+    "Main Street", "Station Road", "Market Street", "Church Road", "Hospital Road", "School Lane",
+    "Kimironko Road", "Nyabugogo Road", "Airport Road", "Remera Avenue", "Kacyiru Road", "Gisozi Road",
+    "Kicukiro Road", "Nyamirambo Road", "Gikondo Street", "Kanombe Road", "Kinamba Road", "Rugando Avenue",
+    "Umuganda Boulevard", "Independence Avenue", "Lake Road", "River Road", "Hill Street", "Valley Road",
+    "Park Avenue", "Garden Street", "Bus Park Road", "Stadium Road", "Prison Road", "Radio Road",
+]
+
+DESCRIPTIONS = {
+    "Road Damage": [
+        "Pothole about {size} cm deep in the {lane} lane",
+        "Large crack across the road surface near the {landmark}",
+        "Road surface washed out after heavy rain by the {landmark}",
+        "Sunken manhole cover causing cars to swerve near the {landmark}",
+        "Broken speed bump with exposed bolts in the {lane} lane",
+    ],
+    "Power Outage": [
+        "No electricity on the whole street since {time}",
+        "Streetlight broken, the road is completely dark near the {landmark}",
+        "Power line hanging low over the road near the {landmark}",
+        "Transformer sparking and buzzing since {time}",
+        "Repeated outages every evening around {time}",
+    ],
+    "Water Issue": [
+        "Burst water pipe flooding the road near the {landmark}",
+        "No water supply since {time}",
+        "Blocked drain overflowing onto the {lane} lane",
+        "Brown water coming from the taps since {time}",
+        "Open drainage channel by the {landmark} is a hazard",
+    ],
+    "Traffic Signal Problem": [
+        "Traffic light stuck on red at the junction by the {landmark}",
+        "Pedestrian crossing signal not working since {time}",
+        "Traffic lights flashing amber all day near the {landmark}",
+        "Signal pole knocked over at the {landmark} junction",
+    ],
+    "Public Space Issue": [
+        "Overflowing rubbish bins at the {landmark}",
+        "Broken benches and litter in the park near the {landmark}",
+        "Fallen tree blocking the footpath by the {landmark}",
+        "Graffiti and broken glass at the {landmark}",
+    ],
+}
+LANDMARKS = ["market", "school", "bus stop", "hospital", "church", "petrol station", "roundabout",
+             "stadium", "bank", "mosque", "health centre", "police station"]
+LANES = ["left", "right", "northbound", "southbound", "eastbound", "westbound"]
+
+
+def _weighted(rng, weights):
+    """Return one key of ``weights`` chosen in proportion to its value"""
+    return rng.choices(list(weights), list(weights.values()))[0]
+
+
+def username(index):
+    return f"user{index:07d}"
+
+
+def generate_users(count):
+    """Yield (username, role) for ``count`` users; every fiftieth is an admin"""
+    for index in range(count):
+        yield username(index), "admin" if index % 50 == 49 else "user"
+
+
+def _status(rng, created_at):
+    age = (END - created_at).days
+    for max_age, weights in STATUS_BY_AGE:
+        if max_age is None or age <= max_age:
+            return _weighted(rng, weights)
+
+
+def _location(rng):
+    street = f"{rng.choice(STREETS)} {rng.randint(1, 250)}"
+    if rng.random() >= COORDINATE_SHARE:
+        return street
+    latitude, longitude = rng.choice(CENTRES)
+    latitude = rng.gauss(latitude, CENTRE_SPREAD_DEGREES)
+    longitude = rng.gauss(longitude, CENTRE_SPREAD_DEGREES)
+    return f"{street}, {latitude:.5f}, {longitude:.5f}"
+
+
+def _description(rng, issue_type):
+    template = rng.choice(DESCRIPTIONS[issue_type])
+    return template.format(
+        size=rng.randint(5, 60), lane=rng.choice(LANES), landmark=rng.choice(LANDMARKS),
+        time=f"{rng.randint(1, 12)} {rng.choice(['am', 'pm'])}",
+    )
+
+
+def generate_reports(count, users, seed=DEFAULT_SEED):
+    """Yield ``count`` report rows (user index, issue_type, severity, description,
+    location, status, created_at, updated_at), oldest first
+
+    The user index is a position in ``generate_users(users)``.
+    """
+    rng = random.Random(seed)
+    span = SPAN.total_seconds()
+    hours = range(24)
+    for position in range(count):
+        # Volume grows linearly over the span: invert the CDF (t / span)^2
+        day = END - SPAN + datetime.timedelta(seconds=span * ((position + rng.random()) / count) ** 0.5)
+        created_at = min(END, day.replace(hour=rng.choices(hours, HOUR_WEIGHTS)[0], minute=rng.randint(0, 59),
+                                          second=rng.randint(0, 59), microsecond=0))
+        issue_type = _weighted(rng, ISSUE_WEIGHTS)
+        status = _status(rng, created_at)
+        updated_at = created_at
+        if status != "Pending":
+            updated_at = min(END, created_at + datetime.timedelta(hours=rng.randint(2, 24 * 30)))
+        yield (
+            int(users * rng.random() ** 2),
+            issue_type,
+            _weighted(rng, SEVERITY_WEIGHTS),
+            _description(rng, issue_type),
+            _location(rng),
+            status,
+            created_at,
+            updated_at,
+        )
+
+
+def load_users(db, count):
+    """Insert the synthetic users and return their ids in generate_users order
+
+    All of them share one password hash, so loading does not pay for a
+    hash per user.
+    """
+    hashed = db.passwords.hash(PASSWORD)
+    users = list(generate_users(count))
+    with db.cursor(commit=True) as cursor:
+        for start in range(0, len(users), ROWS_PER_INSERT):
+            chunk = users[start:start + ROWS_PER_INSERT]
+            db.execute(
+                cursor,
+                "INSERT INTO users (username, password, role) VALUES " + ", ".join(["(%s, %s, %s)"] * len(chunk)),
+                [value for name, role in chunk for value in (name, hashed, role)]
+            )
+        CounterRepository(db).apply(cursor, [(("total", "users"), len(users))])
+        ids = {}
+        for start in range(0, len(users), ROWS_PER_INSERT):
+            chunk = [name for name, _ in users[start:start + ROWS_PER_INSERT]]
+            db.execute(cursor, f"SELECT username, id FROM users WHERE username IN ({', '.join(['%s'] * len(chunk))})",
+                       chunk)
+            ids.update(cursor.fetchall())
+    return [ids[name] for name, _ in users]
+
+
+def load(db, reports, users=None, seed=DEFAULT_SEED, batch_size=BATCH_SIZE, on_batch=None):
+    """Insert ``users`` synthetic users and ``reports`` synthetic reports into a migrated database
+
+    ``on_batch(loaded, seconds)`` is called after each committed batch.
+    Returns the seconds taken.
+    """
+    users = users or max(1, reports // REPORTS_PER_USER)
+    started = time.perf_counter()
+    user_ids = load_users(db, users)
+    repository = ReportRepository(db)
+    batch, loaded = [], 0
+    for row in generate_reports(reports, users, seed):
+        batch.append((user_ids[row[0]],) + row[1:])
+        if len(batch) >= batch_size:
+            loaded += repository.create_many(batch)
+            batch = []
+            if on_batch:
+                on_batch(loaded, time.perf_counter() - started)
+    if batch:
+        loaded += repository.create_many(batch)
+        if on_batch:
+            on_batch(loaded, time.perf_counter() - started)
+    return time.perf_counter() - started
+
+
+def print_progress(loaded, seconds):
+    print(f"{loaded:>10,} reports  {seconds:8.1f}s  {loaded / seconds:>8,.0f} reports/s", file=sys.stderr)
+
+
+def main(argv=None):
+    """Command line entry point: load synthetic data into the configured database"""
+    import index
+    from migrations import migrate
+
+    parser = argparse.ArgumentParser(description="Load deterministic synthetic users and reports")
+    parser.add_argument("--reports", type=int, required=True)
+    parser.add_argument("--users", type=int, help=f"default: one per {REPORTS_PER_USER} reports")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="reports per transaction")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    db = index.get_db()
+    try:
+        migrate(db)
+        seconds = load(db, args.reports, args.users, args.seed, args.batch_size, print_progress)
+    finally:
+        db.close()
+    print(f"Loaded {args.reports} reports in {seconds:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
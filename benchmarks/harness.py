@@ -0,0 +1,317 @@
+"""Time the query behind each screen of index.py at several table sizes
+
+Each size gets its own database, loaded once by benchmarks.generator and
+reused by later runs with the same size and seed: a SQLite file under
+``--data-dir``, or on MySQL a database named after the configured one with
+``_bench_<size>_<seed>`` appended. ``INFRA_DB_BACKEND`` picks the engine as
+it does for the application.
+
+Every path is run ``--warmup`` times untimed, then ``--repeat`` times. The
+list and search screens print a screenful and wait, so streamed searches
+are timed to their first screenful of rows, as a user sees them. Results
+are written as JSON; ``--compare`` reads an earlier file and flags every
+path whose median slowed by more than ``--threshold`` and ``--min-delta-ms``.
+Compare runs that both reused their datasets: timings taken straight
+after a load run on freshly written files and differ by tens of percent.
+
+    python -m benchmarks.harness --sizes 10000 100000 1000000 --output bench.json
+    python -m benchmarks.harness --sizes 100000 --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import datetime
+import platform
+import statistics
+from itertools import islice
+
+from benchmarks import generator
+from filters import DATE_PRESETS, ReportFilter, date_range, preset_range
+from migrations import migrate
+from storage import (
+    DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, STATUSES, CounterRepository, Database, MySQLBackend,
+    ReportRepository, SQLiteBackend
+)
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+DEFAULT_REPEAT = 20
+DEFAULT_WARMUP = 2
+
+# Median slowdown, as a fraction and in milliseconds, that --compare reports
+# as a regression; sub-millisecond medians move by more than the fraction
+# from run to run on their own
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_DELTA_MS = 0.5
+
+# Keyword searches, from a single common word to a phrase across both columns
+KEYWORD_QUERIES = ("pothole", "streetlight broken", "main street market")
+
+# Radius of the nearby search, as the "Near a Location" screen defaults to
+NEARBY_RADIUS_M = 500
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def measure(function, arguments, warmup=DEFAULT_WARMUP):
+    """Call ``function(*args)`` for each args in ``arguments`` and summarise the timings
+
+    ``function`` returns the number of rows it read. The first ``warmup``
+    calls are not timed.
+    """
+    for args in arguments[:warmup]:
+        function(*args)
+    timings, rows = [], 0
+    for args in arguments[warmup:]:
+        started = time.perf_counter()
+        rows = function(*args)
+        timings.append((time.perf_counter() - started) * 1000)
+    ordered = sorted(timings)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(_percentile(ordered, 0.95), 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "rows": rows,
+    }
+
+
+def first_screen(rows):
+    """Read the first screenful of a streamed result, as TableRenderer does before pausing"""
+    count = sum(1 for _ in islice(rows, DEFAULT_PAGE_SIZE))
+    rows.close()
+    return count
+
+
+def choose_samples(db, users, count, seed):
+    """Pick the users and reports the paths look at, the same for every run of a dataset"""
+    rng = random.Random(seed)
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT MIN(id), MAX(id) FROM reports")
+        first_id, last_id = cursor.fetchone()
+        report_ids = [rng.randint(first_id, last_id) for _ in range(count)]
+        placeholders = ", ".join(["%s"] * len(report_ids))
+        db.execute(cursor, f"SELECT id, user_id FROM reports WHERE id IN ({placeholders})", report_ids)
+        owners = dict(cursor.fetchall())
+        names = [generator.username(0), generator.username(users // 2)]
+        db.execute(cursor, "SELECT username, id FROM users WHERE username IN (%s, %s)", names)
+        user_ids = dict(cursor.fetchall())
+    return {
+        "reports": [(report_id, owners[report_id]) for report_id in report_ids if report_id in owners],
+        "heavy_user": (names[0], user_ids[names[0]]),
+        "typical_user": (names[1], user_ids[names[1]]),
+    }
+
+
+def query_paths(db, samples):
+    """Return (name, function, arguments) for the query behind each screen
+
+    Paths that look up a single report take a different sampled report on
+    each call; the others repeat one query.
+    """
+    reports, counters = ReportRepository(db), CounterRepository(db)
+    heavy_name, heavy_id = samples["heavy_user"]
+    typical_id = samples["typical_user"][1]
+    report_samples = samples["reports"]
+
+    def page(status):
+        return len(reports.page_reports(status, DEFAULT_PAGE_SIZE).rows)
+
+    def stream(report_filter):
+        return first_screen(reports.stream_matching(report_filter))
+
+    paths = [("admin_view_reports[all]", page, None)]
+    paths += [(f"admin_view_reports[{status}]", page, status) for status in STATUSES]
+    paths += [
+        ("admin_search_reports[id]", lambda report_id, _: len(reports.search_by_id(report_id)), report_samples),
+        ("admin_search_reports[username]", stream, ReportFilter(username=heavy_name)),
+        ("admin_search_reports[issue_type]", stream, ReportFilter(issue_type="Water Issue")),
+    ]
+    paths += [(f"admin_search_reports[keywords:{query}]", lambda text: len(reports.search_text(text, DEFAULT_SEARCH_LIMIT)),
+               query) for query in KEYWORD_QUERIES]
+    end = generator.END.date()
+    paths += [(f"admin_search_reports[date:{preset}]", stream, ReportFilter(created_range=preset_range(preset, end)))
+              for preset in DATE_PRESETS]
+    paths += [
+        ("admin_search_reports[date:2023]", stream, ReportFilter(created_range=date_range("2023-01-01", "2023-12-31"))),
+        ("admin_search_reports[nearby]",
+         lambda point: len(reports.find_nearby(point[0], point[1], NEARBY_RADIUS_M)), generator.CENTRES[0]),
+        ("view_my_reports[heavy user]", lambda user_id: len(reports.page_for_user(user_id).rows), heavy_id),
+        ("view_my_reports[typical user]", lambda user_id: len(reports.page_for_user(user_id).rows), typical_id),
+        ("view_report_details", lambda report_id, owner_id: int(bool(reports.get_detail(report_id, owner_id))),
+         report_samples),
+        ("admin_statistics", lambda: len(counters.snapshot()), ()),
+    ]
+    return paths
+
+
+def run_paths(db, samples, repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP):
+    """Time every path and return {name: summary}"""
+    results = {}
+    for name, function, argument in query_paths(db, samples):
+        if isinstance(argument, list):
+            # One sample per call, cycling if there are fewer than calls
+            arguments = [argument[index % len(argument)] for index in range(warmup + repeat)]
+        elif argument == ():
+            arguments = [()] * (warmup + repeat)
+        else:
+            arguments = [(argument,)] * (warmup + repeat)
+        results[name] = measure(function, arguments, warmup)
+        logging.info(f"{name}: {results[name]}")
+    return results
+
+
+def open_dataset(size, users, seed, data_dir, rebuild=False):
+    """Return (db, load_seconds) for a database holding the synthetic dataset of ``size`` reports
+
+    ``load_seconds`` is None when an earlier run's complete dataset was reused.
+    """
+    import index
+
+    engine = os.environ.get("INFRA_DB_BACKEND", "mysql").lower()
+    if engine == "sqlite":
+        os.makedirs(data_dir, exist_ok=True)
+        path = os.path.join(data_dir, f"reports-{size}-{seed}.db")
+        if rebuild:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.unlink(path + suffix)
+        backend = SQLiteBackend(path)
+    else:
+        name = f"{index.DB_CONFIG['database']}_bench_{size}_{seed}"
+        backend = MySQLBackend(dict(index.DB_CONFIG, database=name))
+        backend.ensure_database()
+        if rebuild:
+            conn = backend.connect()
+            try:
+                conn.cursor().execute(f"DROP DATABASE {name}")
+            finally:
+                conn.close()
+            backend.ensure_database()
+    db = Database(backend, pool_size=index.POOL_SIZE, pool_timeout=index.POOL_TIMEOUT,
+                  user_cache_size=index.USER_CACHE_SIZE, user_cache_ttl=index.USER_CACHE_TTL,
+                  report_cache_size=index.REPORT_CACHE_SIZE, password_cost=index.PASSWORD_COST, hash_workers=0)
+    migrate(db)
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT COUNT(*) FROM reports")
+        loaded = cursor.fetchone()[0]
+    if loaded == size:
+        return db, None
+    if loaded:
+        # An interrupted build; start again
+        db.close()
+        return open_dataset(size, users, seed, data_dir, rebuild=True)
+    print(f"Loading {size:,} reports and {users:,} users...", file=sys.stderr)
+    return db, generator.load(db, size, users, seed, on_batch=generator.print_progress)
+
+
+def run(sizes, seed=generator.DEFAULT_SEED, repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP,
+        data_dir="bench-data", rebuild=False):
+    """Build or reuse a dataset of each size, time every path on it and return the results document"""
+    document = {
+        "started_at": datetime.datetime.now().isoformat(" ", "seconds"),
+        "backend": None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "warmup": warmup,
+        "runs": [],
+    }
+    for size in sizes:
+        users = max(1, size // generator.REPORTS_PER_USER)
+        db, load_seconds = open_dataset(size, users, seed, data_dir, rebuild)
+        try:
+            document["backend"] = db.backend.name
+            samples = choose_samples(db, users, repeat + warmup, seed)
+            started = time.perf_counter()
+            paths = run_paths(db, samples, repeat, warmup)
+            document["runs"].append({
+                "reports": size,
+                "users": users,
+                "load_seconds": None if load_seconds is None else round(load_seconds, 1),
+                "seconds": round(time.perf_counter() - started, 1),
+                "paths": paths,
+            })
+        finally:
+            db.close()
+    return document
+
+
+def compare(previous, current):
+    """Return (size, path, old median, new median, change) for every path timed in both documents"""
+    old_runs = {run["reports"]: run["paths"] for run in previous["runs"]}
+    changes = []
+    for run in current["runs"]:
+        old_paths = old_runs.get(run["reports"], {})
+        for name, summary in run["paths"].items():
+            if name in old_paths:
+                old, new = old_paths[name]["median_ms"], summary["median_ms"]
+                changes.append((run["reports"], name, old, new, (new - old) / old if old else 0.0))
+    return changes
+
+
+def print_results(document):
+    for run in document["runs"]:
+        loaded = "reused" if run["load_seconds"] is None else f"loaded in {run['load_seconds']}s"
+        print(f"\n{run['reports']:,} reports, {run['users']:,} users ({document['backend']}, {loaded})")
+        print(f"{'path':<52}{'median ms':>11}{'p95 ms':>10}{'rows':>7}")
+        for name, summary in run["paths"].items():
+            print(f"{name:<52}{summary['median_ms']:>11.2f}{summary['p95_ms']:>10.2f}{summary['rows']:>7}")
+
+
+def main(argv=None):
+    """Command line entry point for the benchmark harness; exits 1 if --compare found regressions"""
+    parser = argparse.ArgumentParser(description="Time each screen's queries on synthetic data of several sizes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="reports in each dataset (default: 10000 100000 1000000)")
+    parser.add_argument("--seed", type=int, default=generator.DEFAULT_SEED)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed calls per path")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="untimed calls per path first")
+    parser.add_argument("--data-dir", default="bench-data", help="where SQLite datasets are kept")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate datasets even if present")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", metavar="PREVIOUS", help="an earlier --output file to compare medians with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"median slowdown reported as a regression (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help=f"smallest median slowdown in ms reported as a regression (default: {DEFAULT_MIN_DELTA_MS})")
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error("--repeat must be at least 1 and --warmup at least 0")
+
+    logging.basicConfig(level=logging.WARNING)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            previous = json.load(file)
+
+    document = run(args.sizes, args.seed, args.repeat, args.warmup, args.data_dir, args.rebuild)
+    print_results(document)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(document, file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if previous is None:
+        return 0
+    regressions = 0
+    print(f"\nCompared with {args.compare} ({previous['started_at']}):")
+    for size, name, old, new, change in compare(previous, document):
+        flag = ""
+        if change > args.threshold and new - old > args.min_delta_ms:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{size:>9,} {name:<52}{old:>10.2f} -> {new:>8.2f} ms {change:>+8.0%}{flag}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""Bulk import of historical reports from CSV or JSONL files
+
+The input is streamed, so file size is bounded only by disk. Each record
+needs ``username``, ``issue_type``, ``description`` and ``location``;
+``severity`` (default Medium), ``status`` (default Pending) and
+``created_at`` (default now) are optional. Valid rows are inserted with
+multi-row statements and committed every ``--commit-size`` rows; invalid
+rows are written, with the reason, to a rejects file in the input format.
+
+    python bulk_import.py reports.csv --commit-size 5000
+    python bulk_import.py reports.jsonl --rejects bad.jsonl
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+from collections import namedtuple
+
+from filters import FilterError, parse_choice
+from storage import ISSUE_TYPES, MAX_LOCATION_LENGTH, SEVERITIES, STATUSES, StorageError, ReportRepository, UserRepository
+
+FORMATS = ("csv", "jsonl")
+REQUIRED_FIELDS = ("username", "issue_type", "description", "location")
+
+# Valid rows per transaction
+DEFAULT_COMMIT_SIZE = 5000
+
+BatchResult = namedtuple("BatchResult", ["number", "imported", "rejected", "seconds"])
+ImportSummary = namedtuple("ImportSummary", ["imported", "rejected", "seconds"])
+
+
+class RowError(ValueError):
+    """Raised when an input record cannot be imported"""
+
+
+def detect_format(path):
+    """Guess the input format from the file extension"""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension in ("json", "ndjson"):
+        return "jsonl"
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the format of '{path}'; pass --format")
+    return extension
+
+
+def read_records(stream, fmt):
+    """Yield (line_number, record, error) for each input record
+
+    ``record`` is a dict; if a JSONL line cannot be parsed it holds the raw
+    text under ``raw`` and ``error`` says why.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        missing = [field for field in REQUIRED_FIELDS if field not in (reader.fieldnames or ())]
+        if missing:
+            raise ValueError(f"CSV header is missing: {', '.join(missing)}")
+        for record in reader:
+            yield reader.line_num, record, None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as err:
+            yield line_number, {"raw": line.rstrip("\n")}, f"invalid JSON: {err}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, {"raw": line.rstrip("\n")}, "expected a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def _text(record, field):
+    value = record.get(field)
+    return "" if value is None else str(value).strip()
+
+
+def validate(record, now=None):
+    """Return (username, issue_type, severity, description, location, status, created_at)
+    for a valid record, raising RowError otherwise
+
+    Enum values are matched case-insensitively and returned in schema spelling.
+    """
+    for field in REQUIRED_FIELDS:
+        if not _text(record, field):
+            raise RowError(f"{field} is required")
+
+    location = _text(record, "location")
+    if len(location) > MAX_LOCATION_LENGTH:
+        raise RowError(f"location is longer than {MAX_LOCATION_LENGTH} characters")
+
+    created_text = _text(record, "created_at")
+    if created_text:
+        try:
+            created_at = datetime.datetime.fromisoformat(created_text)
+        except ValueError:
+            raise RowError(f"created_at '{created_text}' is not an ISO date or timestamp") from None
+        if created_at.tzinfo is not None:
+            # The columns hold naive local time
+            created_at = created_at.astimezone().replace(tzinfo=None)
+    else:
+        created_at = now or datetime.datetime.now()
+
+    try:
+        issue_type = parse_choice(_text(record, "issue_type"), ISSUE_TYPES, "issue_type")
+        severity = parse_choice(_text(record, "severity") or "Medium", SEVERITIES, "severity")
+        status = parse_choice(_text(record, "status") or "Pending", STATUSES, "status")
+    except FilterError as err:
+        raise RowError(str(err)) from None
+
+    return (
+        _text(record, "username"),
+        issue_type,
+        severity,
+        _text(record, "description"),
+        location,
+        status,
+        created_at.replace(microsecond=0),
+    )
+
+
+class RejectWriter:
+    """Writes rejected records and their reasons in the input format
+
+    The file is only created once the first row is rejected. CSV rejects
+    keep the input columns, taken from the first rejected record.
+    """
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def write(self, line_number, record, error):
+        if self._file is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            if self.fmt == "csv":
+                # DictReader files surplus values under None; they are dropped
+                fieldnames = [field for field in record if field is not None]
+                self._writer = csv.DictWriter(self._file, fieldnames + ["line", "error"], extrasaction="ignore")
+                self._writer.writeheader()
+        if self.fmt == "csv":
+            self._writer.writerow(dict(record, line=line_number, error=error))
+        else:
+            self._file.write(json.dumps(dict(record, line=line_number, error=error), default=str) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def import_reports(db, records, commit_size=DEFAULT_COMMIT_SIZE, on_reject=None, on_batch=None):
+    """Validate and insert (line_number, record, error) tuples and return an ImportSummary
+
+    Usernames are resolved once per batch and cached (hits and misses) for
+    the whole run.
+    ``on_reject(line_number, record, error)`` receives every invalid record
+    and ``on_batch(BatchResult)`` is called after each commit.
+    """
+    if commit_size < 1:
+        raise ValueError("Commit size must be at least 1")
+    users, reports = UserRepository(db), ReportRepository(db)
+    user_ids = {}
+    imported = rejected = batch_number = 0
+    started = time.perf_counter()
+
+    def reject(line_number, record, error):
+        nonlocal rejected
+        rejected += 1
+        if on_reject:
+            on_reject(line_number, record, error)
+
+    def flush(pending, batch_rejected, batch_started):
+        nonlocal imported, batch_number
+        unknown = {row[0] for _, _, row in pending} - user_ids.keys()
+        if unknown:
+            user_ids.update(dict.fromkeys(unknown))
+            user_ids.update(users.find_ids(unknown))
+        rows = []
+        for line_number, record, row in pending:
+            user_id = user_ids.get(row[0])
+            if user_id is None:
+                reject(line_number, record, f"unknown username '{row[0]}'")
+                batch_rejected += 1
+                continue
+            # Historical rows were last touched when they were filed
+            rows.append((user_id,) + row[1:] + (row[6],))
+        if rows:
+            reports.create_many(rows)
+        imported += len(rows)
+        batch_number += 1
+        if on_batch:
+            on_batch(BatchResult(batch_number, len(rows), batch_rejected, time.perf_counter() - batch_started))
+
+    pending, batch_rejected, batch_started = [], 0, time.perf_counter()
+    for line_number, record, error in records:
+        if error is None:
+            try:
+                pending.append((line_number, record, validate(record)))
+            except RowError as err:
+                error = str(err)
+        if error is not None:
+            reject(line_number, record, error)
+            batch_rejected += 1
+        if len(pending) >= commit_size:
+            flush(pending, batch_rejected, batch_started)
+            pending, batch_rejected, batch_started = [], 0, time.perf_counter()
+    if pending or batch_rejected:
+        flush(pending, batch_rejected, batch_started)
+
+    return ImportSummary(imported, rejected, time.perf_counter() - started)
+
+
+def print_batch(batch):
+    """Print one batch's counts and throughput"""
+    rate = batch.imported / batch.seconds if batch.seconds else 0
+    print(f"batch {batch.number:>5}: {batch.imported:>7} imported  {batch.rejected:>5} rejected"
+          f"  {batch.seconds:7.2f}s  {rate:>10,.0f} rows/s")
+
+
+def main(argv=None):
+    """Command line entry point for bulk report imports"""
+    import index
+
+    parser = argparse.ArgumentParser(description="Bulk import reports from a CSV or JSONL file")
+    parser.add_argument("path", help="input file")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--commit-size", type=int, default=DEFAULT_COMMIT_SIZE,
+                        help=f"valid rows per transaction (default: {DEFAULT_COMMIT_SIZE})")
+    parser.add_argument("--rejects", help="where to write rejected rows (default: <input>.rejects.<format>)")
+    args = parser.parse_args(argv)
+
+    try:
+        fmt = args.format or detect_format(args.path)
+    except ValueError as err:
+        parser.error(str(err))
+    rejects_path = args.rejects or f"{os.path.splitext(args.path)[0]}.rejects.{fmt}"
+
+    with open(args.path, newline="", encoding="utf-8") as stream:
+        rejects = RejectWriter(rejects_path, fmt)
+        try:
+            summary = import_reports(
+                index.get_db(), read_records(stream, fmt), args.commit_size,
+                on_reject=rejects.write, on_batch=print_batch
+            )
+        except ValueError as err:
+            print(f"Error: {err}", file=sys.stderr)
+            return 2
+        except StorageError as err:
+            logging.error(f"Bulk import failed: {err}")
+            print(f"Error: import stopped, earlier batches stay committed: {err}", file=sys.stderr)
+            return 1
+        finally:
+            rejects.close()
+
+    rate = summary.imported / summary.seconds if summary.seconds else 0
+    print(f"Imported {summary.imported} report(s), rejected {summary.rejected} in {summary.seconds:.2f}s"
+          f" ({rate:,.0f} rows/s).")
+    if summary.rejected:
+        print(f"Rejected rows written to {rejects_path}")
+    logging.info(f"Bulk import of {args.path}: {summary.imported} imported, {summary.rejected} rejected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Bounded in-process caches with hit and miss accounting
+
+Every cache here is per process. Entries written by this process are kept
+current by explicit invalidation; a time-to-live bounds how long a change
+made by another process (the CLI, a second server) can go unseen.
+"""
+
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+# Returned by LRUCache.get when a key is absent or expired
+MISSING = object()
+
+
+def approximate_size(value):
+    """Bytes held by a value and, for tuples and lists, everything in them"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class LRUCache:
+    """A thread-safe mapping holding at most ``max_entries`` items
+
+    The least recently used entry is evicted to make room. With a ``ttl``
+    an entry older than that many seconds counts as a miss and is dropped.
+    A cache of size 0 stores nothing. Given a ``sizeof`` function the cache
+    also keeps a running total of the bytes its values hold.
+    """
+
+    def __init__(self, max_entries, ttl=None, clock=time.monotonic, sizeof=None):
+        if max_entries < 0:
+            raise ValueError("Cache size must not be negative")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (stored_at, value, size), least recently used first
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and self._clock() - entry[0] > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        size = self._sizeof(value) if self._sizeof else 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (self._clock(), value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+        return entry
+
+    def invalidate(self, key):
+        """Drop one entry and return its value, or None if it was not cached"""
+        with self._lock:
+            entry = self._remove(key)
+            return None if entry is None else entry[1]
+
+    def invalidate_matching(self, predicate):
+        """Drop every entry whose value satisfies ``predicate``"""
+        with self._lock:
+            for key in [key for key, (_, value, _) in self._entries.items() if predicate(value)]:
+                self._remove(key)
+
+    def reject(self, key):
+        """Drop an entry the caller found out of date; its lookup counts as a miss"""
+        with self._lock:
+            if self._remove(key) is not None:
+                self.hits -= 1
+                self.misses += 1
+                self.stale += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return a dict of the cache's size and counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stale": self.stale,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "bytes": self.bytes,
+            }
+
+
+class UserCache:
+    """User id -> (username, role) and username -> id, kept together
+
+    Only existing users are cached, so a name registered by another process
+    is found straight away rather than after the TTL. Roles for permission
+    checks are also kept under their own, shorter ``role_ttl``, so a role
+    changed by another process applies within seconds.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300.0, role_ttl=5.0):
+        self.by_id = LRUCache(max_entries, ttl)
+        self.by_name = LRUCache(max_entries, ttl)
+        self.roles = LRUCache(max_entries, min(ttl, role_ttl))
+
+    def user(self, user_id):
+        """Return (username, role), or MISSING"""
+        return self.by_id.get(user_id)
+
+    def role(self, user_id):
+        """Return the role for a permission check, or MISSING"""
+        user = self.roles.get(user_id)
+        return user if user is MISSING else user[1]
+
+    def id_for(self, username):
+        """Return the user's id, or MISSING"""
+        return self.by_name.get(username)
+
+    def remember(self, user_id, username, role):
+        self.by_id.put(user_id, (username, role))
+        self.by_name.put(username, user_id)
+        self.roles.put(user_id, (username, role))
+
+    def forget(self, username):
+        """Drop a user after their row changed; unknown names are ignored"""
+        user_id = self.by_name.invalidate(username)
+        if user_id is not None:
+            self.by_id.invalidate(user_id)
+            self.roles.invalidate(user_id)
+        else:
+            # The name entry may have been evicted while the id entries live on
+            self.by_id.invalidate_matching(lambda user: user[0] == username)
+            self.roles.invalidate_matching(lambda user: user[0] == username)
+
+    def clear(self):
+        self.by_id.clear()
+        self.by_name.clear()
+        self.roles.clear()
+
+    def stats(self):
+        return {"by_id": self.by_id.stats(), "by_name": self.by_name.stats(), "roles": self.roles.stats()}
@@ -0,0 +1,333 @@
+"""Non-interactive command line for scripts and cron jobs
+
+Every subcommand takes its input as arguments, prints one JSON document to
+stdout and exits: 0 on success, 1 on a database error and 2 on invalid
+input. There are no prompts, pauses or screen clears.
+
+    python cli.py submit --username alice --issue-type "Road Damage" --severity High \\
+        --description "Deep pothole" --location "Main Street 12"
+    python cli.py list --status Pending --page-size 50
+    python cli.py search --issue-type "Power Outage" --keywords "main street"
+    python cli.py nearby --lat -1.9441 --lon 30.0619 --radius 250
+    python cli.py update-status --id-range 100-250 --to-status Resolved
+    python cli.py stats
+    python cli.py users add bob --password-stdin --role admin < password.txt
+    python cli.py users set-role bob user
+    python cli.py attachments add 42 pothole.jpg --username alice
+"""
+
+import sys
+import json
+import logging
+import argparse
+import datetime
+
+from db_pool import PoolTimeoutError
+from filters import ReportFilter, add_filter_arguments, filter_from_args, parse_choice
+from storage import (
+    ISSUE_TYPES, SEVERITIES, STATUSES, ROLES, DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, DEFAULT_NEARBY_LIMIT,
+    StorageError, UsernameTakenError, AttachmentRepository, CounterRepository, ReportRepository, UserRepository
+)
+
+# Field names of the rows returned by each repository query
+REPORT_LIST_KEYS = ("id", "username", "issue_type", "severity", "description", "location", "status", "created_at")
+USER_REPORT_KEYS = ("id", "issue_type", "severity", "description", "location", "status", "created_at")
+USER_KEYS = ("id", "username", "role", "created_at")
+NEARBY_KEYS = REPORT_LIST_KEYS + ("distance_m",)
+ATTACHMENT_KEYS = ("id", "filename", "content_type", "size_bytes", "created_at")
+
+
+class UsageError(ValueError):
+    """Raised when arguments are well-formed but cannot be acted on"""
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat(" ")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def emit(document):
+    """Print one JSON document on stdout"""
+    print(json.dumps(document, default=_json_default))
+
+
+def records(rows, keys):
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def encode_key(key):
+    """Render a (created_at, id) page key as an opaque cursor string"""
+    return None if key is None else f"{key[0].isoformat(' ')},{key[1]}"
+
+
+def decode_key(text):
+    """Parse a cursor string produced by encode_key"""
+    try:
+        created_at, report_id = text.rsplit(",", 1)
+        return datetime.datetime.fromisoformat(created_at), int(report_id)
+    except ValueError:
+        raise UsageError(f"Invalid page cursor '{text}'") from None
+
+
+def read_password(args):
+    if args.password_stdin:
+        password = sys.stdin.readline().rstrip("\n")
+    else:
+        password = args.password
+    if not password:
+        raise UsageError("A password is required (--password or --password-stdin)")
+    return password
+
+
+def cmd_submit(db, args):
+    users = UserRepository(db)
+    user_id = users.find_id(args.username)
+    if user_id is None:
+        raise UsageError(f"Unknown username '{args.username}'")
+    issue_type = parse_choice(args.issue_type, ISSUE_TYPES, "issue type")
+    severity = parse_choice(args.severity, SEVERITIES, "severity")
+    if not args.description.strip() or not args.location.strip():
+        raise UsageError("Description and location must not be empty")
+    reports = ReportRepository(db)
+    report_id = reports.create(user_id, issue_type, severity, args.description, args.location)
+    return {"id": report_id, "duplicate_of": reports.duplicate_of(report_id)}
+
+
+def cmd_list(db, args):
+    if args.after and args.before:
+        raise UsageError("Use either --after or --before, not both")
+    position = {}
+    if args.after:
+        position["after"] = decode_key(args.after)
+    elif args.before:
+        position["before"] = decode_key(args.before)
+
+    reports = ReportRepository(db)
+    if args.username:
+        user_id = UserRepository(db).find_id(args.username)
+        if user_id is None:
+            raise UsageError(f"Unknown username '{args.username}'")
+        page = reports.page_for_user(user_id, args.page_size, **position)
+        rows = records(page.rows, USER_REPORT_KEYS)
+    else:
+        status = parse_choice(args.status, STATUSES, "status") if args.status else None
+        page = reports.page_reports(status, args.page_size, **position)
+        rows = records(page.rows, REPORT_LIST_KEYS)
+    return {
+        "reports": rows,
+        "next": encode_key(page.last_key) if page.has_next else None,
+        "previous": encode_key(page.first_key) if page.has_previous else None,
+    }
+
+
+def cmd_search(db, args):
+    report_filter = filter_from_args(args)
+    reports = ReportRepository(db)
+    if report_filter == ReportFilter(keywords=report_filter.keywords) and report_filter.keywords:
+        # Keywords alone get the ranked search, best match first
+        rows = reports.search_text(report_filter.keywords, args.limit)
+    else:
+        rows = reports.find_matching(report_filter, args.limit)
+    return {"filter": report_filter.describe(), "reports": records(rows, REPORT_LIST_KEYS)}
+
+
+def cmd_nearby(db, args):
+    rows = ReportRepository(db).find_nearby(args.lat, args.lon, args.radius, args.limit)
+    return {"reports": records(rows, NEARBY_KEYS)}
+
+
+def cmd_update_status(db, args):
+    report_filter = filter_from_args(args)
+    if report_filter.is_empty():
+        raise UsageError("Give at least one report filter; refusing to update every report")
+    new_status = parse_choice(args.to_status, STATUSES, "status")
+    reports = ReportRepository(db)
+    matches = reports.count_by_status(report_filter)
+    result = {
+        "filter": report_filter.describe(),
+        "matched": sum(matches.values()),
+        "to_change": sum(count for status, count in matches.items() if status != new_status),
+    }
+    if args.dry_run:
+        return dict(result, changed=0, dry_run=True)
+    changed = reports.update_status_matching(report_filter, new_status, args.chunk_size)
+    logging.info(f"CLI status update: {changed} report(s) set to {new_status} ({report_filter.describe()})")
+    return dict(result, changed=changed)
+
+
+def cmd_stats(db, args):
+    counters = CounterRepository(db)
+    result = {}
+    if args.reconcile:
+        drift = counters.reconcile()
+        result["drift"] = [dict(zip(("dimension", "category", "counter", "actual"), row)) for row in drift]
+    result["counters"] = counters.snapshot()
+    return result
+
+
+def cmd_users_list(db, args):
+    return {"users": records(UserRepository(db).list_all(), USER_KEYS)}
+
+
+def cmd_users_add(db, args):
+    password = read_password(args)
+    try:
+        user_id = UserRepository(db).create(args.username, password, args.role)
+    except UsernameTakenError as err:
+        raise UsageError(str(err)) from None
+    return {"id": user_id, "username": args.username, "role": args.role}
+
+
+def cmd_users_reset_password(db, args):
+    if not UserRepository(db).set_password(args.username, read_password(args)):
+        raise UsageError(f"Unknown username '{args.username}'")
+    return {"username": args.username, "password_reset": True}
+
+
+def cmd_users_set_role(db, args):
+    if not UserRepository(db).set_role(args.username, args.role):
+        raise UsageError(f"Unknown username '{args.username}'")
+    return {"username": args.username, "role": args.role}
+
+
+def attachment_store():
+    import index
+    return index.get_attachment_store()
+
+
+def cmd_attachments_add(db, args):
+    users = UserRepository(db)
+    user_id = users.find_id(args.username)
+    if user_id is None:
+        raise UsageError(f"Unknown username '{args.username}'")
+    viewer_id = None if users.get_role(user_id) == "admin" else user_id
+    if ReportRepository(db).get_detail(args.report_id, viewer_id) is None:
+        raise UsageError(f"Report {args.report_id} not found or not submitted by '{args.username}'")
+    try:
+        with open(args.file, "rb") as photo:
+            upload = attachment_store().put(photo)
+    except OSError as err:
+        raise UsageError(f"Cannot read '{args.file}': {err.strerror}") from None
+    with upload:
+        attachment_id = AttachmentRepository(db).add(args.report_id, user_id, upload.sha256, args.file,
+                                                     upload.content_type, upload.size, place=upload.place)
+    return {"id": attachment_id, "report_id": args.report_id, "sha256": upload.sha256,
+            "content_type": upload.content_type, "size_bytes": upload.size}
+
+
+def cmd_attachments_list(db, args):
+    return {"attachments": records(AttachmentRepository(db).list_for_report(args.report_id), ATTACHMENT_KEYS)}
+
+
+def cmd_attachments_remove(db, args):
+    repo = AttachmentRepository(db)
+    if repo.get(args.attachment_id) is None:
+        raise UsageError(f"Unknown attachment {args.attachment_id}")
+    orphaned = repo.remove(args.attachment_id, attachment_store().delete)
+    return {"id": args.attachment_id, "removed": True, "content_deleted": orphaned is not None}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Scriptable infrastructure report commands with JSON output")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="submit a report on behalf of a user")
+    submit.add_argument("--username", required=True)
+    submit.add_argument("--issue-type", required=True, help=f"one of: {', '.join(ISSUE_TYPES)}")
+    submit.add_argument("--severity", default="Medium", help=f"one of: {', '.join(SEVERITIES)} (default: Medium)")
+    submit.add_argument("--description", required=True)
+    submit.add_argument("--location", required=True)
+    submit.set_defaults(handler=cmd_submit)
+
+    listing = commands.add_parser("list", help="one page of reports, newest first")
+    listing.add_argument("--status", help="only reports with this status")
+    listing.add_argument("--username", help="only this user's reports")
+    listing.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    listing.add_argument("--after", metavar="CURSOR", help="the 'next' cursor of the previous page")
+    listing.add_argument("--before", metavar="CURSOR", help="the 'previous' cursor of the following page")
+    listing.set_defaults(handler=cmd_list)
+
+    search = commands.add_parser("search", help="reports matching every given filter")
+    add_filter_arguments(search)
+    search.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT)
+    search.set_defaults(handler=cmd_search)
+
+    nearby = commands.add_parser("nearby", help="reports within a radius of a point, nearest first")
+    nearby.add_argument("--lat", type=float, required=True)
+    nearby.add_argument("--lon", type=float, required=True)
+    nearby.add_argument("--radius", type=float, default=500, help="metres (default: 500)")
+    nearby.add_argument("--limit", type=int, default=DEFAULT_NEARBY_LIMIT)
+    nearby.set_defaults(handler=cmd_nearby)
+
+    update = commands.add_parser("update-status", help="set the status of every report matching the filters")
+    add_filter_arguments(update)
+    update.add_argument("--to-status", required=True, help=f"one of: {', '.join(STATUSES)}")
+    update.add_argument("--chunk-size", type=int, default=1000, help="reports changed per UPDATE (default: 1000)")
+    update.add_argument("--dry-run", action="store_true", help="only count the matching reports")
+    update.set_defaults(handler=cmd_update_status)
+
+    stats = commands.add_parser("stats", help="report and user counters")
+    stats.add_argument("--reconcile", action="store_true", help="rebuild the counters first and report drift")
+    stats.set_defaults(handler=cmd_stats)
+
+    users = commands.add_parser("users", help="user administration")
+    user_commands = users.add_subparsers(dest="user_command", required=True)
+    user_commands.add_parser("list", help="every user").set_defaults(handler=cmd_users_list)
+    for name, handler, help_text in (("add", cmd_users_add, "create a user"),
+                                     ("reset-password", cmd_users_reset_password, "set a user's password")):
+        user_parser = user_commands.add_parser(name, help=help_text)
+        user_parser.add_argument("username")
+        secret = user_parser.add_mutually_exclusive_group(required=True)
+        secret.add_argument("--password")
+        secret.add_argument("--password-stdin", action="store_true", help="read the password from stdin")
+        if name == "add":
+            user_parser.add_argument("--role", choices=ROLES, default="user")
+        user_parser.set_defaults(handler=handler)
+    set_role = user_commands.add_parser("set-role", help="change a user's role")
+    set_role.add_argument("username")
+    set_role.add_argument("role", choices=ROLES)
+    set_role.set_defaults(handler=cmd_users_set_role)
+
+    attachments = commands.add_parser("attachments", help="photos attached to reports")
+    attachment_commands = attachments.add_subparsers(dest="attachment_command", required=True)
+    attach = attachment_commands.add_parser("add", help="attach a photo file to a report")
+    attach.add_argument("report_id", type=int)
+    attach.add_argument("file")
+    attach.add_argument("--username", required=True, help="the report's submitter, or an admin")
+    attach.set_defaults(handler=cmd_attachments_add)
+    list_attachments = attachment_commands.add_parser("list", help="the photos of a report")
+    list_attachments.add_argument("report_id", type=int)
+    list_attachments.set_defaults(handler=cmd_attachments_list)
+    remove = attachment_commands.add_parser("remove", help="detach a photo, deleting its file if unused")
+    remove.add_argument("attachment_id", type=int)
+    remove.set_defaults(handler=cmd_attachments_remove)
+    return parser
+
+
+def main(argv=None):
+    """Command line entry point; returns the process exit code"""
+    import index
+
+    args = build_parser().parse_args(argv)
+    db = None
+    try:
+        db = index.get_db()
+        emit(args.handler(db, args))
+        return 0
+    except ValueError as err:
+        emit({"error": str(err)})
+        return 2
+    except (StorageError, PoolTimeoutError) as err:
+        logging.error(f"CLI {args.command} failed: {err}")
+        emit({"error": str(err)})
+        return 1
+    finally:
+        # Shuts down the password hashing processes and the pooled connections
+        if db is not None:
+            index.stop_metrics()
+            db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
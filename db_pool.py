@@ -0,0 +1,239 @@
+"""Process-wide database connection pool for the infrastructure reporting system"""
+
+import time
+import queue
+import logging
+import weakref
+import threading
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout"""
+
+
+class PoolMetrics:
+    """Thread-safe counters describing how the pool is being used"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.borrows = 0
+        self.returns = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+        self.failures = 0
+        self.health_check_failures = 0
+        self.created = 0
+        self.discarded = 0
+        self.leaked = 0
+        self.in_use = 0
+        self.max_in_use = 0
+
+    def incr(self, name, amount=1):
+        """Increment a counter by name"""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+            if name == "in_use" and self.in_use > self.max_in_use:
+                self.max_in_use = self.in_use
+
+    def snapshot(self):
+        """Return a point-in-time copy of every counter"""
+        with self._lock:
+            return {
+                "borrows": self.borrows,
+                "returns": self.returns,
+                "waits": self.waits,
+                "avg_wait_ms": round(self.wait_time / self.waits * 1000, 2) if self.waits else 0.0,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "health_check_failures": self.health_check_failures,
+                "created": self.created,
+                "discarded": self.discarded,
+                "leaked": self.leaked,
+                "in_use": self.in_use,
+                "max_in_use": self.max_in_use,
+            }
+
+
+def default_health_check(conn):
+    """Return True if a raw driver connection is still usable"""
+    is_connected = getattr(conn, "is_connected", None)
+    if is_connected is not None:
+        return is_connected()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        return True
+    finally:
+        cursor.close()
+
+
+class PooledConnection:
+    """Proxy around a driver connection whose close() hands it back to the pool
+
+    A proxy garbage collected without being closed gives its slot back and
+    discards the connection, whose state is unknown, so a forgotten close()
+    cannot shrink the pool for good.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._finalizer = weakref.finalize(self, pool.reclaim, raw)
+        # Nothing to give back once the process is exiting
+        self._finalizer.atexit = False
+
+    @property
+    def raw(self):
+        """The underlying driver connection"""
+        if self._raw is None:
+            raise RuntimeError("Connection has already been returned to the pool")
+        return self._raw
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+    def close(self):
+        """Return the connection to the pool instead of closing the socket"""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._finalizer.detach()
+            self._pool.release(raw)
+
+    def discard(self):
+        """Close the underlying connection and drop it from the pool"""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._finalizer.detach()
+            self._pool.release(raw, discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Bounded pool of reusable connections built from a factory callable
+
+    Connections are created lazily up to ``size``. A borrower that finds the
+    pool exhausted waits up to ``timeout`` seconds before PoolTimeoutError is
+    raised. Idle connections that have not been used for ``check_after``
+    seconds are health checked before being handed out.
+    """
+
+    def __init__(self, factory, size=5, timeout=5.0, check_after=30.0, health_check=default_health_check):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.check_after = check_after
+        self.health_check = health_check
+        self.metrics = PoolMetrics()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """Check out a connection, waiting up to ``timeout`` seconds for a free slot"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        timeout = self.timeout if timeout is None else timeout
+
+        if not self._slots.acquire(blocking=False):
+            self.metrics.incr("waits")
+            started = time.perf_counter()
+            acquired = self._slots.acquire(timeout=timeout)
+            self.metrics.incr("wait_time", time.perf_counter() - started)
+            if not acquired:
+                self.metrics.incr("timeouts")
+                raise PoolTimeoutError(f"No database connection available after {timeout:.1f}s")
+
+        try:
+            raw = self._checkout_idle()
+            if raw is None:
+                raw = self._create()
+        except Exception:
+            self._slots.release()
+            raise
+
+        self.metrics.incr("borrows")
+        self.metrics.incr("in_use")
+        return PooledConnection(self, raw)
+
+    def _checkout_idle(self):
+        """Pop a healthy idle connection, discarding any that fail their check"""
+        while True:
+            try:
+                raw, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if time.monotonic() - last_used < self.check_after:
+                return raw
+            try:
+                healthy = self.health_check(raw)
+            except Exception as err:
+                logging.warning(f"Pooled connection health check raised: {err}")
+                healthy = False
+            if healthy:
+                return raw
+            self.metrics.incr("health_check_failures")
+            self._close_raw(raw)
+
+    def _create(self):
+        """Open a brand-new driver connection"""
+        try:
+            raw = self.factory()
+        except Exception:
+            self.metrics.incr("failures")
+            raise
+        self.metrics.incr("created")
+        return raw
+
+    def release(self, raw, discard=False):
+        """Return a raw connection to the idle set, rolling back any open transaction"""
+        self.metrics.incr("in_use", -1)
+        self.metrics.incr("returns")
+        try:
+            if not discard and not self._closed:
+                if getattr(raw, "in_transaction", True):
+                    raw.rollback()
+                self._idle.put((raw, time.monotonic()))
+            else:
+                self._close_raw(raw)
+        except Exception as err:
+            logging.warning(f"Discarding pooled connection on release: {err}")
+            self._close_raw(raw)
+        finally:
+            self._slots.release()
+
+    def reclaim(self, raw):
+        """Discard the connection of a PooledConnection that was never closed"""
+        self.metrics.incr("leaked")
+        logging.warning("A pooled connection was garbage collected without being closed; discarding it")
+        self.release(raw, discard=True)
+
+    def _close_raw(self, raw):
+        self.metrics.incr("discarded")
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        """Close every idle connection, leaving checked-out ones untouched"""
+        while True:
+            try:
+                raw, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_raw(raw)
+
+    def close(self):
+        """Close the pool and every idle connection"""
+        self._closed = True
+        self.close_idle()
@@ -0,0 +1,271 @@
+"""Near-duplicate detection for newly submitted reports
+
+Each open report that is not itself a duplicate (a *canonical* report) is
+summarised by a MinHash signature of the character shingles of its
+description and location. The signature is cut into LSH bands, and each
+band is stored in ``report_signatures`` under a key that also carries the
+issue type and the geohash cell of the report's coordinates (or, without
+coordinates, the numbers in its location text). Two reports of
+the same type, close together and with similar text then share at least
+one key with high probability.
+
+A new report looks up the keys it would have within DUPLICATE_RADIUS_M of
+its own position, verifies the few candidates found by exact shingle
+similarity and distance, and is either linked to the best one through
+``reports.duplicate_of`` or indexed as a new canonical report. Duplicates
+are never indexed and closed reports are removed, so a burst of identical
+reports costs the same bounded lookup as a single one whatever the table
+size.
+"""
+
+import re
+import zlib
+import random
+import hashlib
+
+import geo
+
+OPEN_STATUSES = ("Pending", "In Progress")
+
+SHINGLE_SIZE = 4
+NUM_HASHES = 32
+BANDS = 8
+ROWS_PER_BAND = NUM_HASHES // BANDS
+
+# Exact shingle Jaccard similarity a candidate needs to count as a duplicate
+SIMILARITY_THRESHOLD = 0.6
+
+# Reports with coordinates further apart than this are never duplicates
+DUPLICATE_RADIUS_M = 250
+
+# Geohash length of the location buckets; 6 characters is about 1.2 km x 0.6 km
+BUCKET_PRECISION = 6
+
+# Most candidates verified per report, best LSH agreement first
+MAX_CANDIDATES = 20
+
+_PRIME = (1 << 61) - 1
+_seeds = random.Random(20240601)
+_PERMUTATIONS = [(_seeds.randrange(1, _PRIME), _seeds.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def shingles(description, location):
+    """Return the set of character shingles of a report's normalised text"""
+    text = _NON_WORD.sub(" ", f"{description} {location}".lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[start:start + SHINGLE_SIZE] for start in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def signature(shingle_set):
+    """MinHash signature: NUM_HASHES minimum hash values over the shingles"""
+    hashes = [zlib.crc32(shingle.encode()) for shingle in shingle_set] or [0]
+    return [min([(a * value + b) % _PRIME for value in hashes]) for a, b in _PERMUTATIONS]
+
+
+def _key(issue_type, bucket, band, values):
+    digest = hashlib.blake2b(f"{issue_type}|{bucket}|{band}|{values}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def band_keys(issue_type, minhash, buckets):
+    """Return the LSH keys of a signature in each location bucket"""
+    bands = [tuple(minhash[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]) for band in range(BANDS)]
+    return [_key(issue_type, bucket, band, values) for bucket in buckets for band, values in enumerate(bands)]
+
+
+def _text_bucket(location):
+    """Bucket of a report without coordinates: the numbers in its location
+
+    The text is all there is to place such a report, and "Main Street 12"
+    and "Main Street 21" are different places however similar they read.
+    """
+    return "#" + ",".join(sorted(set(_NUMBER.findall(location or ""))))
+
+
+def _own_bucket(location, latitude, longitude):
+    if latitude is None:
+        return _text_bucket(location)
+    return geo.encode(latitude, longitude, BUCKET_PRECISION)
+
+
+def _nearby_buckets(location, latitude, longitude):
+    if latitude is None:
+        return [_text_bucket(location)]
+    return geo.cover(latitude, longitude, DUPLICATE_RADIUS_M, BUCKET_PRECISION)
+
+
+def candidates_statement(keys):
+    """Build the query for the reports sharing most of ``keys`` and return (sql, params)
+
+    Only the postings of the given keys are read, and duplicates are never
+    indexed, so each key holds a handful of canonical reports at most.
+    """
+    placeholders = ", ".join(["%s"] * len(keys))
+    sql = f"""
+        SELECT hits.report_id, hits.agreement
+        FROM (
+            SELECT s.report_id, COUNT(*) AS agreement
+            FROM report_signatures s
+            WHERE s.band_key IN ({placeholders})
+            GROUP BY s.report_id
+        ) hits
+        ORDER BY hits.agreement DESC, hits.report_id
+        LIMIT %s
+    """
+    return sql, list(keys) + [MAX_CANDIDATES]
+
+
+def find_duplicate(db, cursor, issue_type, location, latitude, longitude, own, minhash):
+    """Return the id of the canonical open report a new report duplicates, or None
+
+    ``own`` and ``minhash`` are the new report's shingles and signature.
+    """
+    keys = band_keys(issue_type, minhash, _nearby_buckets(location, latitude, longitude))
+    db.execute(cursor, *candidates_statement(keys))
+    candidates = [row[0] for row in cursor.fetchall()]
+    if not candidates:
+        return None
+    placeholders = ", ".join(["%s"] * len(candidates))
+    db.execute(
+        cursor,
+        f"SELECT id, issue_type, description, location, latitude, longitude FROM reports WHERE id IN ({placeholders})",
+        candidates
+    )
+    best, best_similarity = None, SIMILARITY_THRESHOLD
+    for report_id, other_type, other_description, other_location, other_latitude, other_longitude in cursor.fetchall():
+        # Checked here rather than in the WHERE clause, which would tempt the
+        # planner away from the primary key; band keys already carry the type
+        if other_type != issue_type:
+            continue
+        if latitude is not None and other_latitude is not None and \
+                geo.distance_m(latitude, longitude, other_latitude, other_longitude) > DUPLICATE_RADIUS_M:
+            continue
+        similarity = jaccard(own, shingles(other_description, other_location))
+        if similarity > best_similarity or (similarity == best_similarity and best is not None and report_id < best):
+            best, best_similarity = report_id, similarity
+    return best
+
+
+def index_report(db, cursor, report_id, issue_type, location, latitude, longitude, minhash):
+    """Store a canonical report's band keys inside the caller's transaction"""
+    keys = band_keys(issue_type, minhash, [_own_bucket(location, latitude, longitude)])
+    cursor.executemany(
+        db.backend.adapt("INSERT INTO report_signatures (band_key, report_id) VALUES (%s, %s)"),
+        [(key, report_id) for key in set(keys)]
+    )
+
+
+def link_or_index(db, cursor, reports):
+    """Link each new open report to a duplicate or index it as canonical, in order
+
+    ``reports`` holds (id, issue_type, description, location, latitude,
+    longitude) tuples. Returns {report_id: canonical_id} for the duplicates.
+    Earlier reports of the same call are already indexed when later ones are
+    checked, so duplicates within one batch are found too.
+    """
+    links = {}
+    for report_id, issue_type, description, location, latitude, longitude in reports:
+        own = shingles(description, location)
+        minhash = signature(own)
+        canonical = find_duplicate(db, cursor, issue_type, location, latitude, longitude, own, minhash)
+        if canonical is None:
+            index_report(db, cursor, report_id, issue_type, location, latitude, longitude, minhash)
+        else:
+            links[report_id] = canonical
+    if links:
+        # A link is derived data: keep updated_at, which MySQL would otherwise stamp
+        cursor.executemany(
+            db.backend.adapt("UPDATE reports SET duplicate_of = %s, updated_at = updated_at WHERE id = %s"),
+            [(canonical, report_id) for report_id, canonical in links.items()]
+        )
+    return links
+
+
+def remove_reports(db, cursor, report_ids):
+    """Drop the band keys of reports that were closed"""
+    for start in range(0, len(report_ids), 500):
+        chunk = list(report_ids[start:start + 500])
+        db.execute(cursor, f"DELETE FROM report_signatures WHERE report_id IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+
+def reindex_reports(db, cursor, report_ids):
+    """Index reopened canonical reports again; duplicates stay linked and unindexed"""
+    for start in range(0, len(report_ids), 500):
+        chunk = list(report_ids[start:start + 500])
+        db.execute(
+            cursor,
+            f"SELECT id, issue_type, description, location, latitude, longitude FROM reports"
+            f" WHERE id IN ({', '.join(['%s'] * len(chunk))}) AND duplicate_of IS NULL",
+            chunk
+        )
+        for report_id, issue_type, description, location, latitude, longitude in cursor.fetchall():
+            minhash = signature(shingles(description, location))
+            index_report(db, cursor, report_id, issue_type, location, latitude, longitude, minhash)
+
+
+def status_changed(db, cursor, report_ids, old_status, new_status):
+    """Keep the index to open reports after ``report_ids`` moved between statuses"""
+    was_open, is_open = old_status in OPEN_STATUSES, new_status in OPEN_STATUSES
+    if was_open and not is_open:
+        remove_reports(db, cursor, report_ids)
+    elif is_open and not was_open:
+        reindex_reports(db, cursor, report_ids)
+
+
+def process_new(db, cursor, after_id):
+    """Run link_or_index over the open, unprocessed reports with ids above ``after_id``
+
+    For inserts whose ids are not known individually. Reports a concurrent
+    submission already indexed or linked are skipped.
+    """
+    db.execute(
+        cursor,
+        f"""
+        SELECT r.id, r.issue_type, r.description, r.location, r.latitude, r.longitude
+        FROM reports r
+        WHERE r.id > %s AND r.status IN ({', '.join(['%s'] * len(OPEN_STATUSES))}) AND r.duplicate_of IS NULL
+          AND NOT EXISTS (SELECT 1 FROM report_signatures s WHERE s.report_id = r.id)
+        ORDER BY r.id
+        """,
+        (after_id,) + OPEN_STATUSES
+    )
+    return link_or_index(db, cursor, cursor.fetchall())
+
+
+def rebuild(db, batch_size=5000):
+    """Re-run detection over every open report from scratch; returns the number linked
+
+    Earlier reports become canonical for later ones, as if they had been
+    submitted with detection on.
+    """
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, "DELETE FROM report_signatures")
+        db.execute(cursor, "UPDATE reports SET duplicate_of = NULL, updated_at = updated_at WHERE duplicate_of IS NOT NULL")
+
+    linked, last_id = 0, 0
+    while True:
+        with db.cursor(commit=True) as cursor:
+            db.execute(
+                cursor,
+                f"""
+                SELECT id, issue_type, description, location, latitude, longitude FROM reports
+                WHERE id > %s AND status IN ({', '.join(['%s'] * len(OPEN_STATUSES))})
+                ORDER BY id LIMIT %s
+                """,
+                (last_id,) + OPEN_STATUSES + (batch_size,)
+            )
+            rows = cursor.fetchall()
+            linked += len(link_or_index(db, cursor, rows))
+        if not rows:
+            return linked
+        last_id = rows[-1][0]
@@ -0,0 +1,127 @@
+"""Streaming export of reports joined to their authors as CSV or JSONL
+
+Rows are read from a streaming cursor in fixed-size batches and written as
+they arrive, so memory use stays flat however many reports match. The
+filters are those of the admin report list and search screens.
+
+    python export.py reports.csv --status Pending
+    python export.py outages.jsonl.gz --issue-type "Power Outage" --preset this_month
+    python export.py - --format jsonl --keywords "main street" | head
+"""
+
+import io
+import os
+import csv
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+
+from filters import add_filter_arguments, filter_from_args
+from storage import REPORT_EXPORT_FIELDS, STREAM_BATCH_SIZE, StorageError, ReportRepository
+
+FORMATS = ("csv", "jsonl")
+
+# Output column names, matching REPORT_EXPORT_FIELDS
+EXPORT_COLUMNS = [field.split(".")[1] for field in REPORT_EXPORT_FIELDS]
+
+
+def detect_format(path):
+    """Return (format, gzip) guessed from an output file name"""
+    base, extension = os.path.splitext(path.lower())
+    compressed = extension == ".gz"
+    if compressed:
+        extension = os.path.splitext(base)[1]
+    extension = extension.lstrip(".")
+    if extension in ("json", "ndjson"):
+        extension = "jsonl"
+    if extension not in FORMATS:
+        raise ValueError(f"Cannot tell the format of '{path}'; pass --format")
+    return extension, compressed
+
+
+def _value(value):
+    return value.isoformat(" ") if hasattr(value, "isoformat") else value
+
+
+def write_rows(rows, stream, fmt):
+    """Write report rows to a text stream and return how many were written"""
+    count = 0
+    if fmt == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow([_value(value) for value in row])
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(EXPORT_COLUMNS, map(_value, row)))) + "\n")
+            count += 1
+    return count
+
+
+def export_reports(db, report_filter, stream, fmt, batch_size=STREAM_BATCH_SIZE):
+    """Stream every report matching ``report_filter`` to ``stream`` and return the row count"""
+    return write_rows(ReportRepository(db).stream(report_filter, batch_size), stream, fmt)
+
+
+def open_output(path, compressed):
+    """Open a text stream for the export, gzipped if asked; "-" is stdout"""
+    if path == "-":
+        if compressed:
+            return io.TextIOWrapper(gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb"), encoding="utf-8", newline="")
+        return sys.stdout
+    if compressed:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def main(argv=None):
+    """Command line entry point for report exports"""
+    import index
+
+    parser = argparse.ArgumentParser(description="Export reports and their authors as CSV or JSONL")
+    parser.add_argument("output", help="output file, or - for stdout")
+    parser.add_argument("--format", choices=FORMATS, help="output format (default: from the file name)")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output (default: if the name ends in .gz)")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE,
+                        help=f"rows fetched per round trip (default: {STREAM_BATCH_SIZE})")
+    add_filter_arguments(parser)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.format:
+            fmt, compressed = args.format, args.output.lower().endswith(".gz")
+        else:
+            fmt, compressed = detect_format(args.output)
+        report_filter = filter_from_args(args)
+    except ValueError as err:
+        parser.error(str(err))
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+    compressed = compressed or args.gzip
+
+    started = time.perf_counter()
+    stream = open_output(args.output, compressed)
+    try:
+        count = export_reports(index.get_db(), report_filter, stream, fmt, args.batch_size)
+    except StorageError as err:
+        logging.error(f"Export failed: {err}")
+        print(f"Error: export failed: {err}", file=sys.stderr)
+        return 1
+    finally:
+        if stream is sys.stdout:
+            stream.flush()
+        else:
+            stream.close()
+
+    seconds = time.perf_counter() - started
+    print(f"Exported {count} report(s) ({report_filter.describe()}) in {seconds:.2f}s.", file=sys.stderr)
+    logging.info(f"Exported {count} report(s) to {args.output} ({report_filter.describe()})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
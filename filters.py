@@ -0,0 +1,158 @@
+"""Validated report search filters shared by every front end"""
+
+import datetime
+from collections import namedtuple
+
+from storage import ISSUE_TYPES, STATUSES
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Preset name -> menu label, in display order
+DATE_PRESETS = {
+    "today": "Today",
+    "last_7_days": "Last 7 Days",
+    "this_month": "This Month",
+}
+
+
+class FilterError(ValueError):
+    """Raised when user-supplied filter input is invalid"""
+
+
+def parse_date(text):
+    """Parse a YYYY-MM-DD string into a date"""
+    try:
+        return datetime.datetime.strptime(text.strip(), DATE_FORMAT).date()
+    except ValueError:
+        raise FilterError(f"Invalid date '{text}'. Use YYYY-MM-DD.") from None
+
+
+def date_range(start_text, end_text):
+    """Return the half-open [start, end) timestamps covering two inclusive dates
+
+    Comparing ``created_at`` against plain timestamps keeps the predicate
+    sargable, unlike wrapping the column in DATE().
+    """
+    start, end = parse_date(start_text), parse_date(end_text)
+    if start > end:
+        raise FilterError("Start date must be on or before the end date.")
+    return _day_start(start), _day_start(end + datetime.timedelta(days=1))
+
+
+def preset_range(name, today=None):
+    """Return the half-open [start, end) timestamps for a named preset"""
+    today = today or datetime.date.today()
+    tomorrow = today + datetime.timedelta(days=1)
+    if name == "today":
+        return _day_start(today), _day_start(tomorrow)
+    if name == "last_7_days":
+        return _day_start(today - datetime.timedelta(days=6)), _day_start(tomorrow)
+    if name == "this_month":
+        first = today.replace(day=1)
+        next_first = (first + datetime.timedelta(days=32)).replace(day=1)
+        return _day_start(first), _day_start(next_first)
+    raise FilterError(f"Unknown date preset '{name}'.")
+
+
+def _day_start(day):
+    return datetime.datetime.combine(day, datetime.time.min)
+
+
+class ReportFilter(namedtuple("ReportFilter", [
+        "report_ids", "username", "issue_type", "status", "keywords", "created_range", "id_range"],
+        defaults=(None,) * 7)):
+    """Criteria a set of reports must all match; fields left as None match everything
+
+    These are the filters of the admin report list (status) and search
+    screens (id, username, issue type, keywords, created range), so the
+    same selection can be exported or updated in bulk. ``id_range`` is an
+    inclusive (first, last) pair.
+    """
+
+    def is_empty(self):
+        return all(value is None for value in self)
+
+    def describe(self):
+        """Human-readable summary of the active criteria"""
+        parts = []
+        if self.report_ids is not None:
+            parts.append(f"{len(self.report_ids)} report id(s)")
+        if self.id_range is not None:
+            parts.append(f"ids {self.id_range[0]}-{self.id_range[1]}")
+        if self.username is not None:
+            parts.append(f"username contains '{self.username}'")
+        if self.issue_type is not None:
+            parts.append(f"issue type {self.issue_type}")
+        if self.status is not None:
+            parts.append(f"status {self.status}")
+        if self.keywords is not None:
+            parts.append(f"keywords '{self.keywords}'")
+        if self.created_range is not None:
+            start, end = self.created_range
+            parts.append(f"created {start:%Y-%m-%d} to {end - datetime.timedelta(days=1):%Y-%m-%d}")
+        return ", ".join(parts) or "all reports"
+
+
+def parse_id_selection(text):
+    """Parse "3,7,12" into {"report_ids": ...} or "100-250" into {"id_range": ...}"""
+    text = text.strip()
+    try:
+        if "-" in text:
+            first, last = (int(part) for part in text.split("-"))
+            if first > last:
+                raise FilterError("The first id of a range must not be greater than the last.")
+            return {"id_range": (first, last)}
+        report_ids = tuple(dict.fromkeys(int(part) for part in text.split(",") if part.strip()))
+    except ValueError:
+        raise FilterError(f"Invalid report ids '{text}'. Use a list like 3,7,12 or a range like 100-250.") from None
+    if not report_ids:
+        raise FilterError("Enter at least one report id.")
+    return {"report_ids": report_ids}
+
+
+def parse_choice(text, choices, field):
+    """Match text case-insensitively against an enum and return its schema spelling"""
+    canonical = {choice.lower(): choice for choice in choices}
+    try:
+        return canonical[text.strip().lower()]
+    except KeyError:
+        raise FilterError(f"Invalid {field} '{text}'. Choose from: {', '.join(choices)}.") from None
+
+
+def add_filter_arguments(parser):
+    """Add the report filter options to an argparse parser"""
+    group = parser.add_argument_group("report filters")
+    group.add_argument("--id", dest="report_ids", type=int, action="append", metavar="ID",
+                       help="report id (repeatable)")
+    group.add_argument("--id-range", metavar="FIRST-LAST", help="inclusive range of report ids")
+    group.add_argument("--username", help="author username contains this text")
+    group.add_argument("--issue-type", help=f"one of: {', '.join(ISSUE_TYPES)}")
+    group.add_argument("--status", help=f"one of: {', '.join(STATUSES)}")
+    group.add_argument("--keywords", help="every keyword appears in the location or description")
+    group.add_argument("--from", dest="start", metavar="YYYY-MM-DD", help="created on or after this date")
+    group.add_argument("--to", dest="end", metavar="YYYY-MM-DD", help="created on or before this date")
+    group.add_argument("--preset", choices=list(DATE_PRESETS), help="named created date range")
+    return group
+
+
+def filter_from_args(args):
+    """Build a validated ReportFilter from options added by add_filter_arguments"""
+    created_range = None
+    if args.preset:
+        if args.start or args.end:
+            raise FilterError("Use either --preset or --from/--to, not both.")
+        created_range = preset_range(args.preset)
+    elif args.start or args.end:
+        created_range = date_range(args.start or "1970-01-01", args.end or datetime.date.today().strftime(DATE_FORMAT))
+    id_range = parse_id_selection(args.id_range).get("id_range") if args.id_range else None
+    if args.id_range and id_range is None:
+        raise FilterError("--id-range takes FIRST-LAST.")
+    return ReportFilter(
+        report_ids=tuple(args.report_ids) if args.report_ids else None,
+        id_range=id_range,
+        username=args.username or None,
+        issue_type=parse_choice(args.issue_type, ISSUE_TYPES, "issue type") if args.issue_type else None,
+        status=parse_choice(args.status, STATUSES, "status") if args.status else None,
+        keywords=args.keywords or None,
+        created_range=created_range,
+    )
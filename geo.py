@@ -0,0 +1,161 @@
+"""Coordinates parsed from report locations and a geohash grid for radius queries
+
+Locations are free text ("address/coordinates"). When one contains a
+decimal latitude/longitude pair the report also stores ``latitude``,
+``longitude`` and the ``geohash`` of the point. Geohash cells nest, so every
+point in a cell shares the cell's prefix and a plain B-tree index on
+``geohash`` finds the reports in a cell with one range scan. A radius query
+covers its bounding box with a few cells, reads only the reports in them
+and keeps those within the exact great-circle distance, so its cost follows
+the number of reports nearby rather than the size of the table.
+"""
+
+import re
+import math
+
+EARTH_RADIUS_M = 6371008.8
+
+# Stored geohash length; 9 characters is a cell of about 5 m x 5 m
+GEOHASH_PRECISION = 9
+
+# A radius query uses the finest precision whose cover has at most this many cells
+MAX_COVER_CELLS = 16
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Sorts after every geohash character, so [prefix, prefix + PREFIX_END) is one cell
+PREFIX_END = "~"
+
+# A decimal pair such as "-1.9441, 30.0619" or "1.9441 S 30.0619 E". Both
+# numbers need a decimal point so house numbers are not read as coordinates.
+_COORDINATES = re.compile(
+    r"(?<![\d.])([-+]?\d{1,2}\.\d+)\s*°?\s*([NS])?\s*[,;/\s]\s*([-+]?\d{1,3}\.\d+)\s*°?\s*([EW])?(?![\d.])",
+    re.IGNORECASE
+)
+
+
+def parse_coordinates(text):
+    """Return (latitude, longitude) from the first coordinate pair in ``text``, or None"""
+    for match in _COORDINATES.finditer(text or ""):
+        latitude, longitude = float(match.group(1)), float(match.group(3))
+        if match.group(2) and match.group(2).upper() == "S":
+            latitude = -abs(latitude)
+        if match.group(4) and match.group(4).upper() == "W":
+            longitude = -abs(longitude)
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude
+    return None
+
+
+def _bits(precision):
+    """(longitude bits, latitude bits) of a geohash; longitude gets the odd one"""
+    return (5 * precision + 1) // 2, 5 * precision // 2
+
+
+def _cell(latitude, longitude, precision):
+    lon_bits, lat_bits = _bits(precision)
+    x = min(int((longitude + 180) / 360 * (1 << lon_bits)), (1 << lon_bits) - 1)
+    y = min(int((latitude + 90) / 180 * (1 << lat_bits)), (1 << lat_bits) - 1)
+    return x, y
+
+
+def _cell_hash(x, y, precision):
+    """Geohash of grid cell (x, y) by interleaving longitude and latitude bits"""
+    lon_bits, lat_bits = _bits(precision)
+    value = 0
+    for position in range(5 * precision):
+        if position % 2 == 0:
+            bit = (x >> (lon_bits - 1 - position // 2)) & 1
+        else:
+            bit = (y >> (lat_bits - 1 - position // 2)) & 1
+        value = (value << 1) | bit
+    return "".join(BASE32[(value >> shift) & 31] for shift in range(5 * (precision - 1), -1, -5))
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point"""
+    return _cell_hash(*_cell(latitude, longitude, precision), precision)
+
+
+def locate(location):
+    """Return (latitude, longitude, geohash) for a location text; all None without coordinates"""
+    point = parse_coordinates(location)
+    if point is None:
+        return None, None, None
+    return point[0], point[1], encode(*point)
+
+
+def distance_m(latitude1, longitude1, latitude2, longitude2):
+    """Great-circle (haversine) distance between two points in metres"""
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(longitude2 - longitude1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_m):
+    """Return (south, north, west, east) degrees enclosing a circle
+
+    West and east may fall outside -180..180 when the circle crosses the
+    antimeridian; ``cover`` wraps them.
+    """
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    south, north = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+    widest = max(abs(south), abs(north))
+    if widest >= 90:
+        return south, north, -180.0, 180.0
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * math.cos(math.radians(widest))))
+    if dlon >= 180:
+        return south, north, -180.0, 180.0
+    return south, north, longitude - dlon, longitude + dlon
+
+
+def cover(latitude, longitude, radius_m, precision=None):
+    """Return geohash prefixes whose cells together contain the circle
+
+    Without a ``precision`` the finest one giving at most MAX_COVER_CELLS
+    cells is used; with one, every cell of that length the box touches.
+    """
+    south, north, west, east = bounding_box(latitude, longitude, radius_m)
+    precisions = range(GEOHASH_PRECISION, 0, -1) if precision is None else (precision,)
+    for precision in precisions:
+        lon_bits, lat_bits = _bits(precision)
+        columns = 1 << lon_bits
+        x0 = math.floor((west + 180) / 360 * columns)
+        x1 = min(math.floor((east + 180) / 360 * columns), x0 + columns - 1)
+        y0 = _cell(south, 0, precision)[1]
+        y1 = _cell(north, 0, precision)[1]
+        count = (x1 - x0 + 1) * (y1 - y0 + 1)
+        if count <= MAX_COVER_CELLS or precision == precisions[-1]:
+            return [_cell_hash(x % columns, y, precision)
+                    for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+
+def backfill(db, batch_size=5000):
+    """Fill the coordinate columns of every report from its location; returns how many have coordinates"""
+    located, last_id = 0, 0
+    while True:
+        with db.cursor(commit=True) as cursor:
+            db.execute(
+                cursor,
+                "SELECT id, location FROM reports WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            updates = []
+            for report_id, location in rows:
+                latitude, longitude, geohash = locate(location)
+                if geohash is not None:
+                    updates.append((latitude, longitude, geohash, report_id))
+            if updates:
+                # Setting updated_at to itself stops MySQL's ON UPDATE CURRENT_TIMESTAMP
+                cursor.executemany(
+                    db.backend.adapt("UPDATE reports SET latitude = %s, longitude = %s, geohash = %s, "
+                                     "updated_at = updated_at WHERE id = %s"),
+                    updates
+                )
+        if not rows:
+            return located
+        located += len(updates)
+        last_id = rows[-1][0]
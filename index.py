@@ -4,12 +4,88 @@ import os
 import time
 import logging
 import getpass
-import mysql.connector # type: ignore
-from prettytable import PrettyTable # type: ignore
 from colorama import init, Fore, Style # type: ignore
+from db_pool import PoolTimeoutError
+from filters import DATE_PRESETS, FilterError, ReportFilter, date_range, parse_id_selection, preset_range
+from migrations import migrate
+from geo import parse_coordinates
+from passwords import DEFAULT_COST
+from query_metrics import DEFAULT_SLOW_QUERY_MS, MetricsExporter, slow_query_log
+from attachments import MAX_ATTACHMENT_BYTES, AttachmentError, AttachmentStore
+from table_view import MY_REPORT_COLUMNS, NEARBY_COLUMNS, REPORT_COLUMNS, USER_COLUMNS, TableRenderer
+from write_queue import DEFAULT_MAX_BATCH, DEFAULT_MAX_DELAY, WriteQueue
+from storage import (
+    Database, StorageError, UsernameTakenError, UserRepository, ReportRepository, CounterRepository, AttachmentRepository,
+    ISSUE_TYPES, SEVERITIES, STATUSES, DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, MAX_NEARBY_RADIUS_M, backend_from_env
+)
 
 init()
 
+# MySQL connection parameters (INFRA_DB_BACKEND=sqlite runs on an embedded database instead)
+DB_CONFIG = {
+    "user": "root",
+    "password": "root",
+    "host": "localhost",
+    "database": "infrastructure_db"
+}
+
+# Connection pool settings, overridable from the environment
+POOL_SIZE = int(os.environ.get("INFRA_DB_POOL_SIZE", "5"))
+POOL_TIMEOUT = float(os.environ.get("INFRA_DB_POOL_TIMEOUT", "5"))
+POOL_CHECK_AFTER = float(os.environ.get("INFRA_DB_POOL_CHECK_AFTER", "30"))
+
+# In-process cache of user ids, names and roles: entries kept and seconds before a reread
+USER_CACHE_SIZE = int(os.environ.get("INFRA_USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL = float(os.environ.get("INFRA_USER_CACHE_TTL", "300"))
+# Seconds a cached role is trusted by permission checks
+USER_ROLE_TTL = float(os.environ.get("INFRA_USER_ROLE_TTL", "5"))
+
+# Resolved report details kept in process for the detail view
+REPORT_CACHE_SIZE = int(os.environ.get("INFRA_REPORT_CACHE_SIZE", "1024"))
+
+# Password hash cost (log2 of the scrypt N) and the processes that check hashes;
+# 0 workers hashes on the calling thread
+PASSWORD_COST = int(os.environ.get("INFRA_PASSWORD_COST", str(DEFAULT_COST)))
+HASH_WORKERS = int(os.environ.get("INFRA_HASH_WORKERS", "1"))
+
+# Rows per page in the report list views
+PAGE_SIZE = int(os.environ.get("INFRA_PAGE_SIZE", str(DEFAULT_PAGE_SIZE)))
+
+# Maximum number of ranked keyword search results
+SEARCH_LIMIT = int(os.environ.get("INFRA_SEARCH_LIMIT", str(DEFAULT_SEARCH_LIMIT)))
+
+# Radius offered by the "near a location" search, in metres
+DEFAULT_NEARBY_RADIUS_M = int(os.environ.get("INFRA_NEARBY_RADIUS", "500"))
+
+# Reports changed per UPDATE statement by a batch status update
+BATCH_UPDATE_CHUNK = int(os.environ.get("INFRA_BATCH_UPDATE_CHUNK", "1000"))
+
+# Set INFRA_WRITE_QUEUE to a journal file path to accept submissions through
+# the group-commit write queue instead of one commit per report
+WRITE_QUEUE_JOURNAL = os.environ.get("INFRA_WRITE_QUEUE")
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get("INFRA_WRITE_QUEUE_BATCH", str(DEFAULT_MAX_BATCH)))
+WRITE_QUEUE_MAX_DELAY = float(os.environ.get("INFRA_WRITE_QUEUE_DELAY", str(DEFAULT_MAX_DELAY)))
+
+# Directory of the photo store and the largest photo accepted
+ATTACHMENTS_DIR = os.environ.get("INFRA_ATTACHMENTS_DIR", "attachments")
+ATTACHMENT_MAX_BYTES = int(float(os.environ.get("INFRA_ATTACHMENT_MAX_MB", str(MAX_ATTACHMENT_BYTES / (1024 * 1024)))) * 1024 * 1024)
+
+# Closed reports unchanged for this many days are moved to the archive by archive.py
+ARCHIVE_AFTER_DAYS = int(os.environ.get("INFRA_ARCHIVE_AFTER_DAYS", "180"))
+
+# Statements at least this slow are written, parameters redacted, to the slow query log
+SLOW_QUERY_MS = float(os.environ.get("INFRA_SLOW_QUERY_MS", str(DEFAULT_SLOW_QUERY_MS)))
+SLOW_QUERY_LOG = os.environ.get("INFRA_SLOW_QUERY_LOG", "slow_queries.log")
+
+# Prometheus text file of the query metrics, rewritten every INFRA_METRICS_INTERVAL seconds
+METRICS_FILE = os.environ.get("INFRA_METRICS_FILE")
+METRICS_INTERVAL = float(os.environ.get("INFRA_METRICS_INTERVAL", "15"))
+
+_db = None
+_write_queue = None
+_attachment_store = None
+_metrics_exporter = None
+
 def clear_screen():
     """Clear the terminal screen based on OS"""
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -24,73 +100,109 @@ def display_banner():
     ╚══════════════════════════════════════════════════════════╝{Style.RESET_ALL}"""
     print(banner)
 
-def connect_to_db():
-    """Connect to MySQL database"""
+def get_db():
+    """Return the process-wide database (backend plus connection pool), creating it on first use"""
+    global _db
+    if _db is None:
+        backend = backend_from_env(DB_CONFIG)
+        _db = Database(backend, pool_size=POOL_SIZE, pool_timeout=POOL_TIMEOUT, check_after=POOL_CHECK_AFTER,
+                       user_cache_size=USER_CACHE_SIZE, user_cache_ttl=USER_CACHE_TTL, user_role_ttl=USER_ROLE_TTL,
+                       report_cache_size=REPORT_CACHE_SIZE, password_cost=PASSWORD_COST,
+                       hash_workers=HASH_WORKERS, slow_query_ms=SLOW_QUERY_MS)
+        logging.info(f"Using {backend.name} storage backend (pool size={POOL_SIZE}, timeout={POOL_TIMEOUT}s)")
+        start_metrics(_db)
+    return _db
+
+def start_slow_query_log():
+    """Send slow queries to their own log file (only the interactive app and the server do)"""
+    if SLOW_QUERY_LOG and not slow_query_log.handlers:
+        handler = logging.FileHandler(SLOW_QUERY_LOG)
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(message)s"))
+        slow_query_log.addHandler(handler)
+        slow_query_log.propagate = False
+
+def start_metrics(db):
+    """Start the Prometheus file exporter if configured"""
+    global _metrics_exporter
+    if METRICS_FILE and _metrics_exporter is None:
+        _metrics_exporter = MetricsExporter(db, METRICS_FILE, METRICS_INTERVAL).start()
+        logging.info(f"Writing query metrics to {METRICS_FILE} every {METRICS_INTERVAL}s")
+
+def stop_metrics():
+    """Stop the metrics exporter after writing the file one last time"""
+    global _metrics_exporter
+    if _metrics_exporter is not None:
+        _metrics_exporter.stop()
+        _metrics_exporter = None
+
+def get_write_queue():
+    """Return the started write queue if INFRA_WRITE_QUEUE is set, otherwise None"""
+    global _write_queue
+    if _write_queue is None and WRITE_QUEUE_JOURNAL:
+        _write_queue = WriteQueue(
+            get_db(), WRITE_QUEUE_JOURNAL, WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_DELAY
+        ).start()
+        logging.info(f"Accepting submissions through the write queue journal {WRITE_QUEUE_JOURNAL}")
+    return _write_queue
+
+def get_attachment_store():
+    """Return the process-wide photo store, creating its directory on first use"""
+    global _attachment_store
+    if _attachment_store is None:
+        _attachment_store = AttachmentStore(ATTACHMENTS_DIR, ATTACHMENT_MAX_BYTES)
+    return _attachment_store
+
+def users_repo():
+    """Repository for the users table"""
+    return UserRepository(get_db())
+
+def reports_repo():
+    """Repository for the reports table"""
+    return ReportRepository(get_db())
+
+def counters_repo():
+    """Repository for the statistics counters"""
+    return CounterRepository(get_db())
+
+def attachments_repo():
+    """Repository for the photo attachment metadata"""
+    return AttachmentRepository(get_db())
+
+def attach_photo(report_id, user_id):
+    """Offer to attach a photo from a local file to a report just submitted"""
+    path = input(f"{Fore.WHITE}Photo to attach (file path, Enter to skip): {Style.RESET_ALL}").strip().strip('"')
+    if not path:
+        return
     try:
-        conn = mysql.connector.connect(
-            user="root",
-            password="root",
-            host="localhost",
-            database="infrastructure_db"
-        )
-        logging.info("Successfully connected to MySQL database")
-        return conn
-    except mysql.connector.Error as err:
-        logging.error(f"Error connecting to database: {err}")
-        print(f"{Fore.RED}Database connection error: {err}{Style.RESET_ALL}")
-        return None
+        with open(path, "rb") as photo:
+            upload = get_attachment_store().put(photo)
+        with upload:
+            attachments_repo().add(report_id, user_id, upload.sha256, path, upload.content_type, upload.size,
+                                   place=upload.place)
+        print(f"{Fore.GREEN}📷 Photo attached ({upload.size / 1024:.0f} KiB).{Style.RESET_ALL}")
+    except (AttachmentError, OSError) as err:
+        print(f"{Fore.RED}Photo not attached: {err}{Style.RESET_ALL}")
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("attaching photo", err)
+
+def db_error(action, err):
+    """Log and display a database error raised while performing an action"""
+    logging.error(f"Error {action}: {err}")
+    if isinstance(err, PoolTimeoutError):
+        print(f"{Fore.RED}Database busy, please try again: {err}{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.RED}Error {action}: {err}{Style.RESET_ALL}")
 
 def setup_database():
-    """Set up the database schema and initial admin user"""
+    """Create or upgrade the database schema in place by applying pending migrations"""
     try:
-        conn = mysql.connector.connect(
-            user="root",
-            password="root",
-            host="localhost",
-        )
-
-        # Get a cursor and initialize the database
-        cursor = conn.cursor()
-        cursor.execute("DROP DATABASE IF EXISTS infrastructure_db;")
-        cursor.execute("CREATE DATABASE infrastructure_db;")
-        cursor.execute("USE infrastructure_db;")
-
-        # Create users table with password hashing note
-        cursor.execute("""
-            CREATE TABLE users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role ENUM('user', 'admin') NOT NULL DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        # Expanded reports table with timestamps and more status options
-        cursor.execute("""
-            CREATE TABLE reports (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                issue_type VARCHAR(100) NOT NULL,
-                severity ENUM('Low', 'Medium', 'High', 'Critical') NOT NULL DEFAULT 'Medium',
-                description TEXT NOT NULL,
-                location VARCHAR(255) NOT NULL,
-                status ENUM('Pending', 'In Progress', 'Resolved', 'Rejected') NOT NULL DEFAULT 'Pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            );
-        """)
-
-        # Create admin user
-        cursor.execute("INSERT INTO users (username, password, role) VALUES ('admin', 'admin123', 'admin')")
-        conn.commit()
-
-        logging.info("Database setup completed successfully")
-        print(f"{Fore.GREEN}Database setup completed successfully!{Style.RESET_ALL}")
-        cursor.close()
-        conn.close()
-    except mysql.connector.Error as err:
+        applied = migrate(get_db())
+        logging.info(f"Database setup completed successfully (applied migrations: {applied})")
+        if applied:
+            print(f"{Fore.GREEN}Database setup completed successfully! Applied migrations: {applied}{Style.RESET_ALL}")
+        else:
+            print(f"{Fore.GREEN}Database is already up to date.{Style.RESET_ALL}")
+    except (StorageError, PoolTimeoutError) as err:
         logging.error(f"Error setting up database: {err}")
         print(f"{Fore.RED}Database setup error: {err}{Style.RESET_ALL}")
 
@@ -102,6 +214,35 @@ def loading_animation(message, duration=1.5):
         time.sleep(duration/5)
     print()
 
+def print_page_footer(page, page_number):
+    """Show which page of a paginated report list is on screen"""
+    hints = []
+    if page.has_previous:
+        hints.append("previous")
+    if page.has_next:
+        hints.append("next")
+    more = f" ({' and '.join(hints)} available)" if hints else ""
+    print(f"\n{Fore.CYAN}Page {page_number}: {len(page.rows)} report(s){more}{Style.RESET_ALL}")
+
+def turn_page(page, page_number, position, forward):
+    """Return the keyset position and number of the next or previous page"""
+    if forward and page.has_next:
+        return {"after": page.last_key}, page_number + 1
+    if not forward and page.has_previous:
+        return {"before": page.first_key}, page_number - 1
+    print(f"{Fore.YELLOW}You are already on the {'last' if forward else 'first'} page.{Style.RESET_ALL}")
+    input("\nPress Enter to continue...")
+    return position, page_number
+
+def prompt_page_size(current):
+    """Ask for a new page size, keeping the current one on invalid input"""
+    value = input(f"{Fore.WHITE}Enter page size (current {current}): {Style.RESET_ALL}")
+    if value.isdigit() and int(value) > 0:
+        return int(value)
+    print(f"{Fore.RED}Page size must be a positive number.{Style.RESET_ALL}")
+    input("\nPress Enter to continue...")
+    return current
+
 def signup():
     """User registration function"""
     clear_screen()
@@ -127,32 +268,18 @@ def signup():
                 continue
             break
 
-        conn = connect_to_db()
-        if conn:
-            cursor = conn.cursor()
-            try:
-                # Check if username already exists
-                cursor.execute("SELECT username FROM users WHERE username = %s", (username,))
-                if cursor.fetchone():
-                    print(f"{Fore.RED}Username already exists. Please choose another one.{Style.RESET_ALL}")
-                    cursor.close()
-                    conn.close()
-                    continue
-
-                # Insert new user
-                cursor.execute("INSERT INTO users (username, password, role) VALUES (%s, %s, 'user')", (username, password))
-                conn.commit()
-                loading_animation("Creating account")
-                print(f"{Fore.GREEN}✅ User registered successfully!{Style.RESET_ALL}")
-                cursor.close()
-                conn.close()
-                input("\nPress Enter to continue...")
-                return
-            except mysql.connector.Error as err:
-                logging.error(f"Error during registration: {err}")
-                print(f"{Fore.RED}Error during registration: {err}{Style.RESET_ALL}")
-                cursor.close()
-                conn.close()
+        try:
+            # The unique username key rejects a taken name; no separate lookup needed
+            users_repo().create(username, password, "user")
+            loading_animation("Creating account")
+            print(f"{Fore.GREEN}✅ User registered successfully!{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+            return
+        except UsernameTakenError:
+            print(f"{Fore.RED}Username already exists. Please choose another one.{Style.RESET_ALL}")
+            continue
+        except (StorageError, PoolTimeoutError) as err:
+            db_error("during registration", err)
         break
 
 def login():
@@ -166,20 +293,19 @@ def login():
     
     loading_animation("Authenticating")
 
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, username, role FROM users WHERE username = %s AND password = %s", (username, password))
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
-        if user:
-            print(f"{Fore.GREEN}✅ Login successful! Welcome, {username}!{Style.RESET_ALL}")
-            time.sleep(1)
-            return user
-        else:
-            print(f"{Fore.RED}❌ Invalid username or password.{Style.RESET_ALL}")
-            input("\nPress Enter to continue...")
+    try:
+        user = users_repo().authenticate(username, password)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("during login", err)
+        return None
+
+    if user:
+        print(f"{Fore.GREEN}✅ Login successful! Welcome, {username}!{Style.RESET_ALL}")
+        time.sleep(1)
+        return user
+    else:
+        print(f"{Fore.RED}❌ Invalid username or password.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
     return None
 
 def display_user_dashboard(user_id, username):
@@ -250,163 +376,159 @@ def report_issue(user_id):
     severity = severity_types.get(severity_choice, "Medium")
 
     description = input(f"\n{Fore.WHITE}Describe the issue in detail: {Style.RESET_ALL}")
-    location = input(f"{Fore.WHITE}Enter location (address/coordinates): {Style.RESET_ALL}")
+    location = input(f"{Fore.WHITE}Enter location (address and/or coordinates, e.g. -1.9441, 30.0619): {Style.RESET_ALL}")
 
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "INSERT INTO reports (user_id, issue_type, severity, description, location) VALUES (%s, %s, %s, %s, %s)", 
-                (user_id, issue_type, severity, description, location)
-            )
-            conn.commit()
-
-            loading_animation("Submitting report")
+    try:
+        queue = get_write_queue()
+        if queue:
+            ticket = queue.submit(user_id, issue_type, severity, description, location)
+            report_id = queue.wait_for(ticket, queue.max_delay * 2)
+            error = queue.lookup(ticket)[2] if report_id is None else None
+            if error is not None:
+                print(f"{Fore.RED}The report could not be stored: {error}{Style.RESET_ALL}")
+                input("\nPress Enter to continue...")
+                return
             print(f"{Fore.GREEN}✅ Issue reported successfully!{Style.RESET_ALL}")
+            if report_id is None:
+                print(f"{Fore.CYAN}Your submission ticket is: {ticket}{Style.RESET_ALL}")
+                print("The report will appear in your list shortly.")
+            else:
+                print(f"{Fore.CYAN}Your report ID is: {report_id}{Style.RESET_ALL}")
+                attach_photo(report_id, user_id)
+            input("\nPress Enter to continue...")
+            return
 
-            # Get the report ID
-            cursor.execute("SELECT LAST_INSERT_ID()")
-            report_id = cursor.fetchone()[0]
-            print(f"{Fore.CYAN}Your report ID is: {report_id}{Style.RESET_ALL}")
+        repo = reports_repo()
+        report_id = repo.create(user_id, issue_type, severity, description, location)
+        duplicate_of = repo.duplicate_of(report_id)
+
+        loading_animation("Submitting report")
+        print(f"{Fore.GREEN}✅ Issue reported successfully!{Style.RESET_ALL}")
+        print(f"{Fore.CYAN}Your report ID is: {report_id}{Style.RESET_ALL}")
+        if duplicate_of:
+            print(f"{Fore.YELLOW}This looks like report #{duplicate_of}, which is already open nearby;"
+                  f" your report has been linked to it.{Style.RESET_ALL}")
+        attach_photo(report_id, user_id)
+        input("\nPress Enter to continue...")
+    except ValueError as err:
+        print(f"{Fore.RED}Report not submitted: {err}{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("submitting report", err)
+        input("\nPress Enter to continue...")
 
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-        except mysql.connector.Error as err:
-            logging.error(f"Error submitting report: {err}")
-            print(f"{Fore.RED}Error submitting report: {err}{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
+def view_my_reports(user_id):
+    """View reports submitted by the current user, one page at a time"""
+    repo = reports_repo()
+    page_size = PAGE_SIZE
+    page_number = 1
+    position = {}  # keyset bound ("after"/"before") of the page being shown
+
+    while True:
+        clear_screen()
+        display_banner()
+        print(f"\n{Fore.CYAN}📋 MY REPORTS{Style.RESET_ALL}\n")
+
+        try:
+            page = repo.page_for_user(user_id, page_size, **position)
+        except (StorageError, PoolTimeoutError) as err:
+            db_error("loading reports", err)
             input("\nPress Enter to continue...")
+            return
 
-def view_my_reports(user_id):
-    """View reports submitted by the current user"""
-    clear_screen()
-    display_banner()
-    print(f"\n{Fore.CYAN}📋 MY REPORTS{Style.RESET_ALL}\n")
-
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT id, issue_type, severity, description, location, status, created_at 
-            FROM reports 
-            WHERE user_id = %s
-            ORDER BY created_at DESC
-        """, (user_id,))
-
-        reports = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        if not reports:
+        if not page.rows:
+            if position:
+                # The page emptied underneath us; start again from the newest report
+                position, page_number = {}, 1
+                continue
             print(f"{Fore.YELLOW}You haven't submitted any reports yet.{Style.RESET_ALL}")
             input("\nPress Enter to continue...")
             return
+        if not page.has_previous:
+            page_number = 1
 
-        # Create a pretty table
-        table = PrettyTable()
-        table.field_names = ["ID", "Issue Type", "Severity", "Description", "Location", "Status", "Date"]
-
-        # Add status colors
-        status_colors = {
-            "Pending": Fore.YELLOW,
-            "In Progress": Fore.CYAN,
-            "Resolved": Fore.GREEN,
-            "Rejected": Fore.RED
-        }
-
-        for report in reports:
-            # Truncate description if too long
-            description = report[3][:30] + "..." if len(report[3]) > 30 else report[3]
+        TableRenderer(MY_REPORT_COLUMNS).render(page.rows, page_size=0)
+        print_page_footer(page, page_number)
 
-            # Format date
-            date = report[6].strftime("%Y-%m-%d")
+        print(f"\n{Fore.YELLOW}1. View Report Details{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}2. Next Page{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}3. Previous Page{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}4. Change Page Size{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}5. Back to Dashboard{Style.RESET_ALL}")
 
-            # Apply color to status
-            status = report[5]
-            colored_status = f"{status_colors.get(status, '')}{status}{Style.RESET_ALL}"
+        choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
 
-            table.add_row([
-                report[0],
-                report[1],
-                report[2],
-                description,
-                report[4][:20] + "..." if len(report[4]) > 20 else report[4],
-                colored_status,
-                date
-            ])
+        if choice == "1":
+            report_id = input(f"{Fore.WHITE}Enter report ID to view details: {Style.RESET_ALL}")
+            view_report_details(report_id, user_id)
+        elif choice in ("2", "3"):
+            position, page_number = turn_page(page, page_number, position, forward=choice == "2")
+        elif choice == "4":
+            page_size = prompt_page_size(page_size)
+            position, page_number = {}, 1
+        elif choice == "5":
+            return
+        else:
+            print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
 
-        print(table)
+def view_report_details(report_id, user_id):
+    """View detailed information about a specific report"""
+    try:
+        report = reports_repo().get_detail(report_id, user_id)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("loading report", err)
+        input("\nPress Enter to continue...")
+        return
 
-        while True:
-            print(f"\n{Fore.YELLOW}1. View Report Details{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}2. Back to Dashboard{Style.RESET_ALL}")
+    if report:
+        clear_screen()
+        display_banner()
+        print(f"\n{Fore.CYAN}📄 REPORT DETAILS{Style.RESET_ALL}\n")
+
+        # Status icon mapping
+        status_icons = {
+            "Pending": f"{Fore.YELLOW}⏳ Pending{Style.RESET_ALL}",
+            "In Progress": f"{Fore.CYAN}🔄 In Progress{Style.RESET_ALL}",
+            "Resolved": f"{Fore.GREEN}✅ Resolved{Style.RESET_ALL}",
+            "Rejected": f"{Fore.RED}❌ Rejected{Style.RESET_ALL}"
+        }
 
-            choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
+        # Severity icon mapping
+        severity_icons = {
+            "Low": f"{Fore.GREEN}🟢 Low{Style.RESET_ALL}",
+            "Medium": f"{Fore.YELLOW}🟡 Medium{Style.RESET_ALL}",
+            "High": f"{Fore.RED}🟠 High{Style.RESET_ALL}",
+            "Critical": f"{Fore.RED}🔴 Critical{Style.RESET_ALL}"
+        }
 
-            if choice == "1":
-                report_id = input(f"{Fore.WHITE}Enter report ID to view details: {Style.RESET_ALL}")
-                view_report_details(report_id, user_id)
-            elif choice == "2":
-                return
-            else:
-                print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+        print(f"Report ID: {report[0]}")
+        print(f"Submitted by: {report[8]}")
+        print(f"Issue Type: {report[1]}")
+        print(f"Severity: {severity_icons.get(report[2], report[2])}")
+        print(f"Status: {status_icons.get(report[5], report[5])}")
+        print(f"Location: {report[4]}")
+        print(f"Submitted on: {report[6].strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"Last updated: {report[7].strftime('%Y-%m-%d %H:%M:%S')}")
+        if report[9]:
+            print(f"Duplicate of: #{report[9]}")
+        print(f"\nDescription:")
+        print(f"{Fore.WHITE}{report[3]}{Style.RESET_ALL}")
 
-def view_report_details(report_id, user_id):
-    """View detailed information about a specific report"""
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT r.id, r.issue_type, r.severity, r.description, r.location, r.status, 
-                   r.created_at, r.updated_at, u.username
-            FROM reports r
-            JOIN users u ON r.user_id = u.id
-            WHERE r.id = %s AND (r.user_id = %s OR (SELECT role FROM users WHERE id = %s) = 'admin')
-        """, (report_id, user_id, user_id))
-
-        report = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if report:
-            clear_screen()
-            display_banner()
-            print(f"\n{Fore.CYAN}📄 REPORT DETAILS{Style.RESET_ALL}\n")
-
-            # Status icon mapping
-            status_icons = {
-                "Pending": f"{Fore.YELLOW}⏳ Pending{Style.RESET_ALL}",
-                "In Progress": f"{Fore.CYAN}🔄 In Progress{Style.RESET_ALL}",
-                "Resolved": f"{Fore.GREEN}✅ Resolved{Style.RESET_ALL}",
-                "Rejected": f"{Fore.RED}❌ Rejected{Style.RESET_ALL}"
-            }
-
-            # Severity icon mapping
-            severity_icons = {
-                "Low": f"{Fore.GREEN}🟢 Low{Style.RESET_ALL}",
-                "Medium": f"{Fore.YELLOW}🟡 Medium{Style.RESET_ALL}",
-                "High": f"{Fore.RED}🟠 High{Style.RESET_ALL}",
-                "Critical": f"{Fore.RED}🔴 Critical{Style.RESET_ALL}"
-            }
-
-            print(f"Report ID: {report[0]}")
-            print(f"Submitted by: {report[8]}")
-            print(f"Issue Type: {report[1]}")
-            print(f"Severity: {severity_icons.get(report[2], report[2])}")
-            print(f"Status: {status_icons.get(report[5], report[5])}")
-            print(f"Location: {report[4]}")
-            print(f"Submitted on: {report[6].strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"Last updated: {report[7].strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"\nDescription:")
-            print(f"{Fore.WHITE}{report[3]}{Style.RESET_ALL}")
-
-            input("\nPress Enter to go back...")
-        else:
-            print(f"{Fore.RED}Report not found or you don't have permission to view it.{Style.RESET_ALL}")
-            input("\nPress Enter to continue...")
+        try:
+            photos = attachments_repo().list_for_report(report[0])
+        except (StorageError, PoolTimeoutError) as err:
+            db_error("loading photos", err)
+            photos = []
+        if photos:
+            print(f"\nPhotos:")
+            for attachment_id, filename, content_type, size, created_at in photos:
+                print(f"  #{attachment_id} {filename} ({content_type}, {size / 1024:.1f} KiB)")
+
+        input("\nPress Enter to go back...")
+    else:
+        print(f"{Fore.RED}Report not found or you don't have permission to view it.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
 
 def display_admin_dashboard(user_id, username):
     """Display the admin dashboard with options"""
@@ -419,7 +541,9 @@ def display_admin_dashboard(user_id, username):
         print(f"{Fore.YELLOW}2. 🔍 Search Reports{Style.RESET_ALL}")
         print(f"{Fore.YELLOW}3. 📊 Statistics{Style.RESET_ALL}")
         print(f"{Fore.YELLOW}4. 👥 User Management{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}5. 🔙 Logout{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}5. 🔁 Batch Status Update{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}6. ⏱️  Performance{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}7. 🔙 Logout{Style.RESET_ALL}")
 
         choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
 
@@ -432,6 +556,10 @@ def display_admin_dashboard(user_id, username):
         elif choice == "4":
             admin_user_management()
         elif choice == "5":
+            admin_batch_update()
+        elif choice == "6":
+            admin_performance()
+        elif choice == "7":
             print(f"{Fore.GREEN}Logging out...{Style.RESET_ALL}")
             time.sleep(1)
             return
@@ -440,7 +568,7 @@ def display_admin_dashboard(user_id, username):
             input("\nPress Enter to continue...")
 
 def admin_view_reports():
-    """Admin function to view all reports"""
+    """Admin function to view all reports, one page at a time"""
     clear_screen()
     display_banner()
     print(f"\n{Fore.MAGENTA}📋 ALL REPORTS{Style.RESET_ALL}\n")
@@ -454,100 +582,70 @@ def admin_view_reports():
 
     filter_choice = input(f"\n{Fore.WHITE}Choose a filter: {Style.RESET_ALL}")
 
-    status_filter = ""
-    if filter_choice == "2":
-        status_filter = "WHERE status = 'Pending'"
-    elif filter_choice == "3":
-        status_filter = "WHERE status = 'In Progress'"
-    elif filter_choice == "4":
-        status_filter = "WHERE status = 'Resolved'"
-    elif filter_choice == "5":
-        status_filter = "WHERE status = 'Rejected'"
-
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute(f"""
-            SELECT r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at 
-            FROM reports r
-            JOIN users u ON r.user_id = u.id
-            {status_filter}
-            ORDER BY r.created_at DESC
-        """)
-
-        reports = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        if not reports:
-            print(f"{Fore.YELLOW}No reports found with the selected filter.{Style.RESET_ALL}")
-            input("\nPress Enter to continue...")
-            return
-
-        table = PrettyTable()
-        table.field_names = ["ID", "User", "Issue Type", "Severity", "Description", "Location", "Status", "Date"]
-
-        # Add status colors
-        status_colors = {
-            "Pending": Fore.YELLOW,
-            "In Progress": Fore.CYAN,
-            "Resolved": Fore.GREEN,
-            "Rejected": Fore.RED
-        }
+    status_filters = {
+        "2": "Pending",
+        "3": "In Progress",
+        "4": "Resolved",
+        "5": "Rejected"
+    }
+    status_filter = status_filters.get(filter_choice)
 
-        # Add severity colors
-        severity_colors = {
-            "Low": Fore.GREEN,
-            "Medium": Fore.YELLOW,
-            "High": Fore.RED,
-            "Critical": Fore.RED + Style.BRIGHT
-        }
+    repo = reports_repo()
+    page_size = PAGE_SIZE
+    page_number = 1
+    position = {}  # keyset bound ("after"/"before") of the page being shown
 
-        for report in reports:
-            # Truncate description if too long
-            description = report[4][:20] + "..." if len(report[4]) > 20 else report[4]
+    while True:
+        try:
+            page = repo.page_reports(status_filter, page_size, **position)
+        except (StorageError, PoolTimeoutError) as err:
+            db_error("loading reports", err)
+            input("\nPress Enter to continue...")
+            return
 
-            # Format date
-            date = report[7].strftime("%Y-%m-%d")
+        if not page.rows:
+            if position:
+                # The page emptied underneath us; start again from the newest report
+                position, page_number = {}, 1
+                continue
+            print(f"{Fore.YELLOW}No reports found with the selected filter.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+            return
+        if not page.has_previous:
+            page_number = 1
 
-            # Apply color to status
-            status = report[6]
-            colored_status = f"{status_colors.get(status, '')}{status}{Style.RESET_ALL}"
+        clear_screen()
+        display_banner()
+        print(f"\n{Fore.MAGENTA}📋 ALL REPORTS{Style.RESET_ALL}\n")
 
-            # Apply color to severity
-            severity = report[3]
-            colored_severity = f"{severity_colors.get(severity, '')}{severity}{Style.RESET_ALL}"
+        TableRenderer(REPORT_COLUMNS).render(page.rows, page_size=0)
+        print_page_footer(page, page_number)
 
-            table.add_row([
-                report[0],
-                report[1],
-                report[2],
-                colored_severity,
-                description,
-                report[5][:15] + "..." if len(report[5]) > 15 else report[5],
-                colored_status,
-                date
-            ])
+        print(f"\n{Fore.YELLOW}1. Update Report Status{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}2. View Report Details{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}3. Next Page{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}4. Previous Page{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}5. Change Page Size{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}6. Back to Admin Dashboard{Style.RESET_ALL}")
 
-        print(table)
+        choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
 
-        while True:
-            print(f"\n{Fore.YELLOW}1. Update Report Status{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}2. View Report Details{Style.RESET_ALL}")
-            print(f"{Fore.YELLOW}3. Back to Admin Dashboard{Style.RESET_ALL}")
-
-            choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
-
-            if choice == "1":
-                report_id = input(f"{Fore.WHITE}Enter report ID to update: {Style.RESET_ALL}")
-                admin_update_report(report_id)
-            elif choice == "2":
-                report_id = input(f"{Fore.WHITE}Enter report ID to view details: {Style.RESET_ALL}")
-                view_report_details(report_id, None)  # Admin can view any report
-            elif choice == "3":
-                return
-            else:
-                print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+        if choice == "1":
+            report_id = input(f"{Fore.WHITE}Enter report ID to update: {Style.RESET_ALL}")
+            admin_update_report(report_id)
+        elif choice == "2":
+            report_id = input(f"{Fore.WHITE}Enter report ID to view details: {Style.RESET_ALL}")
+            view_report_details(report_id, None)  # Admin can view any report
+        elif choice in ("3", "4"):
+            position, page_number = turn_page(page, page_number, position, forward=choice == "3")
+        elif choice == "5":
+            page_size = prompt_page_size(page_size)
+            position, page_number = {}, 1
+        elif choice == "6":
+            return
+        else:
+            print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
 
 def admin_update_report(report_id):
     """Admin function to update a report's status"""
@@ -555,62 +653,92 @@ def admin_update_report(report_id):
     display_banner()
     print(f"\n{Fore.MAGENTA}🔄 UPDATE REPORT STATUS{Style.RESET_ALL}\n")
 
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, issue_type, status FROM reports WHERE id = %s", (report_id,))
-        report = cursor.fetchone()
+    repo = reports_repo()
+    try:
+        report = repo.get_summary(report_id)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("loading report", err)
+        input("\nPress Enter to continue...")
+        return
 
-        if not report:
-            print(f"{Fore.RED}Report not found.{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-            return
+    if not report:
+        print(f"{Fore.RED}Report not found.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
 
-        print(f"Report ID: {report[0]}")
-        print(f"Issue Type: {report[1]}")
-        print(f"Current Status: {report[2]}")
+    print(f"Report ID: {report[0]}")
+    print(f"Issue Type: {report[1]}")
+    print(f"Current Status: {report[2]}")
+    try:
+        duplicates = repo.duplicates_of(report_id)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("loading report", err)
+        input("\nPress Enter to continue...")
+        return
+    if duplicates:
+        print(f"Linked duplicates: {', '.join(f'#{duplicate}' for duplicate in duplicates)}")
 
-        print(f"\nSelect new status:")
-        print(f"{Fore.YELLOW}1. ⏳ Pending{Style.RESET_ALL}")
-        print(f"{Fore.CYAN}2. 🔄 In Progress{Style.RESET_ALL}")
-        print(f"{Fore.GREEN}3. ✅ Resolved{Style.RESET_ALL}")
-        print(f"{Fore.RED}4. ❌ Rejected{Style.RESET_ALL}")
+    new_status = prompt_status("Select new status:")
+    if not new_status:
+        print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
 
-        status_choice = input(f"\n{Fore.WHITE}Enter choice (1-4): {Style.RESET_ALL}")
+    include_duplicates = False
+    if duplicates:
+        answer = input(f"{Fore.WHITE}Apply the new status to the {len(duplicates)} linked duplicate(s) too? (y/n): {Style.RESET_ALL}")
+        include_duplicates = answer.strip().lower() == "y"
 
-        status_map = {
-            "1": "Pending",
-            "2": "In Progress",
-            "3": "Resolved",
-            "4": "Rejected"
-        }
+    try:
+        repo.update_status(report_id, new_status)
+        if include_duplicates:
+            changed = repo.update_status_matching(ReportFilter(report_ids=duplicates), new_status)
+            print(f"{Fore.CYAN}Updated {changed} linked duplicate(s).{Style.RESET_ALL}")
 
-        new_status = status_map.get(status_choice)
-        if not new_status:
-            print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-            return
+        loading_animation("Updating report status")
+        print(f"{Fore.GREEN}✅ Report status updated successfully!{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("updating report", err)
+        input("\nPress Enter to continue...")
 
-        try:
-            cursor.execute("UPDATE reports SET status = %s WHERE id = %s", (new_status, report_id))
-            conn.commit()
+def prompt_status(title):
+    """Ask for a report status and return it, or None for an invalid choice"""
+    print(f"\n{title}")
+    print(f"{Fore.YELLOW}1. ⏳ Pending{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}2. 🔄 In Progress{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}3. ✅ Resolved{Style.RESET_ALL}")
+    print(f"{Fore.RED}4. ❌ Rejected{Style.RESET_ALL}")
+
+    status_choice = input(f"\n{Fore.WHITE}Enter choice (1-4): {Style.RESET_ALL}")
+
+    status_map = {
+        "1": "Pending",
+        "2": "In Progress",
+        "3": "Resolved",
+        "4": "Rejected"
+    }
+    return status_map.get(status_choice)
 
-            loading_animation("Updating report status")
-            print(f"{Fore.GREEN}✅ Report status updated successfully!{Style.RESET_ALL}")
+def prompt_issue_type():
+    """Ask for an issue type and return it, or None for an invalid choice"""
+    print(f"\nSelect issue type:")
+    print(f"{Fore.YELLOW}1. 🛣️  Road Damage{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}2. 💡 Power Outage{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}3. 💧 Water Issue{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}4. 🚦 Traffic Signal Problem{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}5. 🌳 Public Space Issue{Style.RESET_ALL}")
 
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-        except mysql.connector.Error as err:
-            logging.error(f"Error updating report: {err}")
-            print(f"{Fore.RED}Error updating report: {err}{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
+    issue_types = {
+        "1": "Road Damage",
+        "2": "Power Outage",
+        "3": "Water Issue",
+        "4": "Traffic Signal Problem",
+        "5": "Public Space Issue"
+    }
+
+    type_choice = input(f"\n{Fore.WHITE}Enter choice (1-5): {Style.RESET_ALL}")
+    return issue_types.get(type_choice)
 
 def admin_search_reports():
     """Admin function to search reports by various criteria"""
@@ -622,163 +750,81 @@ def admin_search_reports():
     print(f"{Fore.YELLOW}1. Report ID{Style.RESET_ALL}")
     print(f"{Fore.YELLOW}2. Username{Style.RESET_ALL}")
     print(f"{Fore.YELLOW}3. Issue Type{Style.RESET_ALL}")
-    print(f"{Fore.YELLOW}4. Location{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}4. Keywords (Location/Description){Style.RESET_ALL}")
     print(f"{Fore.YELLOW}5. Date Range{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}6. Near a Location (coordinates and radius){Style.RESET_ALL}")
 
     search_choice = input(f"\n{Fore.WHITE}Choose a search method: {Style.RESET_ALL}")
 
-    conn = connect_to_db()
-    if not conn:
-        return
-
-    cursor = conn.cursor()
+    repo = reports_repo()
     reports = []
+    columns = REPORT_COLUMNS
 
-    if search_choice == "1":
-        report_id = input(f"{Fore.WHITE}Enter Report ID: {Style.RESET_ALL}")
-        cursor.execute("""
-            SELECT r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at 
-            FROM reports r
-            JOIN users u ON r.user_id = u.id
-            WHERE r.id = %s
-        """, (report_id,))
+    try:
+        if search_choice == "1":
+            report_id = input(f"{Fore.WHITE}Enter Report ID: {Style.RESET_ALL}")
+            reports = repo.search_by_id(report_id)
 
-    elif search_choice == "2":
-        username = input(f"{Fore.WHITE}Enter username: {Style.RESET_ALL}")
-        cursor.execute("""
-            SELECT r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at 
-            FROM reports r
-            JOIN users u ON r.user_id = u.id
-            WHERE u.username LIKE %s
-            ORDER BY r.created_at DESC
-        """, (f"%{username}%",))
-
-    elif search_choice == "3":
-        print(f"\nSelect issue type:")
-        print(f"{Fore.YELLOW}1. 🛣️  Road Damage{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}2. 💡 Power Outage{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}3. 💧 Water Issue{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}4. 🚦 Traffic Signal Problem{Style.RESET_ALL}")
-        print(f"{Fore.YELLOW}5. 🌳 Public Space Issue{Style.RESET_ALL}")
-
-        issue_types = {
-            "1": "Road Damage",
-            "2": "Power Outage",
-            "3": "Water Issue",
-            "4": "Traffic Signal Problem",
-            "5": "Public Space Issue"
-        }
+        elif search_choice == "2":
+            username = input(f"{Fore.WHITE}Enter username: {Style.RESET_ALL}")
+            reports = repo.stream_matching(ReportFilter(username=username))
+
+        elif search_choice == "3":
+            issue_type = prompt_issue_type()
+
+            if issue_type:
+                reports = repo.stream_matching(ReportFilter(issue_type=issue_type))
+            else:
+                print(f"{Fore.RED}Invalid issue type selection.{Style.RESET_ALL}")
+                input("\nPress Enter to continue...")
+                return
+
+        elif search_choice == "4":
+            keywords = input(f"{Fore.WHITE}Enter keywords: {Style.RESET_ALL}")
+            reports = repo.search_text(keywords, SEARCH_LIMIT)
 
-        type_choice = input(f"\n{Fore.WHITE}Enter choice (1-5): {Style.RESET_ALL}")
-        issue_type = issue_types.get(type_choice)
-
-        if issue_type:
-            cursor.execute("""
-                SELECT r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at 
-                FROM reports r
-                JOIN users u ON r.user_id = u.id
-                WHERE r.issue_type = %s
-                ORDER BY r.created_at DESC
-            """, (issue_type,))
+        elif search_choice == "5":
+            created_range = prompt_date_range()
+            if not created_range:
+                return
+            reports = repo.stream_matching(ReportFilter(created_range=created_range))
+
+        elif search_choice == "6":
+            nearby = prompt_nearby()
+            if not nearby:
+                return
+            reports = repo.find_nearby(*nearby)
+            columns = NEARBY_COLUMNS
         else:
-            print(f"{Fore.RED}Invalid issue type selection.{Style.RESET_ALL}")
-
-    elif search_choice == "4":
-        location = input(f"{Fore.WHITE}Enter location keywords: {Style.RESET_ALL}")
-        cursor.execute("""
-            SELECT r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at 
-            FROM reports r
-            JOIN users u ON r.user_id = u.id
-            WHERE r.location LIKE %s
-            ORDER BY r.created_at DESC
-        """, (f"%{location}%",))
-
-    elif search_choice == "5":
-        start_date = input(f"{Fore.WHITE}Enter start date (YYYY-MM-DD): {Style.RESET_ALL}")
-        end_date = input(f"{Fore.WHITE}Enter end date (YYYY-MM-DD): {Style.RESET_ALL}")
-        try:
-            cursor.execute("""
-                SELECT r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at 
-                FROM reports r
-                JOIN users u ON r.user_id = u.id
-                WHERE DATE(r.created_at) BETWEEN %s AND %s
-                ORDER BY r.created_at DESC
-            """, (start_date, end_date))
-        except mysql.connector.Error as err:
-            logging.error(f"Error with date search: {err}")
-            print(f"{Fore.RED}Error with date format. Use YYYY-MM-DD.{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
+            print(f"{Fore.RED}Invalid search method selected.{Style.RESET_ALL}")
             input("\nPress Enter to continue...")
             return
-    else:
-        print(f"{Fore.RED}Invalid search method selected.{Style.RESET_ALL}")
-        cursor.close()
-        conn.close()
-        input("\nPress Enter to continue...")
-        return
-
-    reports = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    if not reports:
-        print(f"{Fore.YELLOW}No reports found matching your search criteria.{Style.RESET_ALL}")
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("searching reports", err)
         input("\nPress Enter to continue...")
         return
 
-    # Display search results
+    # Display search results as they are fetched
     clear_screen()
     display_banner()
     print(f"\n{Fore.MAGENTA}🔍 SEARCH RESULTS{Style.RESET_ALL}\n")
 
-    table = PrettyTable()
-    table.field_names = ["ID", "User", "Issue Type", "Severity", "Description", "Location", "Status", "Date"]
-
-    # Add status colors
-    status_colors = {
-        "Pending": Fore.YELLOW,
-        "In Progress": Fore.CYAN,
-        "Resolved": Fore.GREEN,
-        "Rejected": Fore.RED
-    }
-
-    # Add severity colors
-    severity_colors = {
-        "Low": Fore.GREEN,
-        "Medium": Fore.YELLOW,
-        "High": Fore.RED,
-        "Critical": Fore.RED + Style.BRIGHT
-    }
-
-    for report in reports:
-        # Truncate description if too long
-        description = report[4][:20] + "..." if len(report[4]) > 20 else report[4]
-
-        # Format date
-        date = report[7].strftime("%Y-%m-%d")
-
-        # Apply color to status
-        status = report[6]
-        colored_status = f"{status_colors.get(status, '')}{status}{Style.RESET_ALL}"
-
-        # Apply color to severity
-        severity = report[3]
-        colored_severity = f"{severity_colors.get(severity, '')}{severity}{Style.RESET_ALL}"
+    try:
+        shown, complete = TableRenderer(columns).render(reports)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("searching reports", err)
+        input("\nPress Enter to continue...")
+        return
 
-        table.add_row([
-            report[0],
-            report[1],
-            report[2],
-            colored_severity,
-            description,
-            report[5][:15] + "..." if len(report[5]) > 15 else report[5],
-            colored_status,
-            date
-        ])
+    if not shown:
+        print(f"{Fore.YELLOW}No reports found matching your search criteria.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
+    if complete:
+        print(f"\n{Fore.GREEN}Found {shown} report(s) matching your search criteria.{Style.RESET_ALL}")
+    else:
+        print(f"\n{Fore.GREEN}Showed the first {shown} report(s) matching your search criteria.{Style.RESET_ALL}")
 
-    print(table)
-    print(f"\n{Fore.GREEN}Found {len(reports)} report(s) matching your search criteria.{Style.RESET_ALL}")
 
     while True:
         print(f"\n{Fore.YELLOW}1. Update Report Status{Style.RESET_ALL}")
@@ -803,56 +849,209 @@ def admin_search_reports():
         else:
             print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
 
+def admin_batch_update():
+    """Admin function to change the status of every report matching a set of criteria"""
+    criteria = {}
+
+    while True:
+        clear_screen()
+        display_banner()
+        print(f"\n{Fore.MAGENTA}🔁 BATCH STATUS UPDATE{Style.RESET_ALL}\n")
+
+        report_filter = ReportFilter(**criteria)
+        matches = {}
+        if criteria:
+            try:
+                matches = reports_repo().count_by_status(report_filter)
+            except (StorageError, PoolTimeoutError) as err:
+                db_error("counting reports", err)
+                input("\nPress Enter to continue...")
+                return
+            print(f"{Fore.CYAN}Selection:{Style.RESET_ALL} {report_filter.describe()}")
+            breakdown = ", ".join(f"{count} {status}" for status, count in ordered_counts(matches, STATUSES))
+            print(f"{Fore.CYAN}Matching reports:{Style.RESET_ALL} {sum(matches.values())}"
+                  + (f" ({breakdown})" if breakdown else ""))
+        else:
+            print(f"{Fore.CYAN}Selection:{Style.RESET_ALL} none yet - add at least one criterion")
+
+        print(f"\n{Fore.YELLOW}1. Report IDs (list or range){Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}2. Username{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}3. Issue Type{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}4. Keywords (Location/Description){Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}5. Date Range{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}6. Current Status{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}7. Clear Criteria{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}8. Apply Status Change{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}9. Back to Admin Dashboard{Style.RESET_ALL}")
+
+        choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
+
+        if choice == "1":
+            selection = input(f"{Fore.WHITE}Enter report IDs (e.g. 3,7,12 or 100-250): {Style.RESET_ALL}")
+            try:
+                ids = parse_id_selection(selection)
+            except FilterError as err:
+                print(f"{Fore.RED}{err}{Style.RESET_ALL}")
+                input("\nPress Enter to continue...")
+                continue
+            criteria.pop("report_ids", None)
+            criteria.pop("id_range", None)
+            criteria.update(ids)
+        elif choice == "2":
+            username = input(f"{Fore.WHITE}Enter username: {Style.RESET_ALL}").strip()
+            if username:
+                criteria["username"] = username
+        elif choice == "3":
+            issue_type = prompt_issue_type()
+            if issue_type:
+                criteria["issue_type"] = issue_type
+            else:
+                print(f"{Fore.RED}Invalid issue type selection.{Style.RESET_ALL}")
+                input("\nPress Enter to continue...")
+        elif choice == "4":
+            keywords = input(f"{Fore.WHITE}Enter keywords: {Style.RESET_ALL}").strip()
+            if keywords:
+                criteria["keywords"] = keywords
+        elif choice == "5":
+            created_range = prompt_date_range()
+            if created_range:
+                criteria["created_range"] = created_range
+        elif choice == "6":
+            status = prompt_status("Select current status:")
+            if status:
+                criteria["status"] = status
+            else:
+                print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+                input("\nPress Enter to continue...")
+        elif choice == "7":
+            criteria = {}
+        elif choice == "8":
+            if not matches:
+                print(f"{Fore.RED}No reports match the selection.{Style.RESET_ALL}")
+                input("\nPress Enter to continue...")
+                continue
+            apply_batch_update(report_filter, matches)
+        elif choice == "9":
+            return
+        else:
+            print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+
+def apply_batch_update(report_filter, matches):
+    """Confirm and apply a new status to every report matching a filter"""
+    new_status = prompt_status("Select new status:")
+    if not new_status:
+        print(f"{Fore.RED}Invalid choice.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
+
+    to_change = sum(count for status, count in matches.items() if status != new_status)
+    if not to_change:
+        print(f"{Fore.YELLOW}Every matching report is already {new_status}.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
+
+    confirm = input(f"{Fore.YELLOW}Change {to_change} report(s) to {new_status}? (y/n): {Style.RESET_ALL}").lower()
+    if confirm != "y":
+        return
+
+    try:
+        changed = reports_repo().update_status_matching(report_filter, new_status, BATCH_UPDATE_CHUNK)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("updating reports", err)
+        input("\nPress Enter to continue...")
+        return
+
+    logging.info(f"Batch status update: {changed} report(s) set to {new_status} ({report_filter.describe()})")
+    print(f"{Fore.GREEN}✅ {changed} report(s) updated to {new_status}.{Style.RESET_ALL}")
+    input("\nPress Enter to continue...")
+
+def prompt_nearby():
+    """Ask for a point and a radius and return (latitude, longitude, radius_m), or None"""
+    point = parse_coordinates(input(f"{Fore.WHITE}Enter coordinates (latitude, longitude): {Style.RESET_ALL}"))
+    if point is None:
+        print(f"{Fore.RED}Enter decimal coordinates such as -1.9441, 30.0619.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return None
+    radius = input(f"{Fore.WHITE}Enter radius in metres (default {DEFAULT_NEARBY_RADIUS_M}): {Style.RESET_ALL}").strip()
+    if not radius:
+        return point + (DEFAULT_NEARBY_RADIUS_M,)
+    if not radius.isdigit() or not 0 < int(radius) <= MAX_NEARBY_RADIUS_M:
+        print(f"{Fore.RED}Radius must be a whole number of metres up to {MAX_NEARBY_RADIUS_M}.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return None
+    return point + (int(radius),)
+
+def prompt_date_range():
+    """Ask for a preset or custom date range and return validated [start, end) timestamps"""
+    print(f"\nSelect date range:")
+    presets = list(DATE_PRESETS.items())
+    for number, (_, label) in enumerate(presets, start=1):
+        print(f"{Fore.YELLOW}{number}. {label}{Style.RESET_ALL}")
+    print(f"{Fore.YELLOW}{len(presets) + 1}. Custom Range{Style.RESET_ALL}")
+
+    range_choice = input(f"\n{Fore.WHITE}Enter choice (1-{len(presets) + 1}): {Style.RESET_ALL}")
+
+    try:
+        if range_choice.isdigit() and 1 <= int(range_choice) <= len(presets):
+            return preset_range(presets[int(range_choice) - 1][0])
+        if range_choice == str(len(presets) + 1):
+            start_date = input(f"{Fore.WHITE}Enter start date (YYYY-MM-DD): {Style.RESET_ALL}")
+            end_date = input(f"{Fore.WHITE}Enter end date (YYYY-MM-DD): {Style.RESET_ALL}")
+            return date_range(start_date, end_date)
+        print(f"{Fore.RED}Invalid date range selection.{Style.RESET_ALL}")
+    except FilterError as err:
+        print(f"{Fore.RED}{err}{Style.RESET_ALL}")
+    input("\nPress Enter to continue...")
+    return None
+
 def admin_statistics():
-    """Admin function to display system statistics"""
-    clear_screen()
-    display_banner()
-    print(f"\n{Fore.MAGENTA}📊 SYSTEM STATISTICS{Style.RESET_ALL}\n")
-
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-
-        # Get counts of reports by status
-        cursor.execute("""
-            SELECT status, COUNT(*) as count 
-            FROM reports 
-            GROUP BY status
-        """)
-        status_stats = cursor.fetchall()
-
-        # Get counts of reports by issue type
-        cursor.execute("""
-            SELECT issue_type, COUNT(*) as count 
-            FROM reports 
-            GROUP BY issue_type
-        """)
-        type_stats = cursor.fetchall()
-
-        # Get counts of reports by severity
-        cursor.execute("""
-            SELECT severity, COUNT(*) as count 
-            FROM reports 
-            GROUP BY severity
-        """)
-        severity_stats = cursor.fetchall()
-
-        # Get user count
-        cursor.execute("SELECT COUNT(*) FROM users")
-        user_count = cursor.fetchone()[0]
-
-        # Get total report count
-        cursor.execute("SELECT COUNT(*) FROM reports")
-        report_count = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
+    """Admin function to display system statistics from the maintained counters"""
+    while True:
+        clear_screen()
+        display_banner()
+        print(f"\n{Fore.MAGENTA}📊 SYSTEM STATISTICS{Style.RESET_ALL}\n")
+
+        try:
+            counters = counters_repo().snapshot()
+        except (StorageError, PoolTimeoutError) as err:
+            db_error("loading statistics", err)
+            input("\nPress Enter to continue...")
+            return
+
+        totals = counters.get("total", {})
+        status_stats = ordered_counts(counters.get("status", {}), STATUSES)
+        type_stats = ordered_counts(counters.get("issue_type", {}), ISSUE_TYPES)
+        severity_stats = ordered_counts(counters.get("severity", {}), SEVERITIES)
 
         # Display statistics
         print(f"{Fore.CYAN}General Statistics:{Style.RESET_ALL}")
-        print(f"Total Users: {user_count}")
-        print(f"Total Reports: {report_count}")
-        
+        print(f"Total Users: {totals.get('users', 0)}")
+        print(f"Total Reports: {totals.get('reports', 0)}")
+
+        pool_stats = get_db().pool.metrics.snapshot()
+        print(f"\n{Fore.CYAN}Connection Pool:{Style.RESET_ALL}")
+        print(f"Size: {POOL_SIZE} (open: {pool_stats['created'] - pool_stats['discarded']}, in use: {pool_stats['in_use']})")
+        print(f"Borrows: {pool_stats['borrows']}  Waits: {pool_stats['waits']} (avg {pool_stats['avg_wait_ms']} ms)")
+        print(f"Failures: {pool_stats['failures']}  Timeouts: {pool_stats['timeouts']}  Failed health checks: {pool_stats['health_check_failures']}")
+
+        print(f"\n{Fore.CYAN}User Cache:{Style.RESET_ALL}")
+        for name, cache_stats in get_db().user_cache.stats().items():
+            print(f"{name}: {cache_stats['entries']}/{cache_stats['max_entries']} entries, "
+                  f"{cache_stats['hits']} hits, {cache_stats['misses']} misses (hit ratio {cache_stats['hit_ratio']:.0%})")
+
+        report_cache = get_db().report_cache.stats()
+        print(f"\n{Fore.CYAN}Report Detail Cache:{Style.RESET_ALL}")
+        print(f"Entries: {report_cache['entries']}/{report_cache['max_entries']} (~{report_cache['bytes'] / 1024:.1f} KiB)")
+        print(f"Hits: {report_cache['hits']}  Misses: {report_cache['misses']} (hit ratio {report_cache['hit_ratio']:.0%})  "
+              f"Stale refreshes: {report_cache['stale']}  Evictions: {report_cache['evictions']}")
+
+        hasher = get_db().passwords.stats()
+        print(f"\n{Fore.CYAN}Password Hashing:{Style.RESET_ALL}")
+        print(f"{hasher['algorithm']} cost {hasher['cost']}, {hasher['workers']} worker(s)  "
+              f"Verifications: {hasher['verifications']} (cached {hasher['verified_cache']['hits']})  "
+              f"Hashed: {hasher['hashed']}  Turned away: {hasher['rejected']}")
+
         print(f"\n{Fore.CYAN}Reports by Status:{Style.RESET_ALL}")
         status_colors = {
             "Pending": Fore.YELLOW,
@@ -877,7 +1076,97 @@ def admin_statistics():
         for severity, count in severity_stats:
             print(f"{severity_colors.get(severity, '')}{severity}{Style.RESET_ALL}: {count}")
 
+        print(f"\n{Fore.YELLOW}1. Reconcile Counters{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}2. Back to Admin Dashboard{Style.RESET_ALL}")
+
+        choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
+
+        if choice == "1":
+            reconcile_counters()
+        elif choice == "2":
+            return
+        else:
+            print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+
+def admin_performance():
+    """Admin function to show the statement timings recorded by this process"""
+    while True:
+        clear_screen()
+        display_banner()
+        print(f"\n{Fore.MAGENTA}⏱️  PERFORMANCE{Style.RESET_ALL}\n")
+
+        metrics = get_db().metrics
+        statements = metrics.summary()
+        acquire = metrics.acquire_summary()
+        since = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(metrics.since))
+        print(f"Recorded since {since}: {sum(row['calls'] for row in statements)} statement(s) of "
+              f"{len(statements)} kind(s)")
+        print(f"Connection acquire: {acquire['count']} checkouts, p50 {acquire['p50_ms']:.2f} ms, "
+              f"p95 {acquire['p95_ms']:.2f} ms, max {acquire['max_ms']:.2f} ms")
+        slow = sum(row['slow'] for row in statements)
+        print(f"Slow queries (>= {metrics.slow_query_ms:g} ms): {slow}"
+              + (f", logged to {SLOW_QUERY_LOG}" if slow_query_log.handlers else ""))
+        if METRICS_FILE:
+            print(f"Prometheus metrics file: {METRICS_FILE} (every {METRICS_INTERVAL:g}s)")
+
+        print(f"\n{Fore.CYAN}Statements by total time:{Style.RESET_ALL}")
+        print(f"{'Query':<28}{'Calls':>8}{'Total ms':>11}{'p50':>9}{'p95':>9}{'Max':>10}{'Rows/call':>11}{'Slow':>6}")
+        for row in statements[:15]:
+            color = Fore.RED if row['slow'] else ""
+            print(f"{color}{row['name']:<28}{row['calls']:>8}{row['total_ms']:>11.1f}{row['p50_ms']:>9.2f}"
+                  f"{row['p95_ms']:>9.2f}{row['max_ms']:>10.2f}{row['rows'] / row['calls']:>11.1f}"
+                  f"{row['slow']:>6}{Style.RESET_ALL if color else ''}")
+            print(f"  {Style.DIM}{row['sql'][:100]}{Style.RESET_ALL}")
+        if len(statements) > 15:
+            print(f"... and {len(statements) - 15} more")
+
+        usage = get_db().statements.snapshot()
+        used = [row for row in usage if row[1]]
+        print(f"\n{Fore.CYAN}Registered statements: {len(used)} of {len(usage)} used, "
+              f"prepared {sum(row[2] for row in usage)} time(s){Style.RESET_ALL}")
+        for name, calls, prepares in used[:10]:
+            print(f"  {name:<40}{calls:>8} calls{prepares:>6} prepared")
+
+        print(f"\n{Fore.YELLOW}1. Refresh{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}2. Reset Timings and Counts{Style.RESET_ALL}")
+        print(f"{Fore.YELLOW}3. Back to Admin Dashboard{Style.RESET_ALL}")
+
+        choice = input(f"\n{Fore.WHITE}Choose an option: {Style.RESET_ALL}")
+
+        if choice == "1":
+            continue
+        elif choice == "2":
+            metrics.reset()
+            get_db().statements.reset()
+        elif choice == "3":
+            return
+        else:
+            print(f"{Fore.RED}Invalid choice. Please try again.{Style.RESET_ALL}")
+            input("\nPress Enter to continue...")
+
+def ordered_counts(counts, known_order):
+    """Return non-zero (category, count) pairs, known categories first in their usual order"""
+    order = {category: position for position, category in enumerate(known_order)}
+    categories = sorted(counts, key=lambda category: (order.get(category, len(order)), category))
+    return [(category, counts[category]) for category in categories if counts[category]]
+
+def reconcile_counters():
+    """Rebuild the statistics counters from the base tables and report any drift"""
+    try:
+        drift = counters_repo().reconcile()
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("reconciling counters", err)
         input("\nPress Enter to continue...")
+        return
+
+    if not drift:
+        print(f"{Fore.GREEN}✅ Counters match the base tables.{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.YELLOW}Corrected {len(drift)} counter(s):{Style.RESET_ALL}")
+        for dimension, category, stored, actual in drift:
+            print(f"  {dimension} / {category}: {stored} -> {actual}")
+    input("\nPress Enter to continue...")
 
 def admin_user_management():
     """Admin function to manage users"""
@@ -911,33 +1200,16 @@ def view_all_users():
     display_banner()
     print(f"\n{Fore.MAGENTA}👥 ALL USERS{Style.RESET_ALL}\n")
 
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, username, role, created_at FROM users ORDER BY created_at")
-        users = cursor.fetchall()
-        cursor.close()
-        conn.close()
-
-        if not users:
-            print(f"{Fore.YELLOW}No users found in the system.{Style.RESET_ALL}")
-            input("\nPress Enter to continue...")
-            return
-
-        table = PrettyTable()
-        table.field_names = ["ID", "Username", "Role", "Created"]
-
-        for user in users:
-            role_color = Fore.MAGENTA if user[2] == "admin" else Fore.CYAN
-            table.add_row([
-                user[0],
-                user[1],
-                f"{role_color}{user[2]}{Style.RESET_ALL}",
-                user[3].strftime("%Y-%m-%d")
-            ])
-
-        print(table)
+    try:
+        shown, _ = TableRenderer(USER_COLUMNS).render(users_repo().stream_all())
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("loading users", err)
         input("\nPress Enter to continue...")
+        return
+
+    if not shown:
+        print(f"{Fore.YELLOW}No users found in the system.{Style.RESET_ALL}")
+    input("\nPress Enter to continue...")
 
 def add_new_user():
     """Admin function to add a new user"""
@@ -955,36 +1227,18 @@ def add_new_user():
     role_choice = input(f"\n{Fore.WHITE}Enter choice (1-2): {Style.RESET_ALL}")
     role = "admin" if role_choice == "2" else "user"
 
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            # Check if username already exists
-            cursor.execute("SELECT username FROM users WHERE username = %s", (username,))
-            if cursor.fetchone():
-                print(f"{Fore.RED}Username already exists. Please choose another one.{Style.RESET_ALL}")
-                cursor.close()
-                conn.close()
-                input("\nPress Enter to continue...")
-                return
-
-            # Insert new user
-            cursor.execute("INSERT INTO users (username, password, role) VALUES (%s, %s, %s)", 
-                         (username, password, role))
-            conn.commit()
-
-            loading_animation("Creating account")
-            print(f"{Fore.GREEN}✅ User added successfully!{Style.RESET_ALL}")
+    try:
+        users_repo().create(username, password, role)
 
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-        except mysql.connector.Error as err:
-            logging.error(f"Error adding user: {err}")
-            print(f"{Fore.RED}Error adding user: {err}{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
+        loading_animation("Creating account")
+        print(f"{Fore.GREEN}✅ User added successfully!{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+    except UsernameTakenError:
+        print(f"{Fore.RED}Username already exists. Please choose another one.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("adding user", err)
+        input("\nPress Enter to continue...")
 
 def reset_user_password():
     """Admin function to reset a user's password"""
@@ -994,47 +1248,37 @@ def reset_user_password():
 
     username = input(f"{Fore.WHITE}Enter username: {Style.RESET_ALL}")
 
-    conn = connect_to_db()
-    if conn:
-        cursor = conn.cursor()
-
-        # Check if user exists
-        cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-        user = cursor.fetchone()
+    users = users_repo()
+    try:
+        # Check if user exists (usually answered by the user cache)
+        user_id = users.find_id(username)
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("looking up user", err)
+        input("\nPress Enter to continue...")
+        return
 
-        if not user:
-            print(f"{Fore.RED}User not found.{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-            return
+    if not user_id:
+        print(f"{Fore.RED}User not found.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
 
-        new_password = getpass.getpass(f"{Fore.WHITE}Enter new password: {Style.RESET_ALL}")
-        confirm_password = getpass.getpass(f"{Fore.WHITE}Confirm new password: {Style.RESET_ALL}")
+    new_password = getpass.getpass(f"{Fore.WHITE}Enter new password: {Style.RESET_ALL}")
+    confirm_password = getpass.getpass(f"{Fore.WHITE}Confirm new password: {Style.RESET_ALL}")
 
-        if new_password != confirm_password:
-            print(f"{Fore.RED}Passwords do not match.{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-            return
-
-        try:
-            cursor.execute("UPDATE users SET password = %s WHERE username = %s", (new_password, username))
-            conn.commit()
+    if new_password != confirm_password:
+        print(f"{Fore.RED}Passwords do not match.{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+        return
 
-            loading_animation("Resetting password")
-            print(f"{Fore.GREEN}✅ Password reset successfully!{Style.RESET_ALL}")
+    try:
+        users.set_password(username, new_password)
 
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
-        except mysql.connector.Error as err:
-            logging.error(f"Error resetting password: {err}")
-            print(f"{Fore.RED}Error resetting password: {err}{Style.RESET_ALL}")
-            cursor.close()
-            conn.close()
-            input("\nPress Enter to continue...")
+        loading_animation("Resetting password")
+        print(f"{Fore.GREEN}✅ Password reset successfully!{Style.RESET_ALL}")
+        input("\nPress Enter to continue...")
+    except (StorageError, PoolTimeoutError) as err:
+        db_error("resetting password", err)
+        input("\nPress Enter to continue...")
 
 
 def main():
@@ -1045,15 +1289,20 @@ def main():
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         filename='infrastructure_app.log'
     )
+    start_slow_query_log()
 
     clear_screen()
     display_banner()
 
     # Ask if database setup is needed (first run)
     print(f"\n{Fore.CYAN}Community Infrastructure Reporting System{Style.RESET_ALL}")
-    setup_db = input(f"\n{Fore.YELLOW}Do you want to set up/reset the database? (y/n): {Style.RESET_ALL}")
-    if setup_db.lower() == 'y':
+    if get_db().backend.is_ephemeral:
+        # An in-memory database starts empty on every run
         setup_database()
+    else:
+        setup_db = input(f"\n{Fore.YELLOW}Do you want to set up/upgrade the database? (y/n): {Style.RESET_ALL}")
+        if setup_db.lower() == 'y':
+            setup_database()
 
     while True:
         clear_screen()
@@ -1088,4 +1337,12 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         print(f"\n{Fore.GREEN}Thank you for using our system. Goodbye!{Style.RESET_ALL}")
+    finally:
+        if _write_queue is not None:
+            _write_queue.close()
+            logging.info(f"Write queue stats: {_write_queue.stats}")
+        stop_metrics()
+        if _db is not None:
+            logging.info(f"Connection pool metrics: {_db.pool.metrics.snapshot()}")
+            _db.close()
 #Run the file
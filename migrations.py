@@ -0,0 +1,540 @@
+"""Versioned, non-destructive schema migrations and query plan checks
+
+Each migration is applied at most once and recorded in ``schema_migrations``,
+so running ``migrate()`` against an existing database only applies what is
+missing. Run ``python migrations.py`` to upgrade, ``status`` to list applied
+versions, ``check`` to EXPLAIN the canonical queries and ``reconcile`` to
+rebuild the statistics counters from the base tables.
+"""
+
+import sys
+import logging
+import argparse
+from collections import namedtuple
+
+import geo
+import dedup
+import archive
+import text_index
+from storage import (
+    ARCHIVE_LIST_COLUMNS, REPORT_LIST_COLUMNS, StorageError, CounterRepository, ReportRepository, UserRepository
+)
+
+# ``after`` optionally maps a backend name to a callable that backfills data
+# once the statements have run
+Migration = namedtuple("Migration", ["version", "description", "statements", "after"], defaults=(None,))
+
+# Emulates MySQL's ON UPDATE CURRENT_TIMESTAMP for the columns a user or
+# admin edits, so backfilling derived columns (coordinates, duplicate links)
+# keeps each report's updated_at; migration 1's trigger fired on any update
+SQLITE_TOUCH_TRIGGER = (
+    "DROP TRIGGER IF EXISTS reports_touch_updated_at",
+    """
+    CREATE TRIGGER reports_touch_updated_at
+    AFTER UPDATE OF user_id, issue_type, severity, description, location, status ON reports
+    FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+    BEGIN
+        UPDATE reports SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+    END
+    """,
+)
+
+# Created by migration 1 with only a hash of this password stored
+DEFAULT_ADMIN = ("admin", "admin123")
+SEED_ADMIN = {
+    "mysql": "INSERT IGNORE INTO users (username, password, role) VALUES (%s, %s, 'admin')",
+    "sqlite": "INSERT OR IGNORE INTO users (username, password, role) VALUES (%s, %s, 'admin')",
+}
+
+
+def seed_admin(db):
+    """Create the default admin account unless one of that name exists"""
+    username, password = DEFAULT_ADMIN
+    hashed = db.passwords.hash(password)
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, SEED_ADMIN[db.backend.name], (username, hashed))
+
+
+# Statements are keyed by backend name; every list must be safe to apply to a
+# database created by the original DROP/CREATE setup script.
+MIGRATIONS = [
+    Migration(1, "Base users and reports tables with default admin", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                role ENUM('user', 'admin') NOT NULL DEFAULT 'user',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                issue_type VARCHAR(100) NOT NULL,
+                severity ENUM('Low', 'Medium', 'High', 'Critical') NOT NULL DEFAULT 'Medium',
+                description TEXT NOT NULL,
+                location VARCHAR(255) NOT NULL,
+                status ENUM('Pending', 'In Progress', 'Resolved', 'Rejected') NOT NULL DEFAULT 'Pending',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """,
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                role TEXT NOT NULL DEFAULT 'user' CHECK (role IN ('user', 'admin')),
+                created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                issue_type VARCHAR(100) NOT NULL,
+                severity TEXT NOT NULL DEFAULT 'Medium'
+                    CHECK (severity IN ('Low', 'Medium', 'High', 'Critical')),
+                description TEXT NOT NULL,
+                location VARCHAR(255) NOT NULL,
+                status TEXT NOT NULL DEFAULT 'Pending'
+                    CHECK (status IN ('Pending', 'In Progress', 'Resolved', 'Rejected')),
+                created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+                updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS reports_user_id ON reports (user_id)",
+            # Emulates MySQL's ON UPDATE CURRENT_TIMESTAMP
+            """
+            CREATE TRIGGER IF NOT EXISTS reports_touch_updated_at AFTER UPDATE ON reports
+            FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+            BEGIN
+                UPDATE reports SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+            END
+            """,
+        ],
+    }, after={"mysql": seed_admin, "sqlite": seed_admin}),
+    Migration(2, "Composite indexes for report filters and keyset pagination", {
+        "mysql": [
+            "CREATE INDEX reports_created ON reports (created_at)",
+            "CREATE INDEX reports_status_created ON reports (status, created_at)",
+            "CREATE INDEX reports_user_created ON reports (user_id, created_at)",
+            "CREATE INDEX reports_type_created ON reports (issue_type, created_at)",
+        ],
+        "sqlite": [
+            "CREATE INDEX IF NOT EXISTS reports_created ON reports (created_at)",
+            "CREATE INDEX IF NOT EXISTS reports_status_created ON reports (status, created_at)",
+            "CREATE INDEX IF NOT EXISTS reports_user_created ON reports (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS reports_type_created ON reports (issue_type, created_at)",
+        ],
+    }),
+    Migration(3, "Keyword search index on report location and description", {
+        "mysql": [
+            "ALTER TABLE reports ADD FULLTEXT INDEX reports_text (location, description)",
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS report_terms (
+                term TEXT NOT NULL,
+                report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+                weight INTEGER NOT NULL,
+                PRIMARY KEY (term, report_id)
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS report_terms_ranked ON report_terms (term, weight, report_id)",
+            "CREATE INDEX IF NOT EXISTS report_terms_report ON report_terms (report_id)",
+            """
+            CREATE TABLE IF NOT EXISTS report_term_stats (
+                term TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """,
+        ],
+    }, after={"sqlite": text_index.rebuild}),
+    Migration(4, "Incrementally maintained statistics counters", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS report_counters (
+                dimension VARCHAR(20) NOT NULL,
+                category VARCHAR(100) NOT NULL,
+                total BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, category)
+            )
+            """,
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS report_counters (
+                dimension VARCHAR(20) NOT NULL,
+                category VARCHAR(100) NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dimension, category)
+            ) WITHOUT ROWID
+            """,
+        ],
+    }, after={
+        # Seeds the new counters, so their "drift" from zero is expected; the
+        # archive table only arrives with migration 9
+        "mysql": lambda db: CounterRepository(db).reconcile(archived=False, warn=False),
+        "sqlite": lambda db: CounterRepository(db).reconcile(archived=False, warn=False),
+    }),
+    Migration(5, "Submission tickets for the group-commit write queue", {
+        "mysql": [
+            "ALTER TABLE reports ADD COLUMN ticket CHAR(32) NULL",
+            "CREATE UNIQUE INDEX reports_ticket ON reports (ticket)",
+        ],
+        "sqlite": [
+            "ALTER TABLE reports ADD COLUMN ticket CHAR(32)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS reports_ticket ON reports (ticket)",
+        ],
+    }),
+    Migration(6, "Coordinates and geohash index for nearby-report queries", {
+        "mysql": [
+            "ALTER TABLE reports ADD COLUMN latitude DOUBLE NULL",
+            "ALTER TABLE reports ADD COLUMN longitude DOUBLE NULL",
+            # Binary collation keeps geohash prefix ranges in byte order
+            "ALTER TABLE reports ADD COLUMN geohash CHAR(9) CHARACTER SET ascii COLLATE ascii_bin NULL",
+            "CREATE INDEX reports_geohash ON reports (geohash)",
+        ],
+        "sqlite": list(SQLITE_TOUCH_TRIGGER) + [
+            "ALTER TABLE reports ADD COLUMN latitude REAL",
+            "ALTER TABLE reports ADD COLUMN longitude REAL",
+            "ALTER TABLE reports ADD COLUMN geohash CHAR(9)",
+            "CREATE INDEX IF NOT EXISTS reports_geohash ON reports (geohash)",
+        ],
+    }, after={"mysql": geo.backfill, "sqlite": geo.backfill}),
+    Migration(7, "Near-duplicate signatures and duplicate links", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS report_signatures (
+                band_key BIGINT NOT NULL,
+                report_id INT NOT NULL,
+                PRIMARY KEY (band_key, report_id),
+                INDEX report_signatures_report (report_id),
+                FOREIGN KEY (report_id) REFERENCES reports(id) ON DELETE CASCADE
+            )
+            """,
+            "ALTER TABLE reports ADD COLUMN duplicate_of INT NULL",
+            "CREATE INDEX reports_duplicate_of ON reports (duplicate_of)",
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS report_signatures (
+                band_key INTEGER NOT NULL,
+                report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+                PRIMARY KEY (band_key, report_id)
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS report_signatures_report ON report_signatures (report_id)",
+            "ALTER TABLE reports ADD COLUMN duplicate_of INTEGER",
+            "CREATE INDEX IF NOT EXISTS reports_duplicate_of ON reports (duplicate_of)",
+        ],
+    }, after={"mysql": dedup.rebuild, "sqlite": dedup.rebuild}),
+    Migration(8, "Photo attachment metadata", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                report_id INT NOT NULL,
+                user_id INT NOT NULL,
+                sha256 CHAR(64) CHARACTER SET ascii NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                content_type VARCHAR(50) NOT NULL,
+                size_bytes INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX attachments_report (report_id),
+                INDEX attachments_sha256 (sha256),
+                FOREIGN KEY (report_id) REFERENCES reports(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """,
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                sha256 CHAR(64) NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                content_type VARCHAR(50) NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS attachments_report ON attachments (report_id)",
+            "CREATE INDEX IF NOT EXISTS attachments_sha256 ON attachments (sha256)",
+        ],
+    }),
+    # Attachments keep their report id while the report moves between the two
+    # tables, so they lose the foreign key that would delete them with it
+    Migration(9, "Archive table for closed reports", {
+        "mysql": [
+            """
+            CREATE TABLE IF NOT EXISTS reports_archive (
+                id INT PRIMARY KEY,
+                user_id INT NOT NULL,
+                issue_type VARCHAR(100) NOT NULL,
+                severity ENUM('Low', 'Medium', 'High', 'Critical') NOT NULL,
+                description TEXT NOT NULL,
+                location VARCHAR(255) NOT NULL,
+                status ENUM('Pending', 'In Progress', 'Resolved', 'Rejected') NOT NULL,
+                created_at TIMESTAMP NULL,
+                updated_at TIMESTAMP NULL,
+                ticket CHAR(32) NULL,
+                latitude DOUBLE NULL,
+                longitude DOUBLE NULL,
+                geohash CHAR(9) CHARACTER SET ascii COLLATE ascii_bin NULL,
+                duplicate_of INT NULL,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX reports_archive_created (created_at),
+                INDEX reports_archive_user_created (user_id, created_at),
+                INDEX reports_archive_type_created (issue_type, created_at),
+                INDEX reports_archive_geohash (geohash),
+                FULLTEXT INDEX reports_archive_text (location, description),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """,
+        ],
+        "sqlite": [
+            """
+            CREATE TABLE IF NOT EXISTS reports_archive (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                issue_type VARCHAR(100) NOT NULL,
+                severity TEXT NOT NULL,
+                description TEXT NOT NULL,
+                location VARCHAR(255) NOT NULL,
+                status TEXT NOT NULL,
+                created_at TIMESTAMP,
+                updated_at TIMESTAMP,
+                ticket CHAR(32),
+                latitude REAL,
+                longitude REAL,
+                geohash CHAR(9),
+                duplicate_of INTEGER,
+                archived_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS reports_archive_created ON reports_archive (created_at)",
+            "CREATE INDEX IF NOT EXISTS reports_archive_user_created ON reports_archive (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS reports_archive_type_created ON reports_archive (issue_type, created_at)",
+            "CREATE INDEX IF NOT EXISTS reports_archive_geohash ON reports_archive (geohash)",
+            """
+            CREATE TABLE IF NOT EXISTS archive_terms (
+                term TEXT NOT NULL,
+                report_id INTEGER NOT NULL REFERENCES reports_archive(id) ON DELETE CASCADE,
+                weight INTEGER NOT NULL,
+                PRIMARY KEY (term, report_id)
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS archive_terms_ranked ON archive_terms (term, weight, report_id)",
+            "CREATE INDEX IF NOT EXISTS archive_terms_report ON archive_terms (report_id)",
+            """
+            CREATE TABLE IF NOT EXISTS archive_term_stats (
+                term TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """,
+            # SQLite cannot drop a foreign key, so the table is rebuilt without it
+            """
+            CREATE TABLE attachments_unlinked (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                report_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                sha256 CHAR(64) NOT NULL,
+                filename VARCHAR(255) NOT NULL,
+                content_type VARCHAR(50) NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+            )
+            """,
+            """
+            INSERT INTO attachments_unlinked (id, report_id, user_id, sha256, filename, content_type, size_bytes, created_at)
+            SELECT id, report_id, user_id, sha256, filename, content_type, size_bytes, created_at FROM attachments
+            """,
+            "DROP TABLE attachments",
+            "ALTER TABLE attachments_unlinked RENAME TO attachments",
+            "CREATE INDEX IF NOT EXISTS attachments_report ON attachments (report_id)",
+            "CREATE INDEX IF NOT EXISTS attachments_sha256 ON attachments (sha256)",
+        ],
+    }, after={"mysql": archive.unlink_attachments}),
+    Migration(10, "Touch updated_at only when a report's own fields change", {
+        "mysql": [],
+        "sqlite": list(SQLITE_TOUCH_TRIGGER),
+    }),
+    Migration(11, "Hash passwords still stored in plaintext", {"mysql": [], "sqlite": []}, after={
+        # The default admin of older databases and rows from the original setup script
+        "mysql": lambda db: UserRepository(db).hash_plaintext_passwords(),
+        "sqlite": lambda db: UserRepository(db).hash_plaintext_passwords(),
+    }),
+    Migration(12, "Document counts of the keyword indexes", {
+        "mysql": [],
+        "sqlite": [
+            f"""
+            INSERT OR REPLACE INTO {index.stats} (term, doc_count)
+            SELECT '{text_index.DOCUMENTS}', COUNT(DISTINCT report_id) FROM {index.terms}
+            """
+            for index in (text_index.REPORTS, text_index.ARCHIVE)
+        ],
+    }),
+]
+
+# The query shapes each screen issues, with representative parameters
+PAGE_ORDER = " ORDER BY r.created_at DESC, r.id DESC LIMIT 21"
+CANONICAL_QUERIES = [
+    ("reports.page_all", REPORT_LIST_COLUMNS + PAGE_ORDER, ()),
+    ("reports.page_by_status", REPORT_LIST_COLUMNS + " WHERE r.status = %s" + PAGE_ORDER, ("Pending",)),
+    ("reports.page_for_user",
+     "SELECT id, issue_type, severity, description, location, status, created_at FROM reports"
+     " WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT 21", (1,)),
+    ("reports.detail", REPORT_LIST_COLUMNS + " WHERE r.id = %s", (1,)),
+    ("reports.stream_matching(username)",
+     REPORT_LIST_COLUMNS + " WHERE u.username LIKE %s ORDER BY r.created_at DESC, r.id DESC LIMIT %s",
+     ("%admin%", 1000)),
+    ("reports.stream_matching(issue_type)",
+     REPORT_LIST_COLUMNS + " WHERE r.issue_type = %s ORDER BY r.created_at DESC, r.id DESC LIMIT %s",
+     ("Road Damage", 1000)),
+    ("reports.stream_matching(created_range)",
+     REPORT_LIST_COLUMNS + " WHERE r.created_at >= %s AND r.created_at < %s ORDER BY r.created_at DESC, r.id DESC"
+     " LIMIT %s", ("2024-01-01 00:00:00", "2024-02-01 00:00:00", 1000)),
+    ("users.page", "SELECT id, username, role, created_at FROM users WHERE id > %s ORDER BY id LIMIT %s", (0, 1000)),
+    ("attachments.for_report",
+     "SELECT id, filename, content_type, size_bytes, created_at FROM attachments WHERE report_id = %s ORDER BY id",
+     (1,)),
+    ("reports.duplicates_of", "SELECT id FROM reports WHERE duplicate_of = %s ORDER BY id", (1,)),
+    ("users.authenticate", "SELECT id, username, role, password FROM users WHERE username = %s", ("admin",)),
+    ("reports_archive.page_for_user",
+     "SELECT id, issue_type, severity, description, location, status, created_at FROM reports_archive"
+     " WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT 21", (1,)),
+    ("reports_archive.by_id", ARCHIVE_LIST_COLUMNS + " WHERE r.id = %s", (1,)),
+    ("archive.scan", "SELECT id, status, updated_at FROM reports WHERE id > %s ORDER BY id LIMIT %s", (0, 500)),
+    ("archive.eligible_range",
+     "SELECT MIN(id), MAX(id) FROM reports WHERE status IN (%s, %s) AND updated_at < %s",
+     ("Resolved", "Rejected", "2024-01-01 00:00:00")),
+]
+
+
+def _ensure_version_table(db):
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+
+def applied_versions(db):
+    """Return the set of migration versions already applied"""
+    _ensure_version_table(db)
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(db):
+    """Return the migrations not yet applied, in version order"""
+    done = applied_versions(db)
+    return [migration for migration in MIGRATIONS if migration.version not in done]
+
+
+def migrate(db):
+    """Apply every pending migration in order and return the versions applied"""
+    db.backend.ensure_database()
+    applied = []
+    for migration in pending_migrations(db):
+        statements = migration.statements.get(db.backend.name)
+        if statements is None:
+            raise StorageError(f"Migration {migration.version} has no {db.backend.name} statements")
+        with db.cursor(commit=True) as cursor:
+            for statement in statements:
+                try:
+                    db.execute(cursor, statement)
+                except db.backend.errors as err:
+                    # MySQL DDL commits implicitly, so a rerun after a partial
+                    # failure may find some objects already in place
+                    if not db.backend.is_duplicate_object_error(err):
+                        raise
+                    logging.warning(f"Migration {migration.version}: skipping existing object ({err})")
+        if migration.after and db.backend.name in migration.after:
+            migration.after[db.backend.name](db)
+        with db.cursor(commit=True) as cursor:
+            db.execute(
+                cursor,
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description)
+            )
+        logging.info(f"Applied migration {migration.version}: {migration.description}")
+        applied.append(migration.version)
+    return applied
+
+
+def canonical_queries(db):
+    """Return the canonical (name, sql, params) list, including backend-specific statements"""
+    queries = list(CANONICAL_QUERIES)
+    reports = ReportRepository(db)
+    queries.append(("reports.search_text",) + reports.text_search_statement("main street", 50))
+    queries.append(("reports.find_nearby",) + reports.nearby_statement(-1.9441, 30.0619, 500))
+    queries.append(("report_signatures.candidates",) + dedup.candidates_statement(list(range(1, 73))))
+    return queries
+
+
+def check_query_plans(db, queries=None):
+    """EXPLAIN each canonical query and return (name, problems, plan) tuples
+
+    ``problems`` lists full table scans and sorts the engine cannot serve
+    from an index. Plans depend on table statistics, so run this against
+    representative data.
+    """
+    results = []
+    for name, sql, params in queries or canonical_queries(db):
+        plan = db.explain(sql, params)
+        bounded = " LIMIT " in sql.upper()
+        results.append((name, db.backend.plan_problems(plan, bounded), plan))
+    return results
+
+
+def main(argv=None):
+    """Command line entry point for migrations and plan checks"""
+    import index
+
+    parser = argparse.ArgumentParser(description="Manage the infrastructure database schema")
+    parser.add_argument("command", nargs="?", default="migrate", choices=["migrate", "status", "check", "reconcile"])
+    args = parser.parse_args(argv)
+    db = index.get_db()
+
+    if args.command == "migrate":
+        applied = migrate(db)
+        print(f"Applied migrations: {applied}" if applied else "Database is up to date.")
+    elif args.command == "status":
+        done = applied_versions(db)
+        for migration in MIGRATIONS:
+            mark = "x" if migration.version in done else " "
+            print(f"[{mark}] {migration.version:03d} {migration.description}")
+    elif args.command == "reconcile":
+        drift = CounterRepository(db).reconcile()
+        for dimension, category, stored, actual in drift:
+            print(f"drift {dimension}/{category}: {stored} -> {actual}")
+        print(f"Corrected {len(drift)} counter(s)." if drift else "Counters match the base tables.")
+    else:
+        flagged = 0
+        for name, problems, plan in check_query_plans(db):
+            if problems:
+                flagged += 1
+                print(f"SCAN  {name}: {'; '.join(problems)}")
+            else:
+                print(f"ok    {name}")
+        return 1 if flagged else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
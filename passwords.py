@@ -0,0 +1,282 @@
+"""Salted, memory-hard password hashes verified on a bounded process pool
+
+Passwords are stored as ``scrypt$<log2 N>$<r>$<p>$<salt>$<hash>``, or as
+``pbkdf2_sha256$<iterations>$<salt>$<hash>`` where the Python build lacks
+scrypt. Rows written before hashing hold the plaintext; they still verify,
+and ``needs_rehash`` tells the caller to replace them with a hash at the
+next successful login, as it does for hashes made at an older cost.
+
+Each verification takes tens of milliseconds of CPU, so ``PasswordHasher``
+runs them on at most ``workers`` processes with at most ``max_pending``
+in flight. A burst of logins therefore queues on the pool instead of
+competing with every request thread for the CPU, and a caller that cannot
+get a slot within ``wait_timeout`` gets HasherBusyError. Credentials that
+verified recently are remembered (as a keyed digest, never the password)
+so clients that authenticate every request, such as the HTTP API, pay for
+the hash once per cache lifetime.
+
+``python passwords.py`` reports logins per second per core at each cost.
+"""
+
+import os
+import sys
+import hmac
+import time
+import base64
+import hashlib
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import MISSING, LRUCache
+from db_pool import PoolTimeoutError
+
+# scrypt work factor as log2(N); 14 is N=16384 with r=8, about 16 MiB per hash
+DEFAULT_COST = 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+# PBKDF2-SHA256 iterations at DEFAULT_COST, doubled for each step above it
+PBKDF2_ITERATIONS = 600000
+
+HAS_SCRYPT = hasattr(hashlib, "scrypt")
+
+
+class HasherBusyError(PoolTimeoutError):
+    """Raised when too many password checks are already waiting for a worker
+
+    A PoolTimeoutError, so callers already retrying on a busy database
+    handle it the same way.
+    """
+
+
+def _b64encode(data):
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, log_n, r, p, length=HASH_BYTES):
+    n = 1 << log_n
+    # scrypt needs 128 * N * r bytes; OpenSSL refuses anything over maxmem
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=256 * n * r + (1 << 20), dklen=length)
+
+
+def _pbkdf2_iterations(cost):
+    return max(1000, int(PBKDF2_ITERATIONS * 2.0 ** (cost - DEFAULT_COST)))
+
+
+def hash_password(password, cost=DEFAULT_COST):
+    """Return a new salted hash of ``password`` in the stored format"""
+    salt = os.urandom(SALT_BYTES)
+    if HAS_SCRYPT:
+        digest = _scrypt(password, salt, cost, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${cost}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(digest)}"
+    iterations = _pbkdf2_iterations(cost)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations, HASH_BYTES)
+    return f"pbkdf2_sha256${iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def _parse(stored):
+    """Return (algorithm, parameters, salt, digest), or None for a legacy plaintext row"""
+    parts = stored.split("$")
+    try:
+        if parts[0] == "scrypt" and len(parts) == 6:
+            return "scrypt", tuple(int(part) for part in parts[1:4]), _b64decode(parts[4]), _b64decode(parts[5])
+        if parts[0] == "pbkdf2_sha256" and len(parts) == 4:
+            return "pbkdf2_sha256", (int(parts[1]),), _b64decode(parts[2]), _b64decode(parts[3])
+    except ValueError:
+        pass
+    return None
+
+
+def verify_password(password, stored):
+    """Return True if ``password`` matches a stored hash or legacy plaintext"""
+    parsed = _parse(stored)
+    if parsed is None:
+        return hmac.compare_digest(password.encode(), stored.encode())
+    algorithm, parameters, salt, digest = parsed
+    if algorithm == "scrypt":
+        computed = _scrypt(password, salt, *parameters, length=len(digest))
+    else:
+        computed = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, parameters[0], len(digest))
+    return hmac.compare_digest(computed, digest)
+
+
+def is_hashed(stored):
+    """False for a legacy plaintext row"""
+    return _parse(stored) is not None
+
+
+def needs_rehash(stored, cost=DEFAULT_COST):
+    """True for plaintext rows and hashes not made by this build at ``cost``"""
+    parsed = _parse(stored)
+    if parsed is None:
+        return True
+    if HAS_SCRYPT:
+        return parsed[:2] != ("scrypt", (cost, SCRYPT_R, SCRYPT_P))
+    return parsed[:2] != ("pbkdf2_sha256", (_pbkdf2_iterations(cost),))
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a lazily started process pool
+
+    With ``workers`` of 0 the work runs in the calling thread, still bounded
+    by ``max_pending`` (default four per worker, or per core inline).
+    """
+
+    def __init__(self, cost=DEFAULT_COST, workers=1, max_pending=None, wait_timeout=5.0,
+                 verified_cache_size=1024, verified_cache_ttl=300.0):
+        if cost < 1:
+            raise ValueError("Hash cost must be at least 1")
+        self.cost = cost
+        self.workers = workers
+        self.wait_timeout = wait_timeout
+        self.max_pending = max_pending or 4 * (workers or os.cpu_count() or 1)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        # Keyed by a digest of (stored hash, password) under a per-process secret
+        self._secret = os.urandom(32)
+        self.verified = LRUCache(verified_cache_size, verified_cache_ttl)
+        self._dummy = None
+        self.hashed = 0
+        self.verifications = 0
+        self.rejected = 0
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusyError(f"{self.max_pending} password checks already waiting")
+        try:
+            if not self.workers:
+                return function(*args)
+            with self._lock:
+                if self._executor is None:
+                    # spawn, not fork: the callers are threaded servers
+                    self._executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"))
+            executor = self._executor
+            try:
+                return executor.submit(function, *args).result()
+            except BrokenProcessPool:
+                # A worker died (killed for memory, say); start afresh next time
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                executor.shutdown(wait=False)
+                raise
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Return a new hash of ``password`` at this hasher's cost"""
+        with self._lock:
+            self.hashed += 1
+        return self._run(hash_password, password, self.cost)
+
+    def verify(self, password, stored):
+        """Return True if ``password`` matches ``stored``; pass None for an unknown user
+
+        An unknown user is checked against a throwaway hash, so a failed
+        login takes as long whether or not the name exists.
+        """
+        if stored is None:
+            if self._dummy is None:
+                self._dummy = self.hash(os.urandom(16).hex())
+            self._run(verify_password, password, self._dummy)
+            return False
+        key = self._verified_key(password, stored)
+        if self.verified.get(key) is not MISSING:
+            return True
+        with self._lock:
+            self.verifications += 1
+        if not self._run(verify_password, password, stored):
+            return False
+        self.verified.put(key, True)
+        return True
+
+    def remember(self, password, stored):
+        """Record that ``password`` matches ``stored``, as after rehashing it"""
+        self.verified.put(self._verified_key(password, stored), True)
+
+    def _verified_key(self, password, stored):
+        return hmac.new(self._secret, f"{stored}\0{password}".encode(), hashlib.sha256).digest()
+
+    def needs_rehash(self, stored):
+        return needs_rehash(stored, self.cost)
+
+    def stats(self):
+        return {
+            "algorithm": "scrypt" if HAS_SCRYPT else "pbkdf2_sha256",
+            "cost": self.cost,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "hashed": self.hashed,
+            "verifications": self.verifications,
+            "rejected": self.rejected,
+            "verified_cache": self.verified.stats(),
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _verify_loop(stored, seconds):
+    """Verify ``stored`` repeatedly for ``seconds`` and return how many were done"""
+    count, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        verify_password("benchmark password", stored)
+        count += 1
+    return count
+
+
+def benchmark(costs, seconds=2.0, processes=None):
+    """Return [(cost, ms per login, logins/s per core, logins/s on all processes)] for each cost
+
+    Processes run flat out, so the per-core figure only holds up to the
+    number of physical cores.
+    """
+    processes = processes or os.cpu_count() or 1
+    results = []
+    with ProcessPoolExecutor(processes, multiprocessing.get_context("spawn")) as executor:
+        for cost in costs:
+            stored = hash_password("benchmark password", cost)
+            single = _verify_loop(stored, seconds)
+            started = time.perf_counter()
+            total = sum(executor.map(_verify_loop, [stored] * processes, [seconds] * processes))
+            elapsed = time.perf_counter() - started
+            results.append((cost, seconds * 1000 / single, single / seconds, total / elapsed))
+    return results
+
+
+def main(argv=None):
+    """Command line entry point for the hash cost benchmark"""
+    parser = argparse.ArgumentParser(description="Measure password verifications per second at each hash cost")
+    parser.add_argument("--costs", type=int, nargs="+", default=[12, 13, 14, 15, 16],
+                        help=f"costs to time (log2 of the scrypt N; default: 12-16, current {DEFAULT_COST})")
+    parser.add_argument("--seconds", type=float, default=2.0, help="seconds per measurement (default: 2)")
+    parser.add_argument("--processes", type=int, default=None, help="processes for the pool figure (default: CPUs)")
+    args = parser.parse_args(argv)
+
+    processes = args.processes or os.cpu_count() or 1
+    algorithm = f"scrypt r={SCRYPT_R} p={SCRYPT_P}" if HAS_SCRYPT else "pbkdf2_sha256"
+    print(f"{algorithm}, {os.cpu_count()} CPU(s), {processes} process(es), {args.seconds}s per measurement")
+    print(f"{'cost':>4}{'memory':>10}{'ms/login':>11}{'logins/s/core':>15}{'logins/s pool':>15}")
+    for cost, ms, per_core, pooled in benchmark(args.costs, args.seconds, processes):
+        memory = f"{128 * SCRYPT_R * (1 << cost) >> 20} MiB" if HAS_SCRYPT else "-"
+        print(f"{cost:>4}{memory:>10}{ms:>11.1f}{per_core:>15.1f}{pooled:>15.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
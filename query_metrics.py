@@ -0,0 +1,377 @@
+"""Per-statement timing, row counts and a slow-query log for every database call
+
+Database.cursor hands out an InstrumentedCursor, so every statement run by
+any repository, screen, CLI command or server request is measured without
+the callers changing. Registered statements (see ``statements``) are
+keyed by their name; any other statement by a stable name derived from
+its text (verb, main table and a digest of the normalised SQL, with IN
+lists of any length collapsed), so one query shape is one series whatever
+its parameters.
+
+A statement's latency covers its execute call and every fetch from its
+result until the cursor moves on, so lazily fetched results are counted
+in full but time the caller spends between fetches is not. Statements
+slower than ``slow_query_ms`` are written to the ``infra.slow_queries``
+logger with their parameters redacted to type and size.
+
+``write_prometheus`` renders everything in the Prometheus text format;
+MetricsExporter rewrites such a file periodically for a node exporter
+textfile collector to scrape.
+"""
+
+import os
+import re
+import time
+import bisect
+import hashlib
+import logging
+import datetime
+import threading
+from functools import lru_cache
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+DEFAULT_SLOW_QUERY_MS = 100.0
+
+slow_query_log = logging.getLogger("infra.slow_queries")
+
+_WHITESPACE = re.compile(r"\s+")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)")
+_VALUES_LIST = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_TABLE = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?|EXISTS)\s+([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def normalize(sql):
+    """Return ``sql`` with whitespace collapsed, ? placeholders and IN/VALUES lists shortened"""
+    text = _WHITESPACE.sub(" ", sql).strip().replace("?", "%s")
+    text = _VALUES_LIST.sub(r"\1, ...", text)
+    return _PLACEHOLDER_LIST.sub("(%s, ...)", text)
+
+
+@lru_cache(maxsize=1024)
+def query_name(sql):
+    """Stable name of a statement: ``verb:table:digest`` of its normalised text"""
+    text = normalize(sql)
+    verb = text.split(" ", 1)[0].lower()
+    table = _TABLE.search(text)
+    digest = hashlib.blake2b(text.encode(), digest_size=3).hexdigest()
+    return f"{verb}:{table.group(1).lower() if table else '-'}:{digest}"
+
+
+def redact(params):
+    """Describe statement parameters by type and size, never by value"""
+    def describe(value):
+        if value is None:
+            return "NULL"
+        if isinstance(value, (str, bytes)):
+            return f"<{type(value).__name__}:{len(value)}>"
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return "<datetime>"
+        return f"<{type(value).__name__}>"
+
+    params = list(params or ())
+    if len(params) > 10:
+        return "[" + ", ".join(describe(value) for value in params[:10]) + f", ... {len(params)} values]"
+    return "[" + ", ".join(describe(value) for value in params) + "]"
+
+
+class Histogram:
+    """Counts of observations in fixed millisecond buckets, plus their sum and maximum"""
+
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        """Estimate a quantile by interpolating within its bucket"""
+        if not self.count:
+            return 0.0
+        rank, seen = fraction * self.count, 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def cumulative(self):
+        """Yield (upper bound or None for +Inf, observations at or below it)"""
+        total = 0
+        for index, count in enumerate(self.counts):
+            total += count
+            yield (self.bounds[index] if index < len(self.bounds) else None), total
+
+
+class StatementStats:
+    """Everything recorded for one statement name"""
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.latency = Histogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+
+
+class QueryMetrics:
+    """Thread-safe registry of statement and connection-acquire timings"""
+
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.statements = {}
+            self.acquire = Histogram()
+            self.since = time.time()
+
+    def record(self, sql, elapsed_ms, rows, params=(), failed=False, name=None):
+        name = name or query_name(sql)
+        with self._lock:
+            stats = self.statements.get(name)
+            if stats is None:
+                stats = self.statements[name] = StatementStats(normalize(sql))
+            stats.latency.observe(elapsed_ms)
+            stats.rows += rows
+            stats.errors += failed
+            slow = elapsed_ms >= self.slow_query_ms
+            stats.slow += slow
+        if slow:
+            slow_query_log.warning(
+                f"{elapsed_ms:.1f} ms {name} rows={rows}{' FAILED' if failed else ''}"
+                f" sql={normalize(sql)} params={redact(params)}"
+            )
+
+    def record_acquire(self, elapsed_ms):
+        with self._lock:
+            self.acquire.observe(elapsed_ms)
+
+    def summary(self):
+        """Return one dict per statement, slowest total time first"""
+        with self._lock:
+            rows = [{
+                "name": name,
+                "sql": stats.sql,
+                "calls": stats.latency.count,
+                "total_ms": stats.latency.sum,
+                "p50_ms": stats.latency.quantile(0.5),
+                "p95_ms": stats.latency.quantile(0.95),
+                "p99_ms": stats.latency.quantile(0.99),
+                "max_ms": stats.latency.max,
+                "rows": stats.rows,
+                "errors": stats.errors,
+                "slow": stats.slow,
+            } for name, stats in self.statements.items()]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def acquire_summary(self):
+        with self._lock:
+            return {
+                "count": self.acquire.count,
+                "p50_ms": self.acquire.quantile(0.5),
+                "p95_ms": self.acquire.quantile(0.95),
+                "max_ms": self.acquire.max,
+            }
+
+    def prometheus(self, pool_metrics=None):
+        """Render every series in the Prometheus text exposition format"""
+        lines = []
+
+        def histogram(metric, help_text, series):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for labels, hist in series:
+                prefix = labels + "," if labels else ""
+                for bound, total in hist.cumulative():
+                    le = "+Inf" if bound is None else repr(bound / 1000)
+                    lines.append(f'{metric}_bucket{{{prefix}le="{le}"}} {total}')
+                braces = f"{{{labels}}}" if labels else ""
+                lines.append(f"{metric}_sum{braces} {hist.sum / 1000:.6f}")
+                lines.append(f"{metric}_count{braces} {hist.count}")
+
+        def counter(metric, help_text, values):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            lines.extend(f"{metric}{{{labels}}} {value}" for labels, value in values)
+
+        with self._lock:
+            statements = sorted(self.statements.items())
+            labelled = [(f'query="{name}"', stats) for name, stats in statements]
+            histogram("infra_query_duration_seconds", "Time spent executing and fetching each statement",
+                      [(labels, stats.latency) for labels, stats in labelled])
+            counter("infra_query_rows_total", "Rows returned or changed by each statement",
+                    [(labels, stats.rows) for labels, stats in labelled])
+            counter("infra_query_errors_total", "Statements that raised a database error",
+                    [(labels, stats.errors) for labels, stats in labelled])
+            counter("infra_slow_queries_total", "Statements at or over the slow query threshold",
+                    [(labels, stats.slow) for labels, stats in labelled])
+            histogram("infra_pool_acquire_seconds", "Time taken to check a connection out of the pool",
+                      [("", self.acquire)])
+        if pool_metrics is not None:
+            for name, value in pool_metrics.items():
+                kind = "gauge" if name in ("in_use", "max_in_use", "avg_wait_ms") else "counter"
+                metric = f"infra_pool_{name}" + ("_total" if kind == "counter" else "")
+                lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def write_prometheus(db, path):
+    """Atomically replace ``path`` with the database's metrics in the Prometheus text format"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.write(db.metrics.prometheus(db.pool.metrics.snapshot()))
+    os.replace(temp_path, path)
+
+
+class MetricsExporter:
+    """Rewrites a Prometheus text file every ``interval`` seconds, and once more on stop"""
+
+    def __init__(self, db, path, interval=15.0):
+        self.db = db
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        try:
+            write_prometheus(self.db, self.path)
+        except OSError as err:
+            logging.warning(f"Could not write metrics to {self.path}: {err}")
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.write()
+
+
+class InstrumentedCursor:
+    """Wraps a driver cursor, timing each statement from execute through its fetches
+
+    ``prepare(name)``, if given, returns the driver cursor a registered
+    statement of that name is prepared on. Such a statement runs there and
+    its rows are read at once, so none are left unread on the connection
+    when the next statement or the next borrower uses it.
+    """
+
+    def __init__(self, cursor, metrics, prepare=None):
+        self._cursor = self._default = cursor
+        self._metrics = metrics
+        self._prepare = prepare
+        self._sql = None
+        self._name = None
+        self._params = ()
+        self._elapsed = 0.0
+        self._rows = 0
+        # Rows of a prepared statement, read at execute and served from _position on
+        self._buffer = None
+        self._position = 0
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _start(self, sql, params, rows=0, name=None):
+        self.finish()
+        self._sql, self._params, self._elapsed, self._rows, self._name = sql, params, 0.0, rows, name
+        self._buffer, self._position = None, 0
+
+    def _run(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        except Exception:
+            self._elapsed += time.perf_counter() - started
+            self.finish(failed=True)
+            raise
+        finally:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def execute(self, sql, params=(), name=None):
+        """Run a statement; ``name`` marks it as registered under that name"""
+        self._start(sql, params, name=name)
+        prepared = self._prepare(name) if name is not None and self._prepare is not None else None
+        self._cursor = prepared or self._default
+        result = self._run(self._cursor.execute, sql, params)
+        if self._cursor.description is None:
+            self._rows = max(self._cursor.rowcount, 0)
+        elif prepared is not None:
+            self._buffer = self._run(self._cursor.fetchall)
+            self._rows = len(self._buffer)
+        return result
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        self._start(sql, seq_of_params[0] if seq_of_params else ())
+        self._cursor = self._default
+        result = self._run(self._cursor.executemany, sql, seq_of_params)
+        self._rows = max(self._cursor.rowcount, 0)
+        return result
+
+    def fetchone(self):
+        if self._buffer is not None:
+            rows = self._take(1)
+            return rows[0] if rows else None
+        row = self._run(self._cursor.fetchone)
+        self._rows += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        if self._buffer is not None:
+            return self._take(self._cursor.arraysize if size is None else size)
+        rows = self._run(self._cursor.fetchmany, *(() if size is None else (size,)))
+        self._rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        if self._buffer is not None:
+            return self._take(len(self._buffer))
+        rows = self._run(self._cursor.fetchall)
+        self._rows += len(rows)
+        return rows
+
+    def _take(self, size):
+        """Return the next ``size`` buffered rows of a prepared statement"""
+        rows = self._buffer[self._position:self._position + max(size, 0)]
+        self._position += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def finish(self, failed=False):
+        """Record the statement in progress, if any"""
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            self._metrics.record(sql, self._elapsed * 1000, self._rows, self._params, failed, self._name)
+
+    def close(self):
+        """Close the driver cursor; prepared cursors stay open with their connection"""
+        self.finish()
+        self._default.close()
@@ -0,0 +1,691 @@
+"""Concurrent HTTP/JSON front end built on asyncio and the standard library
+
+One process serves many clients: connections are handled by the event
+loop, and the blocking repository calls run on a fixed set of worker
+threads sharing the connection pool. At most ``--workers`` requests touch
+the database at once; up to ``--queue`` more wait for a slot for at most
+``--queue-timeout`` seconds, and anything beyond that is answered at once
+with 503 and a Retry-After header instead of piling up.
+
+Requests authenticate with HTTP Basic credentials of an application user.
+
+    POST  /reports                 submit a report (JSON body); 202 with a ticket under --write-queue
+    GET   /tickets/{ticket}        the report id assigned to a queued submission, once stored
+    GET   /reports/mine            your reports, one keyset page (?page_size, after, before)
+    GET   /reports/{id}            one report; admins may read any
+    GET   /reports/nearby          admin: reports within ?radius metres of ?lat, lon, nearest first (limit)
+    GET   /reports                 admin search (?id, username, issue_type, status, keywords, from, to, preset, limit)
+    PUT   /reports/{id}/status     admin status change ({"status": ...})
+    POST  /reports/{id}/attachments  attach a photo to your report (raw image body, ?filename); admins to any
+    GET   /reports/{id}/attachments  the photos of a report
+    GET   /attachments/{id}        the photo itself
+    GET   /attachments/{id}/thumbnail  a small JPEG of the photo (404 without Pillow)
+    GET   /stats                   admin statistics counters
+    GET   /health                  liveness and pool metrics, no authentication
+    GET   /metrics                 statement timings and pool metrics in the Prometheus text format, no authentication
+
+    python server.py --port 8080 --workers 8
+    python server.py --write-queue submissions.db --max-batch 500 --max-delay 0.2
+
+Photo uploads are not buffered: once the sender is authenticated and owns
+the report, the body is written to the attachment store as it arrives,
+without holding a worker. Photos are sent from a memory map of the stored
+file, one chunk at a time.
+"""
+
+import os
+import sys
+import json
+import base64
+import asyncio
+import logging
+import argparse
+import functools
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from attachments import CHUNK_SIZE, AttachmentError
+from cli import ATTACHMENT_KEYS, NEARBY_KEYS, REPORT_LIST_KEYS, USER_REPORT_KEYS, UsageError, decode_key, encode_key, records
+from db_pool import PoolTimeoutError
+from filters import FilterError, ReportFilter, date_range, parse_choice, parse_id_selection, preset_range
+from passwords import HasherBusyError
+from write_queue import DEFAULT_MAX_BATCH, DEFAULT_MAX_DELAY, WriteQueue
+from storage import (
+    ISSUE_TYPES, SEVERITIES, STATUSES, DEFAULT_PAGE_SIZE, DEFAULT_SEARCH_LIMIT, DEFAULT_NEARBY_LIMIT,
+    StorageError, AttachmentRepository, CounterRepository, ReportRepository, UserRepository
+)
+
+REPORT_DETAIL_KEYS = ("id", "issue_type", "severity", "description", "location", "status",
+                      "created_at", "updated_at", "username", "duplicate_of")
+
+# Largest request head and body accepted, in bytes
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds an idle keep-alive connection is held open, and an upload may stall
+KEEP_ALIVE_TIMEOUT = 15.0
+
+# Seconds clients may cache a photo; its URL never serves other content
+ATTACHMENT_MAX_AGE = 86400
+
+# Largest page or result list a client may ask for
+MAX_PAGE_SIZE = 500
+
+CHALLENGE = {"WWW-Authenticate": 'Basic realm="infrastructure"'}
+
+REASONS = {
+    200: "OK", 201: "Created", 202: "Accepted", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+    403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 408: "Request Timeout", 411: "Length Required",
+    413: "Payload Too Large", 500: "Internal Server Error", 501: "Not Implemented", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """An error response with a status code and JSON message"""
+
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class Overloaded(HTTPError):
+    """Raised when a request cannot get a worker slot in time"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(503, message, {"Retry-After": str(retry_after)})
+
+
+class Admission:
+    """Bounds concurrent database work and the queue of requests waiting for it"""
+
+    def __init__(self, limit, max_waiting, wait_timeout):
+        self._slots = asyncio.Semaphore(limit)
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.waiting = 0
+        self.rejected = 0
+
+    async def __aenter__(self):
+        if self._slots.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise Overloaded("Server is at capacity, retry shortly")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded("Timed out waiting for a worker, retry shortly") from None
+        finally:
+            self.waiting -= 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._slots.release()
+        return False
+
+
+class FileResponse:
+    """A stored photo or thumbnail to send as the response body"""
+
+    def __init__(self, name, kind, content_type, size, etag):
+        self.name = name
+        self.kind = kind
+        self.content_type = content_type
+        self.size = size
+        self.etag = f'"{etag}"'
+        self.head = b""
+
+
+class Request:
+    """A parsed HTTP request
+
+    A streamed request (a photo upload) leaves its body on ``reader``, with
+    ``unread`` bytes still to come; the connection cannot be reused until
+    they have been read.
+    """
+
+    def __init__(self, method, target, version, headers, body, reader=None, unread=0):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.version = version
+        self.headers = headers
+        self.body = body
+        self.reader = reader
+        self.unread = unread
+
+    @property
+    def keep_alive(self):
+        if self.unread:
+            return False
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self):
+        try:
+            document = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Request body is not valid JSON") from None
+        if not isinstance(document, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return document
+
+
+def is_upload(method, path):
+    """True for the routes whose body is streamed instead of read whole"""
+    parts = path.strip("/").split("/")
+    return method == "POST" and len(parts) == 3 and parts[0] == "reports" and parts[1].isdigit() \
+        and parts[2] == "attachments"
+
+
+async def read_request(reader):
+    """Read one request from the stream, or return None at end of stream"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "Request head too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    # Only Content-Length bodies are read; a chunked body left on the stream
+    # would be parsed as the next request
+    if "transfer-encoding" in headers:
+        raise HTTPError(501, "Transfer-Encoding is not supported, send a Content-Length")
+    length = headers.get("content-length", "0")
+    if not length.isdigit():
+        raise HTTPError(400, "Invalid Content-Length")
+    if is_upload(method.upper(), urlsplit(target).path):
+        return Request(method.upper(), target, version, headers, None, reader, int(length))
+    if int(length) > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Request body is larger than {MAX_BODY_BYTES} bytes")
+    body = b""
+    if int(length):
+        try:
+            body = await asyncio.wait_for(reader.readexactly(int(length)), KEEP_ALIVE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPError(408, "Request body stalled") from None
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+    return Request(method.upper(), target, version, headers, body)
+
+
+def encode_head(status, content_type, length, headers=None, keep_alive=True):
+    lines = [
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {length}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+def encode_response(status, document, headers=None, keep_alive=True):
+    body = json.dumps(document, default=str).encode()
+    return encode_head(status, "application/json", len(body), headers, keep_alive) + body
+
+
+def _int_param(query, name, default, maximum=None):
+    value = query.get(name)
+    if value is None:
+        return default
+    if not value.isdigit() or int(value) < 1:
+        raise HTTPError(400, f"{name} must be a positive integer")
+    return min(int(value), maximum) if maximum else int(value)
+
+
+def filter_from_query(query):
+    """Build a ReportFilter from search query parameters"""
+    created_range = None
+    if query.get("preset"):
+        created_range = preset_range(query["preset"])
+    elif query.get("from") or query.get("to"):
+        created_range = date_range(query.get("from", "1970-01-01"), query.get("to", "9999-12-30"))
+    criteria = parse_id_selection(query["id"]) if query.get("id") else {}
+    return ReportFilter(
+        username=query.get("username") or None,
+        issue_type=parse_choice(query["issue_type"], ISSUE_TYPES, "issue type") if query.get("issue_type") else None,
+        status=parse_choice(query["status"], STATUSES, "status") if query.get("status") else None,
+        keywords=query.get("keywords") or None,
+        created_range=created_range,
+        **criteria
+    )
+
+
+class ReportService:
+    """The blocking operations behind each route, run on worker threads"""
+
+    def __init__(self, db, write_queue=None, attachment_store=None):
+        self.db = db
+        self.write_queue = write_queue
+        self.attachment_store = attachment_store
+        self.users = UserRepository(db)
+        self.reports = ReportRepository(db)
+        self.counters = CounterRepository(db)
+        self.attachments = AttachmentRepository(db)
+
+    def call(self, credentials, admin_only, operation, *args):
+        """Authenticate, check the role and run one operation, all on the same worker"""
+        user = self.users.authenticate(*credentials)
+        if not user:
+            raise HTTPError(401, "Invalid username or password", CHALLENGE)
+        if admin_only and user[2] != "admin":
+            raise HTTPError(403, "Admin access required")
+        return operation(user, *args)
+
+    def submit(self, user, document):
+        try:
+            issue_type = parse_choice(str(document["issue_type"]), ISSUE_TYPES, "issue type")
+            severity = parse_choice(str(document.get("severity", "Medium")), SEVERITIES, "severity")
+            description = str(document["description"]).strip()
+            location = str(document["location"]).strip()
+        except KeyError as err:
+            raise HTTPError(400, f"Missing field {err}") from None
+        if not description or not location:
+            raise HTTPError(400, "Description and location must not be empty")
+        if self.write_queue:
+            ticket = self.write_queue.submit(user[0], issue_type, severity, description, location)
+            return 202, {"ticket": ticket}
+        report_id = self.reports.create(user[0], issue_type, severity, description, location)
+        return 201, {"id": report_id, "duplicate_of": self.reports.duplicate_of(report_id)}
+
+    def ticket(self, user, ticket):
+        if not self.write_queue:
+            raise HTTPError(404, "Submissions are not queued on this server")
+        try:
+            owner_id, report_id, error = self.write_queue.lookup(ticket)
+        except KeyError:
+            raise HTTPError(404, "Ticket not found") from None
+        if owner_id != user[0] and user[2] != "admin":
+            raise HTTPError(404, "Ticket not found")
+        if error is not None:
+            return 200, {"ticket": ticket, "report_id": None, "status": "failed", "error": error}
+        return 200, {"ticket": ticket, "report_id": report_id, "status": "pending" if report_id is None else "stored"}
+
+    def my_reports(self, user, query):
+        position = {}
+        if query.get("after"):
+            position["after"] = decode_key(query["after"])
+        elif query.get("before"):
+            position["before"] = decode_key(query["before"])
+        page_size = _int_param(query, "page_size", DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        page = self.reports.page_for_user(user[0], page_size, **position)
+        return 200, {
+            "reports": records(page.rows, USER_REPORT_KEYS),
+            "next": encode_key(page.last_key) if page.has_next else None,
+            "previous": encode_key(page.first_key) if page.has_previous else None,
+        }
+
+    def detail(self, user, report_id):
+        viewer_id = None if user[2] == "admin" else user[0]
+        report = self.reports.get_detail(report_id, viewer_id)
+        if not report:
+            raise HTTPError(404, "Report not found")
+        return 200, dict(zip(REPORT_DETAIL_KEYS, report))
+
+    def search(self, user, query):
+        report_filter = filter_from_query(query)
+        limit = _int_param(query, "limit", DEFAULT_SEARCH_LIMIT, MAX_PAGE_SIZE)
+        if report_filter == ReportFilter(keywords=report_filter.keywords) and report_filter.keywords:
+            rows = self.reports.search_text(report_filter.keywords, limit)
+        else:
+            rows = self.reports.find_matching(report_filter, limit)
+        return 200, {"filter": report_filter.describe(), "reports": records(rows, REPORT_LIST_KEYS)}
+
+    def nearby(self, user, query):
+        try:
+            latitude, longitude = float(query["lat"]), float(query["lon"])
+            radius = float(query.get("radius", 500))
+        except KeyError as err:
+            raise HTTPError(400, f"Missing parameter {err}") from None
+        limit = _int_param(query, "limit", DEFAULT_NEARBY_LIMIT, MAX_PAGE_SIZE)
+        rows = self.reports.find_nearby(latitude, longitude, radius, limit)
+        return 200, {"reports": records(rows, NEARBY_KEYS)}
+
+    def update_status(self, user, report_id, document):
+        status = parse_choice(str(document.get("status", "")), STATUSES, "status")
+        if not self.reports.update_status(report_id, status):
+            raise HTTPError(404, "Report not found")
+        logging.info(f"Report {report_id} set to {status} by {user[1]} over HTTP")
+        return 200, {"id": report_id, "status": status}
+
+    def stats(self, user):
+        return 200, self.counters.snapshot()
+
+    def _visible_report(self, user, report_id):
+        viewer_id = None if user[2] == "admin" else user[0]
+        if not self.reports.get_detail(report_id, viewer_id):
+            raise HTTPError(404, "Report not found")
+
+    def attachment_target(self, user, report_id):
+        """Check that ``user`` may attach to the report before its upload is read"""
+        if self.attachment_store is None:
+            raise HTTPError(404, "Attachments are not enabled on this server")
+        self._visible_report(user, report_id)
+        return user
+
+    def store_attachment(self, user, report_id, upload, filename):
+        """Move a fully received upload into the store and record it"""
+        sha256, size, content_type = upload.commit()
+        attachment_id = self.attachments.add(report_id, user[0], sha256, filename, content_type, size,
+                                             place=upload.place)
+        return 201, {"id": attachment_id, "report_id": report_id, "sha256": sha256,
+                     "content_type": content_type, "size_bytes": size}
+
+    def list_attachments(self, user, report_id):
+        self._visible_report(user, report_id)
+        return 200, {"attachments": records(self.attachments.list_for_report(report_id), ATTACHMENT_KEYS)}
+
+    def attachment(self, user, attachment_id, thumbnail=False):
+        row = self.attachments.get(attachment_id) if self.attachment_store else None
+        if row is None:
+            raise HTTPError(404, "Attachment not found")
+        _, report_id, sha256, _, content_type, size = row
+        self._visible_report(user, report_id)
+        if not thumbnail:
+            return 200, FileResponse(sha256, "objects", content_type, size, sha256)
+        name = self.attachment_store.thumbnail(sha256)
+        if name is None:
+            raise HTTPError(404, "No thumbnail available")
+        size = os.path.getsize(self.attachment_store.path(name, "thumbs"))
+        return 200, FileResponse(name, "thumbs", "image/jpeg", size, name)
+
+
+class ReportServer:
+    """Routes HTTP requests to a ReportService under admission control"""
+
+    def __init__(self, db, workers, max_waiting, wait_timeout, max_connections, write_queue=None,
+                 attachment_store=None):
+        self.db = db
+        self.attachment_store = attachment_store
+        self.service = ReportService(db, write_queue, attachment_store)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-worker")
+        self.admission = Admission(workers, max_waiting, wait_timeout)
+        self.max_connections = max_connections
+        self.connections = 0
+        self.refused_connections = 0
+
+    async def run_blocking(self, function, *args):
+        """Run a repository call on a worker thread once admitted"""
+        async with self.admission:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(function, *args))
+
+    @staticmethod
+    def credentials(request):
+        """Return (username, password) from the Basic Authorization header"""
+        header = request.headers.get("authorization", "")
+        if not header.lower().startswith("basic "):
+            raise HTTPError(401, "Authentication required", CHALLENGE)
+        try:
+            username, _, password = base64.b64decode(header[6:]).decode().partition(":")
+        except ValueError:
+            raise HTTPError(401, "Malformed credentials", CHALLENGE) from None
+        return username, password
+
+    def route(self, request):
+        """Return (admin_only, operation, args) for a request, or raise 404/405"""
+        parts = request.path.strip("/").split("/")
+        service, method = self.service, request.method
+        if parts == ["reports"]:
+            if method == "POST":
+                return False, service.submit, (request.json(),)
+            if method == "GET":
+                return True, service.search, (request.query,)
+        elif parts == ["reports", "mine"]:
+            if method == "GET":
+                return False, service.my_reports, (request.query,)
+        elif parts == ["reports", "nearby"]:
+            if method == "GET":
+                return True, service.nearby, (request.query,)
+        elif len(parts) == 2 and parts[0] == "reports" and parts[1].isdigit():
+            if method == "GET":
+                return False, service.detail, (int(parts[1]),)
+        elif len(parts) == 3 and parts[0] == "reports" and parts[1].isdigit() and parts[2] == "status":
+            if method in ("PUT", "PATCH"):
+                return True, service.update_status, (int(parts[1]), request.json())
+        elif len(parts) == 3 and parts[0] == "reports" and parts[1].isdigit() and parts[2] == "attachments":
+            if method == "GET":
+                return False, service.list_attachments, (int(parts[1]),)
+        elif len(parts) in (2, 3) and parts[0] == "attachments" and parts[1].isdigit() \
+                and parts[2:] in ([], ["thumbnail"]):
+            if method == "GET":
+                return False, service.attachment, (int(parts[1]), len(parts) == 3)
+        elif len(parts) == 2 and parts[0] == "tickets":
+            if method == "GET":
+                return False, service.ticket, (parts[1],)
+        elif parts == ["stats"]:
+            if method == "GET":
+                return True, service.stats, ()
+        else:
+            raise HTTPError(404, "Not found")
+        raise HTTPError(405, f"{method} is not allowed on {request.path}")
+
+    async def dispatch(self, request, writer):
+        """Return (status, document) for one request"""
+        if request.path == "/metrics":
+            return 200, self.db.metrics.prometheus(self.db.pool.metrics.snapshot())
+        if request.path == "/health":
+            health = {"status": "ok", "pool": self.db.pool.metrics.snapshot(),
+                      "connections": self.connections, "refused_connections": self.refused_connections,
+                      "waiting": self.admission.waiting, "rejected": self.admission.rejected}
+            health["user_cache"] = self.db.user_cache.stats()
+            health["report_cache"] = self.db.report_cache.stats()
+            health["passwords"] = self.db.passwords.stats()
+            health["slow_queries"] = sum(row["slow"] for row in self.db.metrics.summary())
+            if self.service.write_queue:
+                health["write_queue"] = dict(self.service.write_queue.stats, pending=self.service.write_queue.pending)
+            return 200, health
+        credentials = self.credentials(request)
+        if request.reader is not None:
+            return await self.receive_upload(request, credentials, writer)
+        admin_only, operation, args = self.route(request)
+        return await self.run_blocking(self.service.call, credentials, admin_only, operation, *args)
+
+    async def receive_upload(self, request, credentials, writer):
+        """Stream a photo upload into the store, checking the sender before reading it"""
+        if not request.unread:
+            raise HTTPError(411, "A photo upload needs a Content-Length")
+        if self.attachment_store is not None and request.unread > self.attachment_store.max_bytes:
+            raise HTTPError(413, f"Photos may be at most {self.attachment_store.max_bytes} bytes")
+        report_id = int(request.path.strip("/").split("/")[1])
+        user = await self.run_blocking(
+            self.service.call, credentials, False, self.service.attachment_target, report_id
+        )
+        if request.headers.get("expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        # File writes run on the loop's default executor, leaving the
+        # database workers free; the fsync in commit runs on a worker
+        loop = asyncio.get_running_loop()
+        upload = await loop.run_in_executor(None, self.attachment_store.writer)
+        with upload:
+            while request.unread:
+                try:
+                    chunk = await asyncio.wait_for(
+                        request.reader.read(min(CHUNK_SIZE, request.unread)), KEEP_ALIVE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    raise HTTPError(400, "Upload stalled") from None
+                if not chunk:
+                    raise ConnectionResetError("Connection closed during upload")
+                request.unread -= len(chunk)
+                await loop.run_in_executor(None, upload.write, chunk)
+            return await self.run_blocking(
+                self.service.store_attachment, user, report_id, upload, request.query.get("filename", "photo")
+            )
+
+    async def respond(self, request, writer):
+        try:
+            status, document = await self.dispatch(request, writer)
+            if isinstance(document, FileResponse):
+                return self.file_response(request, status, document)
+            if isinstance(document, str):
+                body = document.encode()
+                return encode_head(status, PROMETHEUS_CONTENT_TYPE, len(body), keep_alive=request.keep_alive) + body
+            return encode_response(status, document, keep_alive=request.keep_alive)
+        except HTTPError as err:
+            return encode_response(err.status, {"error": str(err)}, err.headers, request.keep_alive)
+        except (ValueError, UsageError, FilterError, AttachmentError) as err:
+            return encode_response(400, {"error": str(err)}, keep_alive=request.keep_alive)
+        except HasherBusyError as err:
+            return encode_response(503, {"error": f"Too many logins in progress: {err}"}, {"Retry-After": "1"},
+                                   request.keep_alive)
+        except PoolTimeoutError as err:
+            return encode_response(503, {"error": f"Database busy: {err}"}, {"Retry-After": "1"}, request.keep_alive)
+        except StorageError as err:
+            logging.error(f"HTTP {request.method} {request.path} failed: {err}")
+            return encode_response(500, {"error": "Database error"}, keep_alive=request.keep_alive)
+        except ConnectionError:
+            # The client went away; handle_connection closes quietly
+            raise
+        except Exception:
+            logging.exception(f"HTTP {request.method} {request.path} failed")
+            return encode_response(500, {"error": "Internal server error"}, keep_alive=request.keep_alive)
+
+    @staticmethod
+    def file_response(request, status, response):
+        """Set the head of a photo response; the client's cached copy is reused when still current"""
+        headers = {"ETag": response.etag, "Cache-Control": f"private, max-age={ATTACHMENT_MAX_AGE}"}
+        if request.headers.get("if-none-match") == response.etag:
+            return encode_head(304, response.content_type, 0, headers, request.keep_alive)
+        response.head = encode_head(status, response.content_type, response.size, headers, request.keep_alive)
+        return response
+
+    async def send_file(self, writer, response):
+        """Write a stored file from its memory map, waiting for each chunk to leave before the next
+
+        With no write buffer allowed, the transport never holds a slice of
+        the map after ``drain`` returns, so the map can be closed at the end.
+        """
+        transport = writer.transport
+        low, high = transport.get_write_buffer_limits()
+        transport.set_write_buffer_limits(0)
+        chunks = self.attachment_store.chunks(response.name, kind=response.kind)
+        try:
+            writer.write(response.head)
+            for chunk in chunks:
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            chunk = None
+            chunks.close()
+            if not transport.is_closing():
+                transport.set_write_buffer_limits(high, low)
+
+    async def handle_connection(self, reader, writer):
+        if self.connections >= self.max_connections:
+            self.refused_connections += 1
+            writer.write(encode_response(503, {"error": "Too many connections"}, {"Retry-After": "1"}, False))
+            await self._close(writer)
+            return
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as err:
+                    writer.write(encode_response(err.status, {"error": str(err)}, err.headers, False))
+                    break
+                if request is None:
+                    break
+                response = await self.respond(request, writer)
+                if isinstance(response, FileResponse):
+                    await self.send_file(writer, response)
+                else:
+                    writer.write(response)
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            await self._close(writer)
+
+    @staticmethod
+    async def _close(writer):
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host, port, backlog=1024):
+        server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=backlog
+        )
+        addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        logging.info(f"HTTP server listening on {addresses}")
+        print(f"Serving on {addresses}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def main(argv=None):
+    """Command line entry point for the HTTP server"""
+    import index
+
+    parser = argparse.ArgumentParser(description="Serve the reporting system over HTTP/JSON")
+    parser.add_argument("--host", default=os.environ.get("INFRA_HTTP_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("INFRA_HTTP_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=index.POOL_SIZE,
+                        help="requests using the database at once (default: the pool size)")
+    parser.add_argument("--queue", type=int, default=1024, help="requests allowed to wait for a worker")
+    parser.add_argument("--queue-timeout", type=float, default=2.0,
+                        help="seconds a request may wait for a worker before a 503")
+    parser.add_argument("--max-connections", type=int, default=1024)
+    parser.add_argument("--write-queue", metavar="JOURNAL", default=index.WRITE_QUEUE_JOURNAL,
+                        help="accept submissions into this journal and insert them in batches (default: INFRA_WRITE_QUEUE)")
+    parser.add_argument("--max-batch", type=int, default=index.WRITE_QUEUE_MAX_BATCH,
+                        help=f"queued submissions per insert (default: {DEFAULT_MAX_BATCH})")
+    parser.add_argument("--max-delay", type=float, default=index.WRITE_QUEUE_MAX_DELAY,
+                        help=f"seconds a queued submission may wait for its batch (default: {DEFAULT_MAX_DELAY})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    index.start_slow_query_log()
+    db = index.get_db()
+    if db.backend.is_ephemeral:
+        index.setup_database()
+    write_queue = None
+    if args.write_queue:
+        write_queue = WriteQueue(db, args.write_queue, args.max_batch, args.max_delay).start()
+    server = ReportServer(db, args.workers, args.queue, args.queue_timeout, args.max_connections, write_queue,
+                          index.get_attachment_store())
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if write_queue:
+            write_queue.close()
+            logging.info(f"Write queue stats: {write_queue.stats}")
+        index.stop_metrics()
+        logging.info(f"Connection pool metrics: {db.pool.metrics.snapshot()}")
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Registry of the named, parameterised statements the repositories run
+
+Every statement with a fixed text is declared once with ``statement(name,
+sql)`` and run through ``Database.run``, so it has one name everywhere:
+in the query metrics, the slow query log and the usage counts kept here.
+Keyset pages are registered per shape (which filters, which direction) the
+first time each shape is used, so the set stays small and bounded.
+Searches whose text depends on the number of ids or keywords given are
+not registered; they run as ad hoc statements.
+
+On MySQL a registered statement is prepared on the server the first time
+a pooled connection runs it and executed from then on by sending only its
+parameters. PreparedCursors keeps those prepared cursors per connection,
+least recently used first out. SQLite caches compiled statements per
+connection by their text, so there registration only names the statement.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+# Prepared statements kept per pooled connection
+PREPARED_PER_CONNECTION = 64
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Statement(namedtuple("Statement", ["name", "sql"])):
+    """A named statement with %s placeholders"""
+
+
+def statement(name, sql):
+    """Register ``sql`` under ``name`` and return it as a Statement
+
+    Registering the same name and text again returns the existing
+    Statement; reusing a name for a different text is an error.
+    """
+    sql = " ".join(sql.split())
+    with _registry_lock:
+        existing = _registry.get(name)
+        if existing is None:
+            existing = _registry[name] = Statement(name, sql)
+        elif existing.sql != sql:
+            raise ValueError(f"Statement '{name}' is already registered with different SQL")
+    return existing
+
+
+def registered():
+    """Return every registered Statement, by name"""
+    with _registry_lock:
+        return [_registry[name] for name in sorted(_registry)]
+
+
+class StatementUsage:
+    """Thread-safe counts of how often each registered statement ran and was prepared"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+            self.prepares = {}
+
+    def used(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def prepared(self, name):
+        with self._lock:
+            self.prepares[name] = self.prepares.get(name, 0) + 1
+
+    def snapshot(self):
+        """Return (name, calls, prepares) for each registered statement, most used first"""
+        with self._lock:
+            calls, prepares = dict(self.calls), dict(self.prepares)
+        rows = [(item.name, calls.get(item.name, 0), prepares.get(item.name, 0)) for item in registered()]
+        return sorted(rows, key=lambda row: (-row[1], row[0]))
+
+
+class PreparedCursors:
+    """The prepared cursors of one connection, one per statement name
+
+    ``get`` returns (cursor, created); the least recently used cursor is
+    closed, releasing its server-side statement, once ``capacity`` are open.
+    Only the thread holding the connection uses it, so it needs no lock.
+    """
+
+    def __init__(self, capacity=PREPARED_PER_CONNECTION):
+        self.capacity = capacity
+        self._cursors = OrderedDict()
+
+    def get(self, name, open_cursor):
+        cursor = self._cursors.get(name)
+        if cursor is not None:
+            self._cursors.move_to_end(name)
+            return cursor, False
+        cursor = self._cursors[name] = open_cursor()
+        if len(self._cursors) > self.capacity:
+            _, evicted = self._cursors.popitem(last=False)
+            evicted.close()
+        return cursor, True
+
+    def __len__(self):
+        return len(self._cursors)
@@ -0,0 +1,1294 @@
+"""Storage backends and repositories for users and reports
+
+The application talks to ``UserRepository`` and ``ReportRepository``; they
+issue the same SQL against whichever ``StorageBackend`` the ``Database`` was
+built with. ``MySQLBackend`` is the production engine and ``SQLiteBackend``
+runs embedded (on disk or fully in memory) for local and benchmark runs.
+"""
+
+import os
+import time
+import uuid
+import weakref
+import sqlite3
+import logging
+import datetime
+import functools
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import geo
+import dedup
+import archive
+import text_index
+from cache import MISSING, LRUCache, UserCache, approximate_size
+from db_pool import ConnectionPool
+from passwords import DEFAULT_COST, PasswordHasher, is_hashed
+from query_metrics import DEFAULT_SLOW_QUERY_MS, InstrumentedCursor, QueryMetrics
+from statements import PREPARED_PER_CONNECTION, PreparedCursors, StatementUsage, statement
+
+try:
+    import mysql.connector # type: ignore
+except ImportError:  # only needed for the MySQL backend
+    mysql = None
+
+ROLES = ("user", "admin")
+ISSUE_TYPES = ("Road Damage", "Power Outage", "Water Issue", "Traffic Signal Problem", "Public Space Issue")
+SEVERITIES = ("Low", "Medium", "High", "Critical")
+STATUSES = ("Pending", "In Progress", "Resolved", "Rejected")
+
+# Longest location and description (in UTF-8 bytes) the reports columns hold
+MAX_LOCATION_LENGTH = 255
+MAX_DESCRIPTION_BYTES = 65535
+
+# Column list shared by every admin report listing and search
+REPORT_LIST_FIELDS = "r.id, u.username, r.issue_type, r.severity, r.description, r.location, r.status, r.created_at"
+REPORT_LIST_COLUMNS = f"""
+    SELECT {REPORT_LIST_FIELDS}
+    FROM reports r
+    JOIN users u ON r.user_id = u.id
+"""
+
+# The same listing over the closed reports moved out by archive.py
+ARCHIVE_LIST_COLUMNS = f"""
+    SELECT {REPORT_LIST_FIELDS}
+    FROM reports_archive r
+    JOIN users u ON r.user_id = u.id
+"""
+
+# Every report column plus the author, in export order
+REPORT_EXPORT_FIELDS = ("r.id", "r.user_id", "u.username", "r.issue_type", "r.severity", "r.description",
+                        "r.location", "r.status", "r.created_at", "r.updated_at")
+
+# Rows fetched per round trip when streaming a large result
+STREAM_BATCH_SIZE = 1000
+
+# Default number of ranked results returned by a keyword search
+DEFAULT_SEARCH_LIMIT = 50
+
+# Default number of rows per page in the paginated report views
+DEFAULT_PAGE_SIZE = 20
+
+# Rows per multi-row INSERT; keeps statements under MySQL's max_allowed_packet
+# and SQLite's bound-parameter limit
+ROWS_PER_INSERT = 500
+
+# Columns written by ReportRepository.create_many, in row tuple order
+REPORT_INSERT_COLUMNS = ("user_id", "issue_type", "severity", "description", "location", "status", "created_at", "updated_at")
+
+# Filled from the location text by geo.locate on every insert
+GEO_COLUMNS = ("latitude", "longitude", "geohash")
+
+# Largest radius and result count a nearby query accepts
+MAX_NEARBY_RADIUS_M = 100000
+DEFAULT_NEARBY_LIMIT = 100
+
+
+class StorageError(Exception):
+    """Raised when the underlying database driver reports an error"""
+
+
+class UsernameTakenError(StorageError):
+    """Raised when a new user's name is already registered"""
+
+
+class Page(namedtuple("Page", ["rows", "has_next", "has_previous", "first_key", "last_key"])):
+    """One keyset page of rows, newest first
+
+    ``first_key`` and ``last_key`` are the (created_at, id) of the first and
+    last row; pass them back as ``before`` or ``after`` to move one page.
+    """
+
+
+def _parse_timestamp(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("TIMESTAMP", _parse_timestamp)
+
+
+class StorageBackend:
+    """Engine-specific connection, DDL and SQL dialect handling"""
+
+    name = None
+    errors = ()
+    is_ephemeral = False
+    # Engines without a native full-text index get the text_index postings instead
+    native_fulltext = False
+    # Appended to a SELECT that reads a row the same transaction will update
+    lock_rows = ""
+
+    def connect(self):
+        """Open a new driver connection to the application database"""
+        raise NotImplementedError
+
+    def cursor(self, conn, stream=False):
+        """Open a cursor; with ``stream`` rows are read as they are fetched, not buffered"""
+        return conn.cursor()
+
+    def ensure_database(self):
+        """Create the application database if the engine needs it to exist first"""
+
+    def is_duplicate_object_error(self, err):
+        """Return True if a DDL error means the object already exists"""
+        return False
+
+    def is_duplicate_key_error(self, err):
+        """Return True if an INSERT failed on a unique key"""
+        return False
+
+    def adapt(self, sql):
+        """Translate the repositories' %s placeholders into the driver's paramstyle"""
+        return sql
+
+    def prepared_cursors(self, conn):
+        """Return the PreparedCursors of a pooled connection, or None if the engine
+        caches parsed statements by itself"""
+        return None
+
+    def prepare_cursor(self, conn):
+        """Open a cursor that prepares its statement on the server"""
+        raise NotImplementedError
+
+    def increment_sql(self, table, keys, column):
+        """Return an upsert that adds to ``column`` of the row identified by ``keys``"""
+        raise NotImplementedError
+
+    def explain(self, cursor, sql, params=()):
+        """Return the engine's query plan as a list of dicts"""
+        raise NotImplementedError
+
+    def plan_problems(self, plan, bounded=False):
+        """Return descriptions of full table scans and unindexed sorts in a plan
+
+        A ``bounded`` (LIMITed) query may walk a whole index in order because
+        it stops after the first rows; an unbounded one may not.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _plan_rows(cursor):
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class MySQLBackend(StorageBackend):
+    """MySQL server accessed through mysql.connector"""
+
+    name = "mysql"
+    native_fulltext = True
+    lock_rows = " FOR UPDATE"
+
+    def __init__(self, config):
+        if mysql is None:
+            raise StorageError("mysql-connector-python is required for the MySQL backend")
+        self.config = dict(config)
+        self.errors = (mysql.connector.Error,)
+        # Prepared cursors live and die with their driver connection
+        self._prepared = weakref.WeakKeyDictionary()
+        self._prepared_lock = threading.Lock()
+
+    def connect(self):
+        return mysql.connector.connect(**self.config)
+
+    def cursor(self, conn, stream=False):
+        # An unbuffered cursor pulls rows off the socket as fetchmany asks for them
+        return conn.cursor(buffered=False) if stream else conn.cursor()
+
+    def prepared_cursors(self, conn):
+        with self._prepared_lock:
+            cursors = self._prepared.get(conn.raw)
+            if cursors is None:
+                cursors = self._prepared[conn.raw] = PreparedCursors(PREPARED_PER_CONNECTION)
+            return cursors
+
+    def prepare_cursor(self, conn):
+        return conn.raw.cursor(prepared=True)
+
+    def ensure_database(self):
+        server_config = {key: value for key, value in self.config.items() if key != "database"}
+        conn = mysql.connector.connect(**server_config)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.config['database']}")
+            cursor.close()
+        finally:
+            conn.close()
+
+    def is_duplicate_object_error(self, err):
+        # ER_TABLE_EXISTS_ERROR, ER_DUP_FIELDNAME, ER_DUP_KEYNAME
+        return getattr(err, "errno", None) in (1050, 1060, 1061)
+
+    def is_duplicate_key_error(self, err):
+        # ER_DUP_ENTRY
+        return getattr(err, "errno", None) == 1062
+
+    def increment_sql(self, table, keys, column):
+        placeholders = ", ".join(["%s"] * (len(keys) + 1))
+        return (f"INSERT INTO {table} ({', '.join(keys)}, {column}) VALUES ({placeholders}) "
+                f"ON DUPLICATE KEY UPDATE {column} = {column} + VALUES({column})")
+
+    def explain(self, cursor, sql, params=()):
+        cursor.execute("EXPLAIN " + sql, params)
+        return self._plan_rows(cursor)
+
+    def plan_problems(self, plan, bounded=False):
+        problems = []
+        for step in plan:
+            extra = step.get("Extra") or ""
+            if step.get("type") == "ALL" or (step.get("type") == "index" and not bounded):
+                problems.append(f"full scan of {step['table']}")
+            if "Using filesort" in extra:
+                problems.append(f"filesort on {step['table']}")
+        return problems
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded SQLite database, on disk or shared in memory"""
+
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path=":memory:"):
+        self.is_ephemeral = path == ":memory:"
+        # Every pooled connection must see the same in-memory database, and no
+        # other backend may: id() is reused once an object is collected
+        self.path = f"file:infra_{uuid.uuid4().hex}?mode=memory&cache=shared" if self.is_ephemeral else path
+        self._keeper = self.connect() if self.is_ephemeral else None
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            uri=self.path.startswith("file:"),
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            # Compiled statements are reused by text; room for the registered ones and more
+            cached_statements=4 * PREPARED_PER_CONNECTION
+        )
+        conn.execute("PRAGMA foreign_keys = ON")
+        if not self.is_ephemeral:
+            conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def is_duplicate_object_error(self, err):
+        # ALTER TABLE ... ADD COLUMN has no IF NOT EXISTS form
+        return "duplicate column name" in str(err) or "already exists" in str(err)
+
+    def is_duplicate_key_error(self, err):
+        return isinstance(err, sqlite3.IntegrityError) and "UNIQUE constraint failed" in str(err)
+
+    def adapt(self, sql):
+        return sql.replace("%s", "?")
+
+    def increment_sql(self, table, keys, column):
+        placeholders = ", ".join(["%s"] * (len(keys) + 1))
+        return (f"INSERT INTO {table} ({', '.join(keys)}, {column}) VALUES ({placeholders}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {column} = {column} + excluded.{column}")
+
+    def explain(self, cursor, sql, params=()):
+        cursor.execute("EXPLAIN QUERY PLAN " + self.adapt(sql), params)
+        return self._plan_rows(cursor)
+
+    def plan_problems(self, plan, bounded=False):
+        # "SCAN t USING INDEX" walks an index in order; a bare "SCAN t" or a
+        # temp B-tree sort reads everything. Scans and sorts over a derived
+        # table only touch the rows its own LIMIT let through.
+        derived = {step["detail"].split()[-1] for step in plan
+                   if step["detail"].split()[0] in ("CO-ROUTINE", "MATERIALIZE")}
+        problems = []
+        for step in plan:
+            words = step["detail"].split()
+            if words[0] == "SCAN" and words[1] not in derived and ("USING" not in words or not bounded):
+                problems.append(f"full scan of {words[1]}")
+            elif words[:2] == ["USE", "TEMP"] and not (derived and bounded):
+                problems.append(step["detail"].lower())
+        return problems
+
+
+def backend_from_env(mysql_config):
+    """Build the backend selected by INFRA_DB_BACKEND (mysql or sqlite)"""
+    engine = os.environ.get("INFRA_DB_BACKEND", "mysql").lower()
+    if engine == "sqlite":
+        return SQLiteBackend(os.environ.get("INFRA_SQLITE_PATH", ":memory:"))
+    if engine == "mysql":
+        return MySQLBackend(mysql_config)
+    raise StorageError(f"Unknown storage backend: {engine}")
+
+
+class Database:
+    """A storage backend plus the connection pool that serves it"""
+
+    def __init__(self, backend, pool_size=5, pool_timeout=5.0, check_after=30.0,
+                 user_cache_size=1024, user_cache_ttl=300.0, user_role_ttl=5.0, report_cache_size=1024,
+                 password_cost=DEFAULT_COST, hash_workers=1, slow_query_ms=DEFAULT_SLOW_QUERY_MS):
+        self.backend = backend
+        self.pool = ConnectionPool(backend.connect, size=pool_size, timeout=pool_timeout, check_after=check_after)
+        # Timings of every statement run through this database's cursors
+        self.metrics = QueryMetrics(slow_query_ms)
+        # How often each registered statement ran and was prepared
+        self.statements = StatementUsage()
+        # Shared by every repository on this database
+        self.user_cache = UserCache(user_cache_size, user_cache_ttl, user_role_ttl)
+        self.report_cache = LRUCache(report_cache_size, sizeof=approximate_size)
+        self.passwords = PasswordHasher(password_cost, hash_workers, verified_cache_ttl=user_cache_ttl)
+
+    @contextmanager
+    def cursor(self, commit=False, stream=False):
+        """Yield a cursor on a pooled connection, committing on success if asked
+
+        A ``stream`` cursor leaves the result on the server until fetched. If
+        the caller stops early its connection is dropped rather than drained.
+        Every statement run on the cursor is recorded in ``metrics``.
+        """
+        started = time.perf_counter()
+        try:
+            conn = self.pool.acquire()
+        except self.backend.errors as err:
+            raise StorageError(str(err)) from err
+        self.metrics.record_acquire((time.perf_counter() - started) * 1000)
+        prepared = None if stream else self.backend.prepared_cursors(conn)
+        cursor = InstrumentedCursor(self.backend.cursor(conn, stream), self.metrics,
+                                    None if prepared is None else functools.partial(self._prepared_cursor, conn, prepared))
+        finished = False
+        try:
+            yield cursor
+            if commit:
+                conn.commit()
+            finished = True
+        except self.backend.errors as err:
+            raise StorageError(str(err)) from err
+        finally:
+            if stream and not finished:
+                cursor.finish()
+                conn.discard()
+            else:
+                cursor.close()
+                conn.close()
+
+    def _prepared_cursor(self, conn, prepared, name):
+        cursor, created = prepared.get(name, lambda: self.backend.prepare_cursor(conn))
+        if created:
+            self.statements.prepared(name)
+        return cursor
+
+    def execute(self, cursor, sql, params=()):
+        """Run one ad hoc repository statement in the backend's dialect"""
+        cursor.execute(self.backend.adapt(sql), params)
+
+    def run(self, cursor, statement, params=()):
+        """Run a registered statement, prepared once per pooled connection where the engine supports it"""
+        self.statements.used(statement.name)
+        cursor.execute(self.backend.adapt(statement.sql), params, statement.name)
+
+    def explain(self, sql, params=()):
+        """Return the backend's query plan for a repository statement"""
+        with self.cursor() as cursor:
+            return self.backend.explain(cursor, sql, params)
+
+    def close(self):
+        self.passwords.close()
+        self.pool.close()
+
+
+def _cache_key(report_id):
+    """Report cache key for an id given as an int or a string of digits"""
+    try:
+        return int(report_id)
+    except (TypeError, ValueError):
+        return report_id
+
+
+def _fetch_batches(cursor, batch_size):
+    """Yield the rows of an executed cursor, fetching ``batch_size`` per round trip"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+class CounterRepository:
+    """Incrementally maintained report and user totals behind the statistics screen
+
+    Writers call ``apply`` inside their own transaction so a counter can
+    never disagree with a committed row; ``reconcile`` rebuilds everything
+    from the base tables.
+    """
+
+    DIMENSIONS = ("status", "issue_type", "severity")
+
+    ALL = statement("counters.all", "SELECT dimension, category, total FROM report_counters")
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def report_deltas(status, issue_type, severity, delta=1):
+        """Counter changes for adding (or with delta=-1 removing) one report"""
+        return [
+            (("status", status), delta),
+            (("issue_type", issue_type), delta),
+            (("severity", severity), delta),
+            (("total", "reports"), delta),
+        ]
+
+    def apply(self, cursor, deltas):
+        """Add each ((dimension, category), delta) inside the caller's transaction"""
+        merged = {}
+        for key, delta in deltas:
+            merged[key] = merged.get(key, 0) + delta
+        rows = [(dimension, category, delta) for (dimension, category), delta in merged.items() if delta]
+        if rows:
+            sql = self.db.backend.increment_sql("report_counters", ("dimension", "category"), "total")
+            cursor.executemany(self.db.backend.adapt(sql), rows)
+
+    def snapshot(self):
+        """Return {dimension: {category: total}} without touching the base tables"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.ALL)
+            rows = cursor.fetchall()
+        counters = {}
+        for dimension, category, total in rows:
+            counters.setdefault(dimension, {})[category] = total
+        return counters
+
+    def aggregate_statements(self, archived=True):
+        """Return (dimension, sql) for each independent aggregate over the base tables
+
+        Archived reports are counted with the rest unless ``archived`` is
+        False (for databases that have no archive table yet).
+        """
+        reports = "(SELECT {0} FROM reports UNION ALL SELECT {0} FROM reports_archive) r" if archived else "reports"
+        statements = [(dimension, f"SELECT {dimension}, COUNT(*) FROM {reports.format(dimension)} GROUP BY {dimension}")
+                      for dimension in self.DIMENSIONS]
+        statements.append(("total", f"SELECT 'reports', COUNT(*) FROM {reports.format('id')}"))
+        statements.append(("total", "SELECT 'users', COUNT(*) FROM users"))
+        return statements
+
+    def aggregate(self, sql):
+        """Run one aggregate statement on its own connection and return {category: count}"""
+        with self.db.cursor() as cursor:
+            self.db.execute(cursor, sql)
+            return dict(cursor.fetchall())
+
+    def actual(self, cursor, archived=True):
+        """Count every dimension from the base tables within the caller's transaction"""
+        counts = {}
+        for dimension, sql in self.aggregate_statements(archived):
+            self.db.execute(cursor, sql)
+            counts.setdefault(dimension, {}).update(cursor.fetchall())
+        return counts
+
+    def reconcile(self, fix=True, archived=True, warn=True):
+        """Compare counters with the base tables and return drift as
+        (dimension, category, counter, actual) tuples, rewriting the counters if ``fix``
+
+        Drift is logged as a warning unless ``warn`` is false, as when the
+        counters are first seeded.
+        """
+        with self.db.cursor(commit=fix) as cursor:
+            actual = self.actual(cursor, archived)
+            self.db.run(cursor, self.ALL)
+            stored = {(dimension, category): total for dimension, category, total in cursor.fetchall()}
+
+            drift = []
+            expected = {(dimension, category): total
+                        for dimension, totals in actual.items() for category, total in totals.items()}
+            for key in sorted(set(stored) | set(expected)):
+                if stored.get(key, 0) != expected.get(key, 0):
+                    drift.append(key + (stored.get(key, 0), expected.get(key, 0)))
+
+            if fix and drift:
+                self.db.execute(cursor, "DELETE FROM report_counters")
+                cursor.executemany(
+                    self.db.backend.adapt("INSERT INTO report_counters (dimension, category, total) VALUES (%s, %s, %s)"),
+                    [key + (total,) for key, total in expected.items()]
+                )
+        if drift and warn:
+            logging.warning(f"Statistics counters drifted from base tables: {drift}")
+        return drift
+
+
+class UserRepository:
+    """Queries and updates against the users table
+
+    Ids, usernames and roles are served from the database's UserCache where
+    possible; every method that changes a user invalidates its entry.
+    """
+
+    AUTHENTICATE = statement("users.authenticate", "SELECT id, username, role, password FROM users WHERE username = %s")
+    REHASH = statement("users.rehash", "UPDATE users SET password = %s WHERE id = %s AND password = %s")
+    LOAD = {
+        "id": statement("users.by_id", "SELECT id, username, role FROM users WHERE id = %s"),
+        "username": statement("users.by_username", "SELECT id, username, role FROM users WHERE username = %s"),
+    }
+    INSERT = statement("users.insert", "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)")
+    SET_PASSWORD = statement("users.set_password", "UPDATE users SET password = %s WHERE username = %s")
+    SET_ROLE = statement("users.set_role", "UPDATE users SET role = %s WHERE username = %s")
+    ALL = statement("users.all", "SELECT id, username, role, created_at FROM users ORDER BY created_at")
+    PAGE = statement("users.page", "SELECT id, username, role, created_at FROM users WHERE id > %s ORDER BY id LIMIT %s")
+
+    def __init__(self, db):
+        self.db = db
+        self.cache = db.user_cache
+        self.passwords = db.passwords
+
+    def exists(self, username):
+        return self.find_id(username) is not None
+
+    def authenticate(self, username, password):
+        """Return (id, username, role) for valid credentials, otherwise None
+
+        The hash is checked on the database's PasswordHasher, outside any
+        pooled connection. A plaintext row or a hash made at another cost is
+        replaced by a fresh hash, unless the password changed meanwhile.
+        """
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.AUTHENTICATE, (username,))
+            row = cursor.fetchone()
+        stored = row[3] if row else None
+        if not self.passwords.verify(password, stored):
+            return None
+        user = tuple(row[:3])
+        if self.passwords.needs_rehash(stored):
+            rehashed = self.passwords.hash(password)
+            with self.db.cursor(commit=True) as cursor:
+                self.db.run(cursor, self.REHASH, (rehashed, user[0], stored))
+            self.passwords.remember(password, rehashed)
+        self.cache.remember(*user)
+        return user
+
+    def hash_plaintext_passwords(self):
+        """Replace every password still stored in plaintext with a hash and return how many
+
+        Each row is updated only if its password is unchanged meanwhile.
+        """
+        with self.db.cursor() as cursor:
+            self.db.execute(cursor, "SELECT id, password FROM users ORDER BY id")
+            legacy = [(user_id, stored) for user_id, stored in cursor.fetchall() if not is_hashed(stored)]
+        for user_id, stored in legacy:
+            hashed = self.passwords.hash(stored)
+            with self.db.cursor(commit=True) as cursor:
+                self.db.run(cursor, self.REHASH, (hashed, user_id, stored))
+        return len(legacy)
+
+    def find_id(self, username):
+        user_id = self.cache.id_for(username)
+        if user_id is MISSING:
+            user_id = self._load("username", username)[0]
+        return user_id
+
+    def get_user(self, user_id):
+        """Return (username, role) of a user id, or None"""
+        user = self.cache.user(user_id)
+        if user is MISSING:
+            _, username, role = self._load("id", user_id)
+            user = (username, role) if username is not None else None
+        return user
+
+    def get_role(self, user_id):
+        """Return a user's role for a permission check, or None
+
+        Served from the cache's short-lived role entries, so a role changed
+        by another process applies within the role TTL.
+        """
+        role = self.cache.role(user_id)
+        if role is MISSING:
+            role = self._load("id", user_id)[2]
+        return role
+
+    def _load(self, column, value):
+        """Read (id, username, role) by id or username and cache it; all None if absent"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.LOAD[column], (value,))
+            row = cursor.fetchone()
+        if row is None:
+            return None, None, None
+        self.cache.remember(*row)
+        return row
+
+    def create(self, username, password, role="user"):
+        """Insert a user and return the new id
+
+        Raises UsernameTakenError if the name is already registered, so
+        callers need not check first. Only a hash of the password is stored.
+        """
+        hashed = self.passwords.hash(password)
+        try:
+            with self.db.cursor(commit=True) as cursor:
+                self.db.run(cursor, self.INSERT, (username, hashed, role))
+                user_id = cursor.lastrowid
+                CounterRepository(self.db).apply(cursor, [(("total", "users"), 1)])
+        except StorageError as err:
+            if self.db.backend.is_duplicate_key_error(err.__cause__):
+                raise UsernameTakenError(f"Username '{username}' already exists") from err.__cause__
+            raise
+        self.cache.remember(user_id, username, role)
+        return user_id
+
+    def find_ids(self, usernames):
+        """Return {username: id} for the given usernames that exist"""
+        usernames = list(usernames)
+        found = {}
+        with self.db.cursor() as cursor:
+            for start in range(0, len(usernames), ROWS_PER_INSERT):
+                chunk = usernames[start:start + ROWS_PER_INSERT]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                self.db.execute(cursor, f"SELECT username, id FROM users WHERE username IN ({placeholders})", chunk)
+                found.update(cursor.fetchall())
+        return found
+
+    def set_password(self, username, password):
+        hashed = self.passwords.hash(password)
+        with self.db.cursor(commit=True) as cursor:
+            self.db.run(cursor, self.SET_PASSWORD, (hashed, username))
+            changed = cursor.rowcount > 0
+        self.cache.forget(username)
+        return changed
+
+    def set_role(self, username, role):
+        """Change a user's role; returns False for an unknown username"""
+        if role not in ROLES:
+            raise ValueError(f"Unknown role '{role}'")
+        with self.db.cursor(commit=True) as cursor:
+            self.db.run(cursor, self.SET_ROLE, (role, username))
+            changed = cursor.rowcount > 0
+        self.cache.forget(username)
+        return changed
+
+    def list_all(self):
+        """Return (id, username, role, created_at) for every user"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.ALL)
+            return cursor.fetchall()
+
+    def stream_all(self, batch_size=STREAM_BATCH_SIZE):
+        """Yield the rows of list_all, oldest account first, one page of ``batch_size`` at a time
+
+        Ids follow creation order. Each page's connection goes back to the
+        pool before its rows are yielded, so a paused screen holds none.
+        """
+        last_id = 0
+        while True:
+            with self.db.cursor() as cursor:
+                self.db.run(cursor, self.PAGE, (last_id, batch_size))
+                rows = cursor.fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1][0]
+
+
+class ReportRepository:
+    """Queries and updates against the reports table"""
+
+    INSERT = statement(
+        "reports.insert",
+        "INSERT INTO reports (user_id, issue_type, severity, description, location, latitude, longitude, geohash)"
+        " VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+    )
+    MAX_ID = statement("reports.max_id", "SELECT COALESCE(MAX(id), 0) FROM reports")
+    VERSION = statement("reports.version", "SELECT status, updated_at FROM reports WHERE id = %s")
+    DETAIL = statement("reports.detail", """
+        SELECT r.user_id, r.id, r.issue_type, r.severity, r.description, r.location, r.status,
+               r.created_at, r.updated_at, u.username, r.duplicate_of
+        FROM reports r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.id = %s
+    """)
+    ARCHIVED_VERSION = statement("reports_archive.version", "SELECT status, updated_at FROM reports_archive WHERE id = %s")
+    ARCHIVED_DETAIL = statement("reports_archive.detail", """
+        SELECT r.user_id, r.id, r.issue_type, r.severity, r.description, r.location, r.status,
+               r.created_at, r.updated_at, u.username, r.duplicate_of
+        FROM reports_archive r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.id = %s
+    """)
+    DUPLICATE_OF = statement("reports.duplicate_of", "SELECT duplicate_of FROM reports WHERE id = %s")
+    DUPLICATES_OF = statement("reports.duplicates_of", "SELECT id FROM reports WHERE duplicate_of = %s ORDER BY id")
+    SUMMARY = statement("reports.summary", "SELECT id, issue_type, status FROM reports WHERE id = %s")
+    SET_STATUS = statement("reports.set_status", "UPDATE reports SET status = %s WHERE id = %s AND status = %s")
+    COUNT_FOR_USER = statement("reports.count_for_user", """
+        SELECT status, COUNT(*)
+        FROM (SELECT status FROM reports WHERE user_id = %s
+              UNION ALL SELECT status FROM reports_archive WHERE user_id = %s) r
+        GROUP BY status
+    """)
+    BY_ID = statement("reports.by_id", REPORT_LIST_COLUMNS + " WHERE r.id = %s")
+    ARCHIVED_BY_ID = statement("reports_archive.by_id", ARCHIVE_LIST_COLUMNS + " WHERE r.id = %s")
+
+    def __init__(self, db):
+        self.db = db
+
+    def create(self, user_id, issue_type, severity, description, location):
+        """Insert a report and return the new id"""
+        with self.db.cursor(commit=True) as cursor:
+            self.db.run(cursor, self.INSERT, (user_id, issue_type, severity, description, location) + geo.locate(location))
+            report_id = cursor.lastrowid
+            if not self.db.backend.native_fulltext:
+                text_index.add_document(self.db, cursor, report_id, description, location)
+            CounterRepository(self.db).apply(cursor, CounterRepository.report_deltas("Pending", issue_type, severity))
+            latitude, longitude, _ = geo.locate(location)
+            dedup.link_or_index(self.db, cursor, [(report_id, issue_type, description, location, latitude, longitude)])
+            return report_id
+
+    def create_many(self, rows):
+        """Insert complete report rows in one transaction using multi-row statements
+
+        Each row is a tuple in REPORT_INSERT_COLUMNS order. The keyword index,
+        statistics counters and duplicate links are updated in the same
+        transaction.
+        """
+        with self.db.cursor(commit=True) as cursor:
+            self._insert_rows(cursor, REPORT_INSERT_COLUMNS, rows)
+        return len(rows)
+
+    def create_ticketed(self, tickets, rows):
+        """Insert rows tagged with submission tickets and return {ticket: report_id}
+
+        Rows whose ticket is already stored are skipped, so replaying a batch
+        that was committed before a crash inserts nothing twice.
+        """
+        with self.db.cursor(commit=True) as cursor:
+            stored = self._ids_for_tickets(cursor, tickets)
+            fresh = [(ticket,) + tuple(row) for ticket, row in zip(tickets, rows) if ticket not in stored]
+            if fresh:
+                self._insert_rows(cursor, ("ticket",) + REPORT_INSERT_COLUMNS, fresh)
+                stored.update(self._ids_for_tickets(cursor, [row[0] for row in fresh]))
+        return stored
+
+    def _ids_for_tickets(self, cursor, tickets):
+        found = {}
+        for start in range(0, len(tickets), ROWS_PER_INSERT):
+            chunk = tickets[start:start + ROWS_PER_INSERT]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            self.db.execute(cursor, f"SELECT ticket, id FROM reports WHERE ticket IN ({placeholders})", chunk)
+            found.update(cursor.fetchall())
+        return found
+
+    def _insert_rows(self, cursor, columns, rows):
+        """Multi-row INSERT of ``rows`` plus their index postings, counter deltas and duplicate links
+
+        ``columns`` must end with REPORT_INSERT_COLUMNS; the GEO_COLUMNS are
+        added from each row's location.
+        """
+        # MySQL gives no per-row ids for a multi-row INSERT, so the new open
+        # reports are found again by id once they are in
+        self.db.run(cursor, self.MAX_ID)
+        last_id = cursor.fetchone()[0]
+        offset = len(columns) - len(REPORT_INSERT_COLUMNS)
+        columns = tuple(columns) + GEO_COLUMNS
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        for start in range(0, len(rows), ROWS_PER_INSERT):
+            chunk = rows[start:start + ROWS_PER_INSERT]
+            self.db.execute(
+                cursor,
+                f"INSERT INTO reports ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * len(chunk)),
+                [value for row in chunk for value in tuple(row) + geo.locate(row[offset + 4])]
+            )
+            if not self.db.backend.native_fulltext:
+                # SQLite holds the write lock for the whole statement, so
+                # its AUTOINCREMENT ids are consecutive up to lastrowid
+                first_id = cursor.lastrowid - len(chunk) + 1
+                for position, row in enumerate(chunk):
+                    text_index.add_document(self.db, cursor, first_id + position, row[offset + 3], row[offset + 4])
+        deltas = []
+        for row in rows:
+            deltas += CounterRepository.report_deltas(row[offset + 5], row[offset + 1], row[offset + 2])
+        CounterRepository(self.db).apply(cursor, deltas)
+        dedup.process_new(self.db, cursor, last_id)
+
+    def page_for_user(self, user_id, page_size=DEFAULT_PAGE_SIZE, after=None, before=None):
+        """Return one keyset page of a user's reports, archived ones included, newest first"""
+        sql = "SELECT id, issue_type, severity, description, location, status, created_at FROM {}"
+        return self._fetch_page("reports.page_for_user", sql.format("reports"), "", ["user_id = %s"], [user_id], 6,
+                                page_size, after, before, archive_sql=sql.format("reports_archive"))
+
+    def get_detail(self, report_id, viewer_id=None):
+        """Return a fully resolved report, or None if missing or not visible
+
+        ``viewer_id`` of None means an admin view with no ownership check.
+        Reports not in the hot table are looked up in the archive.
+        Resolved reports are kept in the database's report cache. A cached
+        entry is only served after a primary-key read confirms its status and
+        updated_at, so a change made by any process is never hidden.
+        """
+        try:
+            report_id = int(report_id)
+        except (TypeError, ValueError):
+            return None
+        cache = self.db.report_cache
+        with self.db.cursor() as cursor:
+            entry = cache.get(report_id)
+            if entry is not MISSING:
+                self.db.run(cursor, self.ARCHIVED_VERSION if entry[2] else self.VERSION, (report_id,))
+                current = cursor.fetchone()
+                if current is None or tuple(current) != (entry[1][5], entry[1][7]):
+                    cache.reject(report_id)
+                    entry = MISSING
+            if entry is MISSING:
+                self.db.run(cursor, self.DETAIL, (report_id,))
+                row = cursor.fetchone()
+                archived = row is None
+                if archived:
+                    self.db.run(cursor, self.ARCHIVED_DETAIL, (report_id,))
+                    row = cursor.fetchone()
+                    if row is None:
+                        return None
+                entry = (row[0], tuple(row[1:]), archived)
+                cache.put(report_id, entry)
+        owner_id, report, _ = entry
+        if viewer_id is not None and owner_id != viewer_id \
+                and UserRepository(self.db).get_role(viewer_id) != "admin":
+            return None
+        return report
+
+    def duplicate_of(self, report_id):
+        """Return the id of the report ``report_id`` was linked to as a duplicate, or None"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.DUPLICATE_OF, (report_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def duplicates_of(self, report_id):
+        """Return the ids of the reports linked to ``report_id`` as its duplicates"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.DUPLICATES_OF, (report_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_summary(self, report_id):
+        """Return (id, issue_type, status) for one report"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.SUMMARY, (report_id,))
+            return cursor.fetchone()
+
+    def update_status(self, report_id, status, attempts=3):
+        """Change a report's status and move its status counter in the same transaction"""
+        try:
+            return self._update_status(report_id, status, attempts)
+        finally:
+            self.db.report_cache.invalidate(_cache_key(report_id))
+
+    def _update_status(self, report_id, status, attempts):
+        # The row lock clause differs by engine, so this is registered on first use
+        locked_status = statement("reports.status_for_update",
+                                  "SELECT status FROM reports WHERE id = %s" + self.db.backend.lock_rows)
+        with self.db.cursor(commit=True) as cursor:
+            for _ in range(attempts):
+                self.db.run(cursor, locked_status, (report_id,))
+                row = cursor.fetchone()
+                if not row:
+                    # An archived report is moved back before its status changes
+                    self.db.run(cursor, self.ARCHIVED_VERSION, (report_id,))
+                    archived = cursor.fetchone()
+                    if archived is None:
+                        return False
+                    if archived[0] == status:
+                        return True
+                    archive.restore(self.db, cursor, [report_id])
+                    self.db.run(cursor, locked_status, (report_id,))
+                    row = cursor.fetchone()
+                if row[0] == status:
+                    return True
+                # Only succeeds if nobody changed the status since we read it
+                self.db.run(cursor, self.SET_STATUS, (status, report_id, row[0]))
+                if cursor.rowcount:
+                    CounterRepository(self.db).apply(cursor, [(("status", row[0]), -1), (("status", status), 1)])
+                    dedup.status_changed(self.db, cursor, [report_id], row[0], status)
+                    return True
+            raise StorageError(f"Report {report_id} kept changing while updating its status")
+
+    def page_reports(self, status=None, page_size=DEFAULT_PAGE_SIZE, after=None, before=None):
+        """Return one keyset page of all reports joined to their author, newest first"""
+        conditions, params = [], []
+        if status:
+            conditions.append("r.status = %s")
+            params.append(status)
+        name = "reports.page_by_status" if status else "reports.page_all"
+        return self._fetch_page(name, REPORT_LIST_COLUMNS, "r.", conditions, params, 7, page_size, after, before)
+
+    def _fetch_page(self, name, select_sql, prefix, conditions, params, created_index, page_size, after, before,
+                    archive_sql=None):
+        """Run a bounded keyset query ordered by (created_at, id) descending
+
+        With ``after`` the page continues below that key; with ``before`` it
+        is the page directly above it, fetched ascending and then reversed.
+        One extra row is read to learn whether another page exists. The
+        statement is registered as ``name``, with ``.after`` or ``.before``
+        appended for the pages past the first. With ``archive_sql`` the same
+        page is read from the archive too and the two are merged.
+        """
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1")
+        created, ident = f"{prefix}created_at", f"{prefix}id"
+        conditions, params = list(conditions), list(params)
+        if after is not None:
+            # Expanded form of (created_at, id) < key so the index range is usable
+            conditions.append(f"{created} <= %s AND ({created} < %s OR {ident} < %s)")
+            params += [after[0], after[0], after[1]]
+            order = "DESC"
+        elif before is not None:
+            conditions.append(f"{created} >= %s AND ({created} > %s OR {ident} > %s)")
+            params += [before[0], before[0], before[1]]
+            order = "ASC"
+        else:
+            order = "DESC"
+        if after is not None or before is not None:
+            name += ".after" if after is not None else ".before"
+
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        page_order = f" ORDER BY {created} {order}, {ident} {order} LIMIT %s"
+        sql = select_sql + where + page_order
+        params = tuple(params) + (page_size + 1,)
+        if archive_sql is not None:
+            sql = (f"SELECT * FROM ({sql}) hot UNION ALL SELECT * FROM ({archive_sql + where + page_order}) cold"
+                   f" ORDER BY created_at {order}, id {order} LIMIT %s")
+            params = params + params + (page_size + 1,)
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, statement(name, sql), params)
+            rows = cursor.fetchall()
+
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if before is not None:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, after is not None
+
+        if not rows:
+            return Page(rows, False, has_previous, None, None)
+        first_key = (rows[0][created_index], rows[0][0])
+        last_key = (rows[-1][created_index], rows[-1][0])
+        return Page(rows, has_next, has_previous, first_key, last_key)
+
+    def filter_conditions(self, report_filter, archived=False):
+        """Translate a filters.ReportFilter into (conditions, params) over ``reports r JOIN users u``,
+        or with ``archived`` over ``reports_archive r JOIN users u``"""
+        conditions, params = [], []
+        if report_filter.report_ids is not None:
+            conditions.append(f"r.id IN ({', '.join(['%s'] * len(report_filter.report_ids))})"
+                              if report_filter.report_ids else "1 = 0")
+            params += report_filter.report_ids
+        if report_filter.id_range is not None:
+            conditions.append("r.id BETWEEN %s AND %s")
+            params += report_filter.id_range
+        if report_filter.username is not None:
+            conditions.append("u.username LIKE %s")
+            params.append(f"%{report_filter.username}%")
+        if report_filter.issue_type is not None:
+            conditions.append("r.issue_type = %s")
+            params.append(report_filter.issue_type)
+        if report_filter.status is not None:
+            conditions.append("r.status = %s")
+            params.append(report_filter.status)
+        if report_filter.keywords is not None:
+            keyword_conditions, keyword_params = self._keyword_conditions(report_filter.keywords, archived)
+            conditions += keyword_conditions
+            params += keyword_params
+        if report_filter.created_range is not None:
+            conditions.append("r.created_at >= %s AND r.created_at < %s")
+            params += report_filter.created_range
+        return conditions, params
+
+    def _keyword_conditions(self, keywords, archived=False):
+        """Unranked form of the keyword search: every term must appear"""
+        terms = text_index.query_terms(keywords)
+        if self.db.backend.native_fulltext:
+            terms = [term for term in terms if len(term) >= 3]
+            if not terms:
+                return ["1 = 0"], []
+            return (["MATCH(r.location, r.description) AGAINST (%s IN BOOLEAN MODE)"],
+                    [" ".join(f"+{term}" for term in terms)])
+        if not terms:
+            return ["1 = 0"], []
+        postings = (text_index.ARCHIVE if archived else text_index.REPORTS).terms
+        return ([f"r.id IN (SELECT report_id FROM {postings} WHERE term = %s)"] * len(terms), terms)
+
+    def count_for_user(self, user_id):
+        """Return {status: count} of one user's reports"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.COUNT_FOR_USER, (user_id, user_id))
+            return dict(cursor.fetchall())
+
+    def find_matching(self, report_filter, limit=DEFAULT_SEARCH_LIMIT):
+        """Return up to ``limit`` reports matching a filter, newest first
+
+        The archive is searched only if no report in the hot table matches.
+        """
+        for archived, select_sql in ((False, REPORT_LIST_COLUMNS), (True, ARCHIVE_LIST_COLUMNS)):
+            conditions, params = self.filter_conditions(report_filter, archived)
+            sql = select_sql
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY r.created_at DESC, r.id DESC LIMIT %s"
+            rows = self._fetch_list(sql, tuple(params) + (limit,))
+            if rows:
+                break
+        return rows
+
+    def count_by_status(self, report_filter):
+        """Return {status: count} of the reports matching a filter"""
+        conditions, params = self.filter_conditions(report_filter)
+        sql = "SELECT r.status, COUNT(*) FROM reports r JOIN users u ON r.user_id = u.id"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " GROUP BY r.status"
+        with self.db.cursor() as cursor:
+            self.db.execute(cursor, sql, params)
+            return dict(cursor.fetchall())
+
+    def update_status_matching(self, report_filter, status, chunk_size=STREAM_BATCH_SIZE):
+        """Set ``status`` on every report matching a filter and return how many changed
+
+        Runs as one transaction. Matching ids are read (and locked where the
+        engine supports it) ``chunk_size`` at a time in id order, and each
+        chunk is changed with one UPDATE per old status so the status
+        counters move by exactly the rows updated.
+        """
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be at least 1")
+        conditions, params = self.filter_conditions(report_filter)
+        conditions = conditions + ["r.status <> %s", "r.id > %s"]
+        select_sql = (
+            "SELECT r.id, r.status FROM reports r JOIN users u ON r.user_id = u.id"
+            f" WHERE {' AND '.join(conditions)} ORDER BY r.id LIMIT %s" + self.db.backend.lock_rows
+        )
+        counters = CounterRepository(self.db)
+        changed, last_id = 0, 0
+        with self.db.cursor(commit=True) as cursor:
+            while True:
+                self.db.execute(cursor, select_sql, list(params) + [status, last_id, chunk_size])
+                rows = cursor.fetchall()
+                if not rows:
+                    return changed
+                last_id = rows[-1][0]
+                by_status = {}
+                for report_id, old_status in rows:
+                    by_status.setdefault(old_status, []).append(report_id)
+                deltas = []
+                for old_status, report_ids in by_status.items():
+                    self.db.execute(
+                        cursor,
+                        f"UPDATE reports SET status = %s WHERE status = %s AND id IN ({', '.join(['%s'] * len(report_ids))})",
+                        [status, old_status] + report_ids
+                    )
+                    deltas += [(("status", old_status), -cursor.rowcount), (("status", status), cursor.rowcount)]
+                    changed += cursor.rowcount
+                    dedup.status_changed(self.db, cursor, report_ids, old_status, status)
+                counters.apply(cursor, deltas)
+                for report_id, _ in rows:
+                    self.db.report_cache.invalidate(report_id)
+
+    def stream(self, report_filter, batch_size=STREAM_BATCH_SIZE):
+        """Yield every matching report as REPORT_EXPORT_FIELDS tuples, the hot
+        table's in id order and then the archive's in id order
+
+        Rows are fetched ``batch_size`` at a time from a streaming cursor, so
+        memory use does not grow with the size of the result.
+        """
+        for archived, table in ((False, "reports"), (True, "reports_archive")):
+            conditions, params = self.filter_conditions(report_filter, archived)
+            sql = f"SELECT {', '.join(REPORT_EXPORT_FIELDS)} FROM {table} r JOIN users u ON r.user_id = u.id"
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY r.id"
+            with self.db.cursor(stream=True) as cursor:
+                self.db.execute(cursor, sql, params)
+                yield from _fetch_batches(cursor, batch_size)
+
+    def stream_matching(self, report_filter, batch_size=STREAM_BATCH_SIZE):
+        """Yield every report matching a filter as REPORT_LIST_FIELDS rows, newest first
+
+        The unbounded counterpart of find_matching, for the screens that
+        print results as they arrive. Rows are read one keyset page of
+        ``batch_size`` at a time, and each page's connection goes back to the
+        pool before its rows are yielded, so a screen paused at its "more"
+        prompt holds no connection. Like find_matching, it reads the archive
+        only if nothing in the hot table matches.
+        """
+        for archived, select_sql in ((False, REPORT_LIST_COLUMNS), (True, ARCHIVE_LIST_COLUMNS)):
+            conditions, params = self.filter_conditions(report_filter, archived)
+            found, last_key = False, None
+            while True:
+                page_conditions, page_params = list(conditions), list(params)
+                if last_key is not None:
+                    # Expanded form of (created_at, id) < key so the index range is usable
+                    page_conditions.append("r.created_at <= %s AND (r.created_at < %s OR r.id < %s)")
+                    page_params += [last_key[0], last_key[0], last_key[1]]
+                sql = select_sql
+                if page_conditions:
+                    sql += " WHERE " + " AND ".join(page_conditions)
+                sql += " ORDER BY r.created_at DESC, r.id DESC LIMIT %s"
+                with self.db.cursor() as cursor:
+                    self.db.execute(cursor, sql, page_params + [batch_size])
+                    rows = cursor.fetchall()
+                if rows:
+                    found = True
+                    yield from rows
+                if len(rows) < batch_size:
+                    break
+                last_key = (rows[-1][7], rows[-1][0])
+            if found:
+                return
+
+    def search_by_id(self, report_id):
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.BY_ID, (report_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                self.db.run(cursor, self.ARCHIVED_BY_ID, (report_id,))
+                rows = cursor.fetchall()
+            return rows
+
+    def find_nearby(self, latitude, longitude, radius_m, limit=DEFAULT_NEARBY_LIMIT):
+        """Return up to ``limit`` reports within ``radius_m`` metres of a point, nearest first
+
+        Rows are REPORT_LIST_FIELDS followed by the distance in metres.
+        Only reports whose location carried coordinates can match. The
+        archive is searched only if no report in the hot table is in range.
+        """
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            raise ValueError("Latitude must be within -90..90 and longitude within -180..180")
+        if not 0 < radius_m <= MAX_NEARBY_RADIUS_M:
+            raise ValueError(f"Radius must be between 1 and {MAX_NEARBY_RADIUS_M} metres")
+        for archived in (False, True):
+            matches = []
+            for row in self._fetch_list(*self.nearby_statement(latitude, longitude, radius_m, archived)):
+                distance = geo.distance_m(latitude, longitude, row[-2], row[-1])
+                if distance <= radius_m:
+                    matches.append(tuple(row[:-2]) + (round(distance),))
+            if matches:
+                break
+        matches.sort(key=lambda match: (match[-1], -match[0]))
+        return matches[:limit]
+
+    def nearby_statement(self, latitude, longitude, radius_m, archived=False):
+        """Build the candidate query for find_nearby: every report in the geohash cells covering the circle"""
+        prefixes = geo.cover(latitude, longitude, radius_m)
+        cells = " OR ".join(["(r.geohash >= %s AND r.geohash < %s)"] * len(prefixes))
+        params = [bound for prefix in prefixes for bound in (prefix, prefix + geo.PREFIX_END)]
+        sql = (f"SELECT {REPORT_LIST_FIELDS}, r.latitude, r.longitude"
+               f" FROM {'reports_archive' if archived else 'reports'} r JOIN users u ON r.user_id = u.id WHERE {cells}")
+        return sql, tuple(params)
+
+    def search_text(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Return up to ``limit`` reports whose location or description contain every
+        query term, best match first; the archive is searched only if the hot table has none"""
+        rows = []
+        for archived in (False, True):
+            search = self.text_search_statement(query, limit, archived)
+            rows = self._fetch_list(*search) if search else []
+            if rows:
+                break
+        return rows
+
+    def text_search_statement(self, query, limit=DEFAULT_SEARCH_LIMIT, archived=False):
+        """Build the ranked keyword query as (sql, params), or None if the query has no terms"""
+        terms = text_index.query_terms(query)
+        if not terms:
+            return None
+        if not self.db.backend.native_fulltext:
+            index = text_index.ARCHIVE if archived else text_index.REPORTS
+            return text_index.search_statement(self.db, REPORT_LIST_FIELDS, terms, limit, index)
+        # InnoDB FULLTEXT in boolean mode; "+" makes every term mandatory.
+        # Terms shorter than innodb_ft_min_token_size (3) are never indexed.
+        terms = [term for term in terms if len(term) >= 3]
+        if not terms:
+            return None
+        match = "MATCH(r.location, r.description) AGAINST (%s IN BOOLEAN MODE)"
+        boolean_query = " ".join(f"+{term}" for term in terms)
+        sql = f"""
+            SELECT {REPORT_LIST_FIELDS}
+            FROM {'reports_archive' if archived else 'reports'} r
+            JOIN users u ON r.user_id = u.id
+            WHERE {match}
+            ORDER BY {match} DESC, r.id DESC
+            LIMIT %s
+        """
+        return sql, (boolean_query, boolean_query, limit)
+
+    def _fetch_list(self, sql, params):
+        with self.db.cursor() as cursor:
+            self.db.execute(cursor, sql, params)
+            return cursor.fetchall()
+
+
+class AttachmentRepository:
+    """Metadata of the photos attached to reports; the bytes live in an attachments.AttachmentStore"""
+
+    INSERT = statement(
+        "attachments.insert",
+        "INSERT INTO attachments (report_id, user_id, sha256, filename, content_type, size_bytes)"
+        " VALUES (%s, %s, %s, %s, %s, %s)"
+    )
+    FOR_REPORT = statement(
+        "attachments.for_report",
+        "SELECT id, filename, content_type, size_bytes, created_at FROM attachments WHERE report_id = %s ORDER BY id"
+    )
+    GET = statement(
+        "attachments.get",
+        "SELECT id, report_id, sha256, filename, content_type, size_bytes FROM attachments WHERE id = %s"
+    )
+    DELETE = statement("attachments.delete", "DELETE FROM attachments WHERE id = %s")
+
+    def __init__(self, db):
+        self.db = db
+
+    def add(self, report_id, user_id, sha256, filename, content_type, size_bytes, place=None):
+        """Record a photo against a report and return the attachment id
+
+        ``place`` (an upload's ``place``) is called once the row is written,
+        in the same transaction, to move the photo into the store. The row
+        holds off a concurrent ``remove`` of the same content, so the file
+        cannot be deleted between the two.
+        """
+        with self.db.cursor(commit=True) as cursor:
+            self.db.run(
+                cursor,
+                self.INSERT,
+                (report_id, user_id, sha256, os.path.basename(filename)[:255] or "photo", content_type, size_bytes)
+            )
+            if place:
+                place()
+            return cursor.lastrowid
+
+    def list_for_report(self, report_id):
+        """Return (id, filename, content_type, size_bytes, created_at) for each photo of a report"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.FOR_REPORT, (report_id,))
+            return cursor.fetchall()
+
+    def get(self, attachment_id):
+        """Return (id, report_id, sha256, filename, content_type, size_bytes), or None"""
+        with self.db.cursor() as cursor:
+            self.db.run(cursor, self.GET, (attachment_id,))
+            return cursor.fetchone()
+
+    def remove(self, attachment_id, delete_content=None):
+        """Delete one attachment row; returns its sha256 if no other row still uses that content
+
+        ``delete_content(sha256)`` (the store's ``delete``) is called for
+        content no longer used before the transaction commits. The reference
+        count is read with locks that make a concurrent ``add`` of the same
+        content wait (SQLite's single writer; on MySQL the gap locks of
+        REPEATABLE READ). Returns None when the attachment did not exist or
+        its content is still shared.
+        """
+        locked_sha256 = statement("attachments.sha256_for_update",
+                                  "SELECT sha256 FROM attachments WHERE id = %s" + self.db.backend.lock_rows)
+        locked_references = statement("attachments.references_for_update",
+                                      "SELECT COUNT(*) FROM attachments WHERE sha256 = %s" + self.db.backend.lock_rows)
+        with self.db.cursor(commit=True) as cursor:
+            self.db.run(cursor, locked_sha256, (attachment_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            self.db.run(cursor, self.DELETE, (attachment_id,))
+            self.db.run(cursor, locked_references, (row[0],))
+            if cursor.fetchone()[0]:
+                return None
+            if delete_content:
+                delete_content(row[0])
+            return row[0]
@@ -0,0 +1,142 @@
+"""Fixed-width terminal tables that print rows as they are fetched
+
+PrettyTable measures every row before it prints the first one, so a large
+result is held in memory and walked twice. ``TableRenderer`` takes its
+column widths from the truncation limits the screens already apply and
+the known status, severity, issue type and role values, so each row is
+formatted and written the moment it arrives. Long results pause after
+every screenful. Colors are only emitted when the output is a terminal.
+"""
+
+import sys
+import shutil
+from collections import namedtuple
+
+from colorama import Fore, Style # type: ignore
+
+from storage import ISSUE_TYPES, ROLES, SEVERITIES, STATUSES
+
+ELLIPSIS = "..."
+
+STATUS_COLORS = {
+    "Pending": Fore.YELLOW,
+    "In Progress": Fore.CYAN,
+    "Resolved": Fore.GREEN,
+    "Rejected": Fore.RED
+}
+
+SEVERITY_COLORS = {
+    "Low": Fore.GREEN,
+    "Medium": Fore.YELLOW,
+    "High": Fore.RED,
+    "Critical": Fore.RED + Style.BRIGHT
+}
+
+ROLE_COLORS = {"admin": Fore.MAGENTA, "user": Fore.CYAN}
+
+# Rows left on screen for the table borders and the "more" prompt when paging
+PAGE_MARGIN = 4
+
+
+class Column(namedtuple("Column", ["title", "width", "limit", "colors", "align"],
+                        defaults=(None, None, "<"))):
+    """One table column
+
+    Values longer than ``limit`` are cut to ``limit`` characters plus an
+    ellipsis. Columns without a limit (ids, usernames) treat ``width`` as a
+    minimum, and a longer value only widens its own row. ``colors`` maps a
+    value to the ANSI prefix it is shown in.
+    """
+
+
+def truncated(title, limit):
+    """A free-text column cut to ``limit`` characters, as the screens always did"""
+    return Column(title, max(limit + len(ELLIPSIS), len(title)), limit)
+
+
+def enumerated(title, values, colors=None):
+    """A column holding one of a fixed set of values"""
+    return Column(title, max(len(title), *(len(value) for value in values)), colors=colors)
+
+
+ID = Column("ID", 6, align=">")
+USER = Column("User", 12)
+ISSUE_TYPE = enumerated("Issue Type", ISSUE_TYPES)
+SEVERITY = enumerated("Severity", SEVERITIES, SEVERITY_COLORS)
+STATUS = enumerated("Status", STATUSES, STATUS_COLORS)
+DATE = Column("Date", 10)
+
+# Column sets of the report and user list screens
+MY_REPORT_COLUMNS = (ID, ISSUE_TYPE, Column("Severity", SEVERITY.width), truncated("Description", 30),
+                     truncated("Location", 20), STATUS, DATE)
+REPORT_COLUMNS = (ID, USER, ISSUE_TYPE, SEVERITY, truncated("Description", 20), truncated("Location", 15),
+                  STATUS, DATE)
+NEARBY_COLUMNS = REPORT_COLUMNS + (Column("Metres", 7, align=">"),)
+USER_COLUMNS = (ID, Column("Username", 12), enumerated("Role", ROLES, ROLE_COLORS), Column("Created", 10))
+
+
+class TableRenderer:
+    """Writes rows under a header with precomputed column widths"""
+
+    def __init__(self, columns, stream=None, color=None):
+        self.columns = columns
+        self.stream = stream or sys.stdout
+        self.interactive = self.stream.isatty()
+        self.color = self.interactive if color is None else color
+        self.rule = "+" + "+".join("-" * (column.width + 2) for column in columns) + "+\n"
+
+    def _cell(self, column, value):
+        if hasattr(value, "strftime"):
+            text = value.strftime("%Y-%m-%d")
+        else:
+            text = str(value)
+        if column.limit is not None and len(text) > column.limit:
+            text = text[:column.limit] + ELLIPSIS
+        padding = " " * max(0, column.width - len(text))
+        if self.color and column.colors:
+            prefix = column.colors.get(text)
+            if prefix:
+                text = f"{prefix}{text}{Style.RESET_ALL}"
+        return padding + text if column.align == ">" else text + padding
+
+    def format_row(self, row):
+        return "| " + " | ".join(self._cell(column, value) for column, value in zip(self.columns, row)) + " |\n"
+
+    def header(self):
+        titles = "| " + " | ".join(column.title.rjust(column.width) if column.align == ">" else column.title.ljust(column.width)
+                                   for column in self.columns) + " |\n"
+        return self.rule + titles + self.rule
+
+    def render(self, rows, page_size=None):
+        """Write every row and return (rows shown, whether all were shown)
+
+        ``rows`` may be a generator; it is consumed one row at a time. Nothing
+        is written for an empty result. On a terminal the output pauses every
+        ``page_size`` rows (default: a screenful, 0 never pauses) and the
+        reader may stop early, in which case the generator is closed. A pause
+        can last indefinitely, so the generator must not hold a pooled
+        connection while suspended; the repositories' ``stream_matching`` and
+        ``stream_all`` read keyset pages for this.
+        """
+        if page_size is None:
+            page_size = max(1, shutil.get_terminal_size().lines - PAGE_MARGIN)
+        pausing = page_size and self.interactive and sys.stdin.isatty()
+        write = self.stream.write
+        shown = 0
+        for row in rows:
+            if not shown:
+                write(self.header())
+            elif pausing and shown % page_size == 0:
+                write(self.rule)
+                self.stream.flush()
+                answer = input(f"-- {shown} shown; Enter for more, q to stop -- ")
+                if answer.strip().lower() == "q":
+                    if hasattr(rows, "close"):
+                        rows.close()
+                    return shown, False
+            write(self.format_row(row))
+            shown += 1
+        if shown:
+            write(self.rule)
+        self.stream.flush()
+        return shown, True
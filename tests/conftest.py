@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import migrations
+from storage import Database, SQLiteBackend
+
+
+def open_database(path=":memory:", **options):
+    """A Database on an embedded SQLite engine with cheap password hashing"""
+    options.setdefault("hash_workers", 0)
+    options.setdefault("password_cost", 2)
+    return Database(SQLiteBackend(path), **options)
+
+
+@pytest.fixture
+def db():
+    """An in-memory database with every migration applied"""
+    database = open_database()
+    migrations.migrate(database)
+    yield database
+    database.close()
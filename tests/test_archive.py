@@ -0,0 +1,88 @@
+import datetime
+
+import archive
+from storage import CounterRepository, ReportRepository
+
+LONG_AGO = datetime.datetime(2020, 1, 2, 3, 4, 5)
+STREETS = ("amber", "birch", "cedar", "dune", "elm", "fern", "grove", "heath", "iris", "juniper")
+
+
+def _rows(db, sql, params=()):
+    with db.cursor() as cursor:
+        db.execute(cursor, sql, params)
+        return cursor.fetchall()
+
+
+def _close_long_ago(db, reports, report_id, status="Resolved"):
+    reports.update_status(report_id, status)
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, "UPDATE reports SET updated_at = %s WHERE id = %s", (LONG_AGO, report_id))
+
+
+def _setup(db):
+    """Ten reports: ids 3, 4 and 8 closed long ago, 5 closed today, the rest open"""
+    reports = ReportRepository(db)
+    ids = [reports.create(1, "Water Issue", "Low", f"Leaking hydrant on {street}", f"{street} road")
+           for street in STREETS]
+    for report_id in (ids[2], ids[3], ids[7]):
+        _close_long_ago(db, reports, report_id)
+    reports.update_status(ids[4], "Rejected")
+    return reports, ids
+
+
+def test_archival_moves_only_old_closed_reports(db):
+    reports, ids = _setup(db)
+    assert archive.archive_closed(db, pause=0, batch_size=2) == 3
+
+    hot = {row[0] for row in _rows(db, "SELECT id FROM reports")}
+    archived = {row[0] for row in _rows(db, "SELECT id FROM reports_archive")}
+    assert archived == {ids[2], ids[3], ids[7]}
+    assert hot == set(ids) - archived
+    # The detail view and keyword search still find an archived report under its id
+    assert reports.get_detail(ids[3])[0] == ids[3]
+    assert [row[0] for row in reports.search_text("hydrant heath")] == [ids[7]]
+    assert CounterRepository(db).reconcile(fix=False) == []
+    assert archive.archive_closed(db, pause=0) == 0
+
+
+def test_archival_moves_keyword_postings_with_the_report(db):
+    reports, ids = _setup(db)
+    archive.archive_closed(db, pause=0)
+    assert _rows(db, "SELECT COUNT(*) FROM report_terms WHERE report_id = %s", (ids[2],))[0][0] == 0
+    assert _rows(db, "SELECT COUNT(*) FROM archive_terms WHERE report_id = %s", (ids[2],))[0][0] > 0
+    # Open reports matching the terms are preferred to the archive
+    assert ids[2] not in [row[0] for row in reports.search_text("leaking hydrant")]
+
+
+def test_status_change_restores_an_archived_report(db):
+    reports, ids = _setup(db)
+    archive.archive_closed(db, pause=0)
+
+    assert reports.update_status(ids[3], "In Progress")
+    assert _rows(db, "SELECT status FROM reports WHERE id = %s", (ids[3],)) == [("In Progress",)]
+    assert _rows(db, "SELECT id FROM reports_archive WHERE id = %s", (ids[3],)) == []
+    assert [row[0] for row in reports.search_text("hydrant dune")] == [ids[3]]
+    assert _rows(db, "SELECT COUNT(*) FROM archive_terms WHERE report_id = %s", (ids[3],))[0][0] == 0
+    assert CounterRepository(db).reconcile(fix=False) == []
+
+
+def test_run_starts_at_first_eligible_report_and_pauses_every_batch(db, monkeypatch):
+    _, ids = _setup(db)
+    examined, pauses = [], []
+    archive_batch = archive.archive_batch
+
+    def recording_batch(db, cutoff, after_id=0, batch_size=archive.DEFAULT_BATCH_SIZE):
+        examined.append(after_id)
+        return archive_batch(db, cutoff, after_id, batch_size)
+
+    monkeypatch.setattr(archive, "archive_batch", recording_batch)
+    monkeypatch.setattr(archive.time, "sleep", pauses.append)
+
+    # A stopped run: the next one resumes at the first report still eligible
+    assert archive.archive_closed(db, pause=0.5, batch_size=1, max_reports=1) == 1
+    assert examined == [ids[2] - 1]
+    examined.clear()
+    assert archive.archive_closed(db, pause=0.5, batch_size=1) == 2
+    # Ids 4 to 8 examined one at a time, stopping at the last eligible one
+    assert examined == list(range(ids[3] - 1, ids[7]))
+    assert len(pauses) == 1 + len(examined)
@@ -0,0 +1,63 @@
+import io
+import os
+import threading
+
+import pytest
+
+import migrations
+from attachments import AttachmentStore
+from conftest import open_database
+from storage import AttachmentRepository, ReportRepository
+
+PHOTO = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024
+
+
+@pytest.fixture
+def file_db(tmp_path):
+    """A database on disk, where concurrent writers wait for each other's locks"""
+    database = open_database(str(tmp_path / "reports.db"))
+    migrations.migrate(database)
+    yield database
+    database.close()
+
+
+def _attach(db, store, report_id):
+    with store.put(io.BytesIO(PHOTO)) as upload:
+        return AttachmentRepository(db).add(report_id, 1, upload.sha256, "photo.png", upload.content_type,
+                                            upload.size, place=upload.place), upload.sha256
+
+
+def test_shared_content_is_deleted_with_its_last_row(db, tmp_path):
+    store = AttachmentStore(str(tmp_path / "attachments"))
+    report_id = ReportRepository(db).create(1, "Road Damage", "High", "Pothole", "Main Street 12")
+    first, sha256 = _attach(db, store, report_id)
+    second, _ = _attach(db, store, report_id)
+    repo = AttachmentRepository(db)
+
+    assert repo.remove(first, store.delete) is None
+    assert store.exists(sha256)
+    assert repo.remove(second, store.delete) == sha256
+    assert not store.exists(sha256)
+    assert os.listdir(store.temp_dir) == []
+
+
+def test_upload_racing_the_last_remove_keeps_its_file(file_db, tmp_path):
+    store = AttachmentStore(str(tmp_path / "attachments"))
+    report_id = ReportRepository(file_db).create(1, "Road Damage", "High", "Pothole", "Main Street 12")
+    attachment_id, sha256 = _attach(file_db, store, report_id)
+    added = []
+
+    def delete_while_uploading(digest):
+        # The same photo arrives while the remove's transaction is still open
+        uploader = threading.Thread(target=lambda: added.append(_attach(file_db, store, report_id)))
+        uploader.start()
+        uploader.join(0.3)
+        store.delete(digest)
+        delete_while_uploading.uploader = uploader
+
+    assert AttachmentRepository(file_db).remove(attachment_id, delete_while_uploading) == sha256
+    delete_while_uploading.uploader.join(5)
+
+    assert len(added) == 1
+    assert AttachmentRepository(file_db).get(added[0][0]) is not None
+    assert store.exists(sha256)
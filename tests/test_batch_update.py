@@ -0,0 +1,62 @@
+from cache import MISSING
+from filters import ReportFilter
+from storage import CounterRepository, ReportRepository
+
+
+def _setup(db):
+    reports = ReportRepository(db)
+    ids = []
+    for n in range(12):
+        issue_type = "Power Outage" if n % 3 == 0 else "Water Issue"
+        ids.append(reports.create(1, issue_type, "Low", f"Report number {n}", f"Street {n}"))
+    reports.update_status(ids[3], "Resolved")
+    reports.update_status(ids[6], "In Progress")
+    return reports, ids
+
+
+def _statuses(db):
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT id, status FROM reports ORDER BY id")
+        return dict(cursor.fetchall())
+
+
+def test_filter_update_changes_exactly_the_previewed_reports(db):
+    reports, ids = _setup(db)
+    selection = ReportFilter(issue_type="Power Outage")
+    preview = reports.count_by_status(selection)
+    assert sum(preview.values()) == 4
+    before = _statuses(db)
+
+    changed = reports.update_status_matching(selection, "Resolved", chunk_size=2)
+    assert changed == sum(preview.values()) - preview.get("Resolved", 0)
+    assert reports.count_by_status(selection) == {"Resolved": 4}
+    after = _statuses(db)
+    assert {report_id for report_id in ids if after[report_id] != before[report_id]} == {ids[0], ids[6], ids[9]}
+    assert CounterRepository(db).reconcile(fix=False) == []
+
+
+def test_id_range_update_moves_the_counters_by_the_rows_changed(db):
+    reports, ids = _setup(db)
+    selection = ReportFilter(id_range=(ids[2], ids[7]))
+    preview = reports.count_by_status(selection)
+    assert sum(preview.values()) == 6
+
+    assert reports.update_status_matching(selection, "Rejected", chunk_size=4) == 6
+    assert reports.count_by_status(selection) == {"Rejected": 6}
+    assert CounterRepository(db).reconcile(fix=False) == []
+    # Nothing left to change the second time
+    assert reports.update_status_matching(selection, "Rejected") == 0
+
+
+def test_update_invalidates_cached_reports(db):
+    reports, ids = _setup(db)
+    for report_id in ids:
+        assert reports.get_detail(report_id) is not None
+    cache = db.report_cache
+
+    reports.update_status_matching(ReportFilter(id_range=(ids[0], ids[4])), "Rejected")
+    assert all(cache.get(report_id) is MISSING for report_id in ids[:5])
+    assert all(cache.get(report_id) is not MISSING for report_id in ids[5:])
+    stale = cache.stats()["stale"]
+    assert reports.get_detail(ids[1])[5] == "Rejected"
+    assert cache.stats()["stale"] == stale
@@ -0,0 +1,16 @@
+import pytest
+
+from bulk_import import RowError, validate
+
+
+def test_enum_fields_match_case_insensitively():
+    record = {"username": "alice", "issue_type": "road damage", "severity": "HIGH",
+              "description": "Deep hole", "location": "Main St"}
+    _, issue_type, severity, _, _, status, _ = validate(record)
+    assert (issue_type, severity, status) == ("Road Damage", "High", "Pending")
+
+
+def test_unknown_enum_value_is_a_row_error():
+    record = {"username": "alice", "issue_type": "Meteor", "description": "Crater", "location": "Main St"}
+    with pytest.raises(RowError, match="Invalid issue_type 'Meteor'"):
+        validate(record)
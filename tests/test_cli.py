@@ -0,0 +1,26 @@
+import json
+
+import cli
+import index
+
+
+def test_main_closes_the_database(db, monkeypatch, capsys):
+    monkeypatch.setattr(index, "_db", db)
+    closed = []
+    monkeypatch.setattr(db, "close", lambda: closed.append(True))
+
+    assert cli.main(["users", "list"]) == 0
+    assert "admin" in capsys.readouterr().out
+    assert closed == [True]
+
+
+def test_main_closes_the_database_after_a_failure(db, monkeypatch, capsys):
+    monkeypatch.setattr(index, "_db", db)
+    closed = []
+    monkeypatch.setattr(db, "close", lambda: closed.append(True))
+
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, "DROP TABLE report_counters")
+    assert cli.main(["stats"]) == 1
+    assert "error" in json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+    assert closed == [True]
@@ -0,0 +1,29 @@
+import gc
+import sqlite3
+
+from db_pool import ConnectionPool
+
+
+def test_unclosed_connection_gives_its_slot_back(caplog):
+    pool = ConnectionPool(lambda: sqlite3.connect(":memory:"), size=1, timeout=0.1)
+    conn = pool.acquire()
+    del conn
+    gc.collect()
+
+    # The only slot is free again; the leaked connection itself was discarded
+    pool.acquire().close()
+    snapshot = pool.metrics.snapshot()
+    assert snapshot["leaked"] == 1
+    assert snapshot["discarded"] == 1
+    assert snapshot["in_use"] == 0
+    assert "without being closed" in caplog.text
+    pool.close()
+
+
+def test_closed_connection_is_not_reported_as_leaked():
+    pool = ConnectionPool(lambda: sqlite3.connect(":memory:"), size=1, timeout=0.1)
+    with pool.acquire():
+        pass
+    gc.collect()
+    assert pool.metrics.snapshot()["leaked"] == 0
+    pool.close()
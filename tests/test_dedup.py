@@ -0,0 +1,10 @@
+from benchmarks import generator
+
+
+def test_linking_duplicates_keeps_historical_timestamps(db):
+    generator.load(db, 2000)
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT updated_at FROM reports WHERE duplicate_of IS NOT NULL")
+        linked = [updated_at for (updated_at,) in cursor.fetchall()]
+    assert linked
+    assert max(linked) <= generator.END
@@ -0,0 +1,15 @@
+import index
+from query_metrics import slow_query_log
+
+
+def test_get_db_leaves_the_slow_query_log_file_alone(monkeypatch, tmp_path):
+    monkeypatch.setenv("INFRA_DB_BACKEND", "sqlite")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(index, "_db", None)
+    db = index.get_db()
+    try:
+        assert not slow_query_log.handlers
+        assert not (tmp_path / index.SLOW_QUERY_LOG).exists()
+    finally:
+        db.close()
+        index.stop_metrics()
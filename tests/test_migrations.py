@@ -0,0 +1,82 @@
+import datetime
+
+import migrations
+import passwords
+from conftest import open_database
+from storage import UserRepository
+
+LAST_UPDATED = datetime.datetime(2020, 1, 2, 3, 4, 5)
+
+
+def _rows(db, sql):
+    with db.cursor() as cursor:
+        db.execute(cursor, sql)
+        return cursor.fetchall()
+
+
+def test_migrate_applies_every_version_once(db):
+    assert migrations.applied_versions(db) == {migration.version for migration in migrations.MIGRATIONS}
+    assert migrations.migrate(db) == []
+
+
+def test_fresh_database_logs_no_counter_drift(caplog):
+    database = open_database()
+    try:
+        migrations.migrate(database)
+    finally:
+        database.close()
+    assert "drifted" not in caplog.text
+
+
+def test_migrate_keeps_updated_at_of_backfilled_reports(monkeypatch):
+    database = open_database()
+    try:
+        monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:5])
+        migrations.migrate(database)
+        with database.cursor(commit=True) as cursor:
+            # Two near-identical open reports with coordinates: migration 6
+            # geocodes both and migration 7 links the second to the first
+            for _ in range(2):
+                database.execute(
+                    cursor,
+                    "INSERT INTO reports (user_id, issue_type, severity, description, location, updated_at)"
+                    " VALUES (1, 'Road Damage', 'High', 'Deep pothole across both lanes', %s, %s)",
+                    ("KN 5 Rd, -1.9441, 30.0619", LAST_UPDATED)
+                )
+        monkeypatch.undo()
+
+        assert migrations.migrate(database) == [migration.version for migration in migrations.MIGRATIONS[5:]]
+        rows = _rows(database, "SELECT geohash, duplicate_of, updated_at FROM reports ORDER BY id")
+        assert all(geohash is not None for geohash, _, _ in rows)
+        assert rows[1][1] is not None
+        assert [updated_at for _, _, updated_at in rows] == [LAST_UPDATED, LAST_UPDATED]
+
+        # Editing a report still stamps it
+        with database.cursor(commit=True) as cursor:
+            database.execute(cursor, "UPDATE reports SET status = 'Resolved' WHERE id = 1")
+        assert _rows(database, "SELECT updated_at FROM reports WHERE id = 1")[0][0] > LAST_UPDATED
+    finally:
+        database.close()
+
+
+def test_default_admin_is_seeded_with_a_hash(db):
+    stored = _rows(db, "SELECT password FROM users WHERE username = 'admin'")[0][0]
+    assert passwords.is_hashed(stored)
+    assert UserRepository(db).authenticate(*migrations.DEFAULT_ADMIN) is not None
+
+
+def test_migrate_hashes_plaintext_rows_of_older_databases(monkeypatch):
+    database = open_database()
+    try:
+        monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS[:10])
+        migrations.migrate(database)
+        with database.cursor(commit=True) as cursor:
+            database.execute(cursor, "UPDATE users SET password = 'admin123' WHERE username = 'admin'")
+        monkeypatch.undo()
+
+        assert migrations.migrate(database) == [migration.version for migration in migrations.MIGRATIONS[10:]]
+        stored = _rows(database, "SELECT password FROM users WHERE username = 'admin'")[0][0]
+        assert passwords.is_hashed(stored)
+        assert passwords.verify_password("admin123", stored)
+    finally:
+        database.close()
@@ -0,0 +1,25 @@
+from filters import ReportFilter
+from storage import ReportRepository, UserRepository
+
+
+def test_paused_result_listing_holds_no_connection(db):
+    reports = ReportRepository(db)
+    for n in range(25):
+        reports.create(1, "Road Damage", "High", f"Pothole {n}", f"Main Street {n}")
+
+    rows = reports.stream_matching(ReportFilter(issue_type="Road Damage"), batch_size=10)
+    first = [next(rows) for _ in range(12)]
+    # A screen waiting at its "more" prompt sits here
+    assert db.pool.metrics.snapshot()["in_use"] == 0
+    listed = first + list(rows)
+    assert [row[0] for row in listed] == list(range(25, 0, -1))
+
+
+def test_user_listing_pages_by_id(db):
+    users = UserRepository(db)
+    for n in range(7):
+        users.create(f"user{n}", "secret-password")
+    listing = users.stream_all(batch_size=3)
+    next(listing)
+    assert db.pool.metrics.snapshot()["in_use"] == 0
+    assert [row[1] for row in listing] == [f"user{n}" for n in range(7)]
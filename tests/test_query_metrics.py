@@ -0,0 +1,101 @@
+import sqlite3
+
+from query_metrics import InstrumentedCursor, QueryMetrics
+from statements import PreparedCursors, statement
+from storage import Database, SQLiteBackend
+
+ROWS = [(n, f"row {n}") for n in range(1, 8)]
+
+
+class PreparedCursor:
+    """Stands in for a server-side prepared cursor: rows come back only through fetchall"""
+
+    arraysize = 3
+
+    def __init__(self, rows):
+        self._rows = rows
+        self.description = None
+        self.rowcount = -1
+        self.executed = []
+
+    def execute(self, sql, params=()):
+        self.executed.append((sql, params))
+        self.description = (("id",), ("label",))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+def _prepared(rows=ROWS):
+    metrics = QueryMetrics()
+    prepared = PreparedCursor(rows)
+    cursor = InstrumentedCursor(sqlite3.connect(":memory:").cursor(), metrics, lambda name: prepared)
+    cursor.execute("SELECT id, label FROM items", (), "items.all")
+    return cursor, metrics
+
+
+def test_buffered_fetchmany_sizes():
+    cursor, _ = _prepared()
+    assert cursor.fetchmany(0) == []
+    assert cursor.fetchmany(2) == ROWS[:2]
+    assert cursor.fetchmany() == ROWS[2:5]
+    assert cursor.fetchmany(100) == ROWS[5:]
+    assert cursor.fetchmany(2) == []
+    assert cursor.fetchone() is None
+
+
+def test_buffered_rows_keep_their_order_across_mixed_fetches():
+    cursor, _ = _prepared()
+    assert cursor.fetchone() == ROWS[0]
+    assert cursor.fetchmany(2) == ROWS[1:3]
+    assert cursor.fetchone() == ROWS[3]
+    assert list(cursor.fetchall()) == ROWS[4:]
+    assert cursor.fetchall() == []
+
+
+def test_buffered_statement_is_recorded_with_all_its_rows():
+    cursor, metrics = _prepared()
+    cursor.fetchone()
+    cursor.execute("SELECT id, label FROM items WHERE id > %s", (3,), "items.after")
+    assert list(cursor) == ROWS
+    cursor.close()
+    rows = {row["name"]: row for row in metrics.summary()}
+    assert rows["items.all"]["calls"] == 1 and rows["items.all"]["rows"] == len(ROWS)
+    assert rows["items.after"]["rows"] == len(ROWS)
+
+
+class PreparingBackend(SQLiteBackend):
+    """SQLite with one PreparedCursors per connection, as the MySQL backend keeps"""
+
+    def __init__(self, path=":memory:"):
+        super().__init__(path)
+        self._prepared = {}
+
+    def prepared_cursors(self, conn):
+        return self._prepared.setdefault(conn.raw, PreparedCursors(2))
+
+    def prepare_cursor(self, conn):
+        return conn.raw.cursor()
+
+
+def test_statement_usage_counts_calls_and_prepares_per_connection():
+    database = Database(PreparingBackend(), pool_size=1, hash_workers=0)
+    first = statement("tests.first", "SELECT 1")
+    second = statement("tests.second", "SELECT 2")
+    third = statement("tests.third", "SELECT 3")
+    try:
+        # One pooled connection with room for two prepared cursors: third
+        # evicts second, the least recently used, which is prepared again
+        for item in (first, second, first, third, second):
+            with database.cursor() as cursor:
+                database.run(cursor, item)
+                assert cursor.fetchall() == [(int(item.sql[-1]),)]
+        usage = {name: (calls, prepares) for name, calls, prepares in database.statements.snapshot()}
+        assert usage["tests.first"] == (2, 1)
+        assert usage["tests.second"] == (2, 2)
+        assert usage["tests.third"] == (1, 1)
+    finally:
+        database.close()
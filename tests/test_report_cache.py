@@ -0,0 +1,25 @@
+import migrations
+from conftest import open_database
+from storage import ReportRepository
+
+
+def test_status_change_by_another_process_is_never_served_stale(tmp_path):
+    path = str(tmp_path / "reports.db")
+    this, other = open_database(path), open_database(path)
+    try:
+        migrations.migrate(this)
+        reports = ReportRepository(this)
+        report_id = reports.create(1, "Traffic Signal Problem", "High", "Signal stuck on red", "Ring road junction")
+        assert reports.get_detail(report_id)[5] == "Pending"
+        assert reports.get_detail(report_id)[5] == "Pending"
+        assert this.report_cache.stats()["hits"] == 1
+
+        # The other process has its own report cache, so this one is not told
+        assert ReportRepository(other).update_status(report_id, "Resolved")
+        assert reports.get_detail(report_id)[5] == "Resolved"
+        assert this.report_cache.stats()["stale"] == 1
+        assert reports.get_detail(report_id)[5] == "Resolved"
+        assert this.report_cache.stats()["stale"] == 1
+    finally:
+        this.close()
+        other.close()
@@ -0,0 +1,94 @@
+import os
+import base64
+import asyncio
+
+import pytest
+
+import server
+
+ADMIN = "Basic " + base64.b64encode(b"admin:admin123").decode()
+
+
+async def _exchange(report_server, raw, close_write=False):
+    """Send ``raw`` to a fresh connection and return everything sent back, plus any unhandled task errors"""
+    loop = asyncio.get_running_loop()
+    errors = []
+    loop.set_exception_handler(lambda _, context: errors.append(context))
+    listener = await asyncio.start_server(report_server.handle_connection, "127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    async with listener:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        if close_write:
+            writer.write_eof()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+        # Give the connection handler time to finish
+        await asyncio.sleep(0.05)
+    return response, errors
+
+
+@pytest.fixture
+def report_server(db):
+    instance = server.ReportServer(db, workers=2, max_waiting=8, wait_timeout=1.0, max_connections=8)
+    yield instance
+    instance.close()
+
+
+def test_truncated_body_ends_the_connection_quietly(report_server):
+    raw = (b"POST /reports HTTP/1.1\r\nAuthorization: " + ADMIN.encode() +
+           b"\r\nContent-Length: 100\r\n\r\n{\"issue_type\"")
+    response, errors = asyncio.run(_exchange(report_server, raw, close_write=True))
+    assert response == b""
+    assert errors == []
+
+
+def test_stalled_body_times_out(report_server, monkeypatch):
+    monkeypatch.setattr(server, "KEEP_ALIVE_TIMEOUT", 0.2)
+    raw = b"POST /reports HTTP/1.1\r\nAuthorization: " + ADMIN.encode() + b"\r\nContent-Length: 100\r\n\r\n{"
+    response, errors = asyncio.run(_exchange(report_server, raw))
+    assert response.startswith(b"HTTP/1.1 408 ")
+    assert errors == []
+
+
+def test_chunked_body_is_refused(report_server):
+    raw = (b"POST /reports HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+           b"5\r\nhello\r\n0\r\n\r\n")
+    response, errors = asyncio.run(_exchange(report_server, raw))
+    assert response.startswith(b"HTTP/1.1 501 ")
+    # The connection closes instead of reading the chunks as another request
+    assert response.count(b"HTTP/1.1") == 1
+
+
+def test_handler_exception_is_answered_with_500(report_server, monkeypatch, caplog):
+    def broken(user):
+        raise KeyError("missing")
+
+    monkeypatch.setattr(report_server.service, "stats", broken)
+    raw = b"GET /stats HTTP/1.1\r\nAuthorization: " + ADMIN.encode() + b"\r\nConnection: close\r\n\r\n"
+    response, errors = asyncio.run(_exchange(report_server, raw))
+    assert response.startswith(b"HTTP/1.1 500 ")
+    assert b"Internal server error" in response
+    assert "GET /stats failed" in caplog.text
+    assert errors == []
+
+
+def test_photo_upload_is_stored(db, tmp_path):
+    from attachments import AttachmentStore
+    from storage import ReportRepository
+
+    store = AttachmentStore(str(tmp_path / "attachments"))
+    report_server = server.ReportServer(db, workers=2, max_waiting=8, wait_timeout=1.0, max_connections=8,
+                                        attachment_store=store)
+    report_id = ReportRepository(db).create(1, "Road Damage", "High", "Pothole", "Main Street 12")
+    photo = b"\xff\xd8\xff" + b"\x00" * 200000
+    raw = (f"POST /reports/{report_id}/attachments?filename=hole.jpg HTTP/1.1\r\nAuthorization: {ADMIN}\r\n"
+           f"Content-Length: {len(photo)}\r\nConnection: close\r\n\r\n").encode() + photo
+    try:
+        response, errors = asyncio.run(_exchange(report_server, raw))
+    finally:
+        report_server.close()
+    assert response.startswith(b"HTTP/1.1 201 ")
+    assert errors == []
+    assert len(os.listdir(store.temp_dir)) == 0
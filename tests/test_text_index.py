@@ -0,0 +1,53 @@
+import math
+
+import archive
+import migrations
+import text_index
+from storage import ReportRepository
+
+
+def test_multi_term_search_finds_matches_past_the_candidate_cap(db, monkeypatch):
+    monkeypatch.setattr(text_index, "MAX_CANDIDATES", 5)
+    reports = ReportRepository(db)
+    # "culvert" is the rarer term; these postings outweigh the one full match
+    for n in range(8):
+        reports.create(1, "Water Issue", "Low", f"Blocked drain {n}", f"Culvert culvert lane {n}")
+    wanted = reports.create(1, "Water Issue", "Low", "Blocked culvert", "Riverside bridge")
+    for n in range(12):
+        reports.create(1, "Road Damage", "Low", f"Cracked deck {n}", f"Riverside bridge {n}")
+
+    rows = reports.search_text("culvert bridge", 10)
+    assert [row[0] for row in rows] == [wanted]
+
+
+def _documents(db, index):
+    with db.cursor() as cursor:
+        db.execute(cursor, f"SELECT doc_count FROM {index.stats} WHERE term = %s", (text_index.DOCUMENTS,))
+        return cursor.fetchone()[0]
+
+
+def test_document_counts_follow_archival(db):
+    reports = ReportRepository(db)
+    ids = [reports.create(1, "Water Issue", "Low", f"Burst main {n}", f"Valley road {n}") for n in range(6)]
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, "UPDATE reports SET status = 'Resolved' WHERE id <= %s", (ids[3],))
+        db.execute(cursor, "UPDATE reports SET updated_at = '2020-01-01 00:00:00' WHERE id <= %s", (ids[3],))
+    archive.archive_closed(db, pause=0)
+
+    # Ranking uses the reports left in each index, not the highest id ever issued
+    assert _documents(db, text_index.REPORTS) == 2
+    assert _documents(db, text_index.ARCHIVE) == 4
+    sql, _ = text_index.search_statement(db, "r.id", ["valley", "burst"], 10)
+    assert f"{math.log(1 + 2 / 2):.6f}" in sql
+
+
+def test_migration_counts_documents_already_indexed(db):
+    reports = ReportRepository(db)
+    for n in range(3):
+        reports.create(1, "Water Issue", "Low", f"Burst main {n}", f"Valley road {n}")
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, f"DELETE FROM {text_index.REPORTS.stats} WHERE term = %s", (text_index.DOCUMENTS,))
+        for statement in next(m for m in migrations.MIGRATIONS if m.version == 12).statements["sqlite"]:
+            db.execute(cursor, statement)
+    assert _documents(db, text_index.REPORTS) == 3
+    assert _documents(db, text_index.ARCHIVE) == 0
@@ -0,0 +1,161 @@
+import time
+import threading
+
+import pytest
+
+import passwords
+from passwords import HasherBusyError, PasswordHasher
+from storage import Database, ReportRepository, UserRepository
+
+
+def calls(db, name):
+    return dict((row[0], row[1]) for row in db.statements.snapshot())[name]
+
+
+def test_permission_checks_are_served_from_the_cache(db):
+    users = UserRepository(db)
+    reports = ReportRepository(db)
+    author = users.create("author", "secret-password")
+    moderator = users.create("moderator", "secret-password", role="admin")
+    report_id = reports.create(author, "Road Damage", "High", "Pothole", "Main Street 12")
+    reports.get_detail(report_id, moderator)
+    looked_up = calls(db, "users.by_id")
+
+    db.report_cache.clear()
+    assert reports.get_detail(report_id, moderator) is not None
+    assert calls(db, "users.by_id") == looked_up
+
+
+def test_demoted_admin_loses_access_once_the_role_expires(db):
+    users = UserRepository(db)
+    reports = ReportRepository(db)
+    author = users.create("author", "secret-password")
+    moderator = users.create("moderator", "secret-password", role="admin")
+    report_id = reports.create(author, "Road Damage", "High", "Pothole", "Main Street 12")
+    assert reports.get_detail(report_id, moderator) is not None
+
+    # Another process demotes the moderator; this process's cache still says admin
+    other = Database(db.backend, hash_workers=0)
+    try:
+        UserRepository(other).set_role("moderator", "user")
+    finally:
+        other.close()
+    assert users.get_role(moderator) == "admin"
+
+    roles = db.user_cache.roles
+    roles._clock = lambda: time.monotonic() + roles.ttl + 1
+    assert users.get_role(moderator) == "user"
+    assert reports.get_detail(report_id, moderator) is None
+    # The longer-lived display entry is untouched by the role TTL
+    assert db.user_cache.by_id.ttl > roles.ttl
+
+
+def test_role_change_in_this_process_applies_at_once(db):
+    users = UserRepository(db)
+    moderator = users.create("moderator", "secret-password", role="admin")
+    assert users.get_role(moderator) == "admin"
+    users.set_role("moderator", "user")
+    assert users.get_role(moderator) == "user"
+
+
+def _stored_password(db, username):
+    with db.cursor() as cursor:
+        db.execute(cursor, "SELECT password FROM users WHERE username = %s", (username,))
+        return cursor.fetchone()[0]
+
+
+def _insert_plaintext(db, username, password):
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, "INSERT INTO users (username, password, role) VALUES (%s, %s, 'user')",
+                   (username, password))
+
+
+def test_plaintext_row_verifies_and_is_rehashed(db):
+    _insert_plaintext(db, "legacy", "old-secret")
+    users = UserRepository(db)
+    assert users.authenticate("legacy", "wrong") is None
+    assert _stored_password(db, "legacy") == "old-secret"
+
+    assert users.authenticate("legacy", "old-secret") is not None
+    stored = _stored_password(db, "legacy")
+    assert passwords.is_hashed(stored) and not db.passwords.needs_rehash(stored)
+    assert passwords.verify_password("old-secret", stored)
+
+
+def test_rehash_loses_to_a_concurrent_password_reset(db, monkeypatch):
+    _insert_plaintext(db, "legacy", "old-secret")
+    users = UserRepository(db)
+    hash_password = db.passwords.hash
+
+    def reset_meanwhile(password):
+        # Another process resets the password while this login is hashing
+        other = Database(db.backend, hash_workers=0, password_cost=2)
+        try:
+            UserRepository(other).set_password("legacy", "new-secret")
+        finally:
+            other.close()
+        return hash_password(password)
+
+    monkeypatch.setattr(db.passwords, "hash", reset_meanwhile)
+    assert users.authenticate("legacy", "old-secret") is not None
+    monkeypatch.undo()
+
+    stored = _stored_password(db, "legacy")
+    assert passwords.verify_password("new-secret", stored)
+    assert not passwords.verify_password("old-secret", stored)
+
+
+def test_raising_the_cost_rehashes_at_next_login(db):
+    UserRepository(db).create("resident", "secret-password")
+    before = _stored_password(db, "resident")
+
+    stronger = Database(db.backend, hash_workers=0, password_cost=db.passwords.cost + 1)
+    try:
+        assert UserRepository(stronger).authenticate("resident", "secret-password") is not None
+        after = _stored_password(db, "resident")
+        assert after != before
+        assert db.passwords.needs_rehash(after) and not stronger.passwords.needs_rehash(after)
+    finally:
+        stronger.close()
+
+
+def test_unknown_user_is_checked_against_a_dummy_hash(db, monkeypatch):
+    users = UserRepository(db)
+    checked = []
+    verify = passwords.verify_password
+
+    def recording_verify(password, stored):
+        checked.append(stored)
+        return verify(password, stored)
+
+    monkeypatch.setattr(passwords, "verify_password", recording_verify)
+
+    assert users.authenticate("nobody", "guess") is None
+    assert users.authenticate("nobody-else", "guess") is None
+    # One throwaway hash, made once and checked like a real one each time
+    assert len(checked) == 2 and checked[0] == checked[1]
+    assert passwords.is_hashed(checked[0])
+
+
+def test_busy_hasher_refuses_more_checks_than_max_pending(monkeypatch):
+    hasher = PasswordHasher(cost=2, workers=0, max_pending=1, wait_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_verify(password, stored):
+        started.set()
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(passwords, "verify_password", slow_verify)
+    stored = passwords.hash_password("secret", 2)
+    first = threading.Thread(target=hasher.verify, args=("secret", stored))
+    first.start()
+    try:
+        assert started.wait(5)
+        with pytest.raises(HasherBusyError):
+            hasher.verify("other", stored)
+        assert hasher.stats()["rejected"] == 1
+    finally:
+        release.set()
+        first.join()
+    hasher.close()
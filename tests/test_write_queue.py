@@ -0,0 +1,59 @@
+import pytest
+
+import write_queue
+from storage import ReportRepository, UserRepository
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def queue(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(write_queue, "RETRY_DELAY", 0.01)
+    instance = WriteQueue(db, str(tmp_path / "submissions.db"), max_batch=50, max_delay=0.01).start()
+    yield instance
+    instance.close()
+
+
+def test_submit_rejects_what_the_reports_table_cannot_hold(queue):
+    with pytest.raises(ValueError):
+        queue.submit(1, "Road Damage", "High", "Pothole", "x" * 256)
+    with pytest.raises(ValueError):
+        queue.submit(1, "Road Damage", "High", "   ", "Main Street")
+    with pytest.raises(ValueError):
+        queue.submit("1", "Road Damage", "High", "Pothole", "Main Street")
+    assert queue.pending == 0
+
+
+def test_batch_with_one_invalid_row_fails_only_that_row(db, queue):
+    doomed = UserRepository(db).create("doomed", "secret-password")
+    tickets = [queue.submit(1, "Road Damage", "High", f"Pothole {n}", f"Main Street {n}") for n in range(3)]
+    bad = queue.submit(doomed, "Water Issue", "Low", "Burst pipe", "Hill Road 4")
+    tickets += [queue.submit(1, "Power Outage", "High", f"Outage {n}", f"Lake Road {n}") for n in range(3)]
+    # The user disappears before the batch is written, so its insert breaks the foreign key
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, "DELETE FROM users WHERE id = %s", (doomed,))
+
+    for ticket in tickets:
+        assert queue.wait_for(ticket, 5) is not None
+    assert queue.wait_for(bad, 5) is None
+    _, report_id, error = queue.lookup(bad)
+    assert report_id is None and "FOREIGN KEY" in error
+    assert queue.pending == 0
+    assert queue.stats["rejected"] == 1
+    assert ReportRepository(db).get_detail(queue.lookup(tickets[-1])[1]) is not None
+
+
+def test_unexpected_error_does_not_stop_the_flusher(queue, monkeypatch):
+    calls = []
+    original = queue.reports.create_ticketed
+
+    def flaky(tickets, rows):
+        calls.append(len(tickets))
+        if len(calls) == 1:
+            raise KeyError("boom")
+        return original(tickets, rows)
+
+    monkeypatch.setattr(queue.reports, "create_ticketed", flaky)
+    ticket = queue.submit(1, "Road Damage", "High", "Pothole", "Main Street")
+    assert queue.wait_for(ticket, 5) is not None
+    assert queue.stats["failures"] == 1
+    assert queue._thread.is_alive()
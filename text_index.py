@@ -0,0 +1,182 @@
+"""Inverted keyword index over report location and description text
+
+Used by backends without a native full-text engine. Every report contributes
+one posting per distinct term to ``report_terms`` (weighted so a location
+match outranks a description match), and ``report_term_stats`` keeps each
+term's document frequency so queries can start from the rarest term, and
+under ``DOCUMENTS`` the number of reports indexed, which ranking uses as N.
+Archived reports are indexed the same way in their own pair of tables
+(``ARCHIVE``), so each index only ever covers one table of reports.
+"""
+
+import re
+import math
+import logging
+from collections import namedtuple
+
+# Weight of one occurrence of a term in each indexed field
+LOCATION_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+# Multi-term queries rank at most this many of the reports matching every
+# term, which bounds the cost of very common terms. Results are exact up to
+# this many matches; beyond it only those with the rarest term's highest
+# weights (newest first among equals) are ranked.
+MAX_CANDIDATES = 10000
+
+STOPWORDS = frozenset("""
+    a an and are as at be by for from has in is it its of on or that the there
+    this to was were will with near next
+""".split())
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+# Stats row counting the documents in an index; no token can take this form
+DOCUMENTS = "#documents"
+
+
+class Index(namedtuple("Index", ["documents", "terms", "stats"])):
+    """The table of reports an index covers, its postings table and its term statistics table"""
+
+
+REPORTS = Index("reports", "report_terms", "report_term_stats")
+ARCHIVE = Index("reports_archive", "archive_terms", "archive_term_stats")
+
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stopwords and single characters"""
+    return [token for token in _TOKEN.findall(text.lower()) if len(token) > 1 and token not in STOPWORDS]
+
+
+def query_terms(query):
+    """Return the distinct terms of a search query, in order"""
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def term_weights(description, location):
+    """Return {term: weight} for one report"""
+    weights = {}
+    for term in tokenize(location):
+        weights[term] = weights.get(term, 0) + LOCATION_WEIGHT
+    for term in tokenize(description):
+        weights[term] = weights.get(term, 0) + DESCRIPTION_WEIGHT
+    return weights
+
+
+def add_document(db, cursor, report_id, description, location, index=REPORTS):
+    """Index one report inside the caller's transaction"""
+    weights = term_weights(description, location)
+    if not weights:
+        return
+    cursor.executemany(
+        db.backend.adapt(f"INSERT INTO {index.terms} (term, report_id, weight) VALUES (%s, %s, %s)"),
+        [(term, report_id, weight) for term, weight in weights.items()]
+    )
+    cursor.executemany(
+        db.backend.adapt(f"""
+            INSERT INTO {index.stats} (term, doc_count) VALUES (%s, 1)
+            ON CONFLICT (term) DO UPDATE SET doc_count = doc_count + 1
+        """),
+        [(term,) for term in weights] + [(DOCUMENTS,)]
+    )
+
+
+def remove_document(db, cursor, report_id, index=REPORTS):
+    """Drop one report's postings inside the caller's transaction"""
+    db.execute(cursor, f"SELECT term FROM {index.terms} WHERE report_id = %s", (report_id,))
+    terms = [row[0] for row in cursor.fetchall()]
+    if not terms:
+        return
+    db.execute(cursor, f"DELETE FROM {index.terms} WHERE report_id = %s", (report_id,))
+    cursor.executemany(
+        db.backend.adapt(f"UPDATE {index.stats} SET doc_count = doc_count - 1 WHERE term = %s"),
+        [(term,) for term in terms] + [(DOCUMENTS,)]
+    )
+
+
+def move_document(db, cursor, report_id, description, location, source, target):
+    """Move one report's postings from the ``source`` index to ``target`` inside the caller's transaction"""
+    remove_document(db, cursor, report_id, source)
+    add_document(db, cursor, report_id, description, location, target)
+
+
+def rebuild(db, batch_size=5000, index=REPORTS):
+    """Re-index every report from scratch and return the number indexed"""
+    with db.cursor(commit=True) as cursor:
+        db.execute(cursor, f"DELETE FROM {index.terms}")
+        db.execute(cursor, f"DELETE FROM {index.stats}")
+
+    indexed, last_id = 0, 0
+    while True:
+        with db.cursor(commit=True) as cursor:
+            db.execute(
+                cursor,
+                f"SELECT id, description, location FROM {index.documents} WHERE id > %s ORDER BY id LIMIT %s",
+                (last_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            for report_id, description, location in rows:
+                add_document(db, cursor, report_id, description, location, index)
+        if not rows:
+            return indexed
+        indexed += len(rows)
+        last_id = rows[-1][0]
+
+
+def search_statement(db, fields, terms, limit, index=REPORTS):
+    """Build the ranked query selecting ``fields`` for ``terms`` and return (sql, params)
+
+    Every term must match. The query walks the rarest term's postings,
+    probes the others by primary key and ranks the first MAX_CANDIDATES
+    reports that match them all, so its cost is bounded whatever the table
+    size. Scores are summed weight times inverse document frequency. When
+    the rarest term alone is in more than MAX_CANDIDATES reports, the
+    results may be incomplete, and that is logged.
+    """
+    with db.cursor() as cursor:
+        placeholders = ", ".join(["%s"] * (len(terms) + 1))
+        db.execute(cursor, f"SELECT term, doc_count FROM {index.stats} WHERE term IN ({placeholders})",
+                   list(terms) + [DOCUMENTS])
+        frequencies = dict(cursor.fetchall())
+    # The index's own document count, which archiving and deletes keep exact
+    total = frequencies.pop(DOCUMENTS, 0) or 1
+
+    # A term nobody used can never match, so search for it alone to return nothing quickly
+    unused = [term for term in terms if frequencies.get(term, 0) <= 0]
+    terms = unused[:1] or sorted(terms, key=lambda term: frequencies[term])
+
+    if len(terms) > 1 and frequencies[terms[0]] > MAX_CANDIDATES:
+        logging.info(f"Keyword search {terms}: '{terms[0]}' is in {frequencies[terms[0]]} reports; results are"
+                     f" ranked from the first {MAX_CANDIDATES} matching every term and may be incomplete")
+
+    score = [f"p0.weight * {math.log(1 + total / max(frequencies.get(terms[0], 0), 1)):.6f}"]
+    joins, params = [], []
+    for position, term in enumerate(terms[1:], start=1):
+        alias = f"p{position}"
+        idf = math.log(1 + total / frequencies[term])
+        score.append(f"{alias}.weight * {idf:.6f}")
+        joins.append(f"CROSS JOIN {index.terms} {alias} ON {alias}.term = %s AND {alias}.report_id = p0.report_id")
+        params.append(term)
+
+    # Reports matching every term, walked off the (term, weight, report_id)
+    # index; a single term is already in rank order, so it needs only ``limit``
+    matches = f"""
+        SELECT p0.report_id, {' + '.join(score)} AS score
+        FROM {index.terms} p0
+        {' '.join(joins)}
+        WHERE p0.term = %s
+        ORDER BY p0.weight DESC, p0.report_id DESC
+        LIMIT %s
+    """
+    params += [terms[0], limit if len(terms) == 1 else MAX_CANDIDATES]
+    if len(terms) > 1:
+        matches = f"SELECT report_id, score FROM ({matches}) matches ORDER BY score DESC, report_id DESC LIMIT %s"
+        params.append(limit)
+    sql = f"""
+        SELECT {fields}
+        FROM ({matches}) ranked
+        JOIN {index.documents} r ON r.id = ranked.report_id
+        JOIN users u ON r.user_id = u.id
+        ORDER BY ranked.score DESC, ranked.report_id DESC
+    """
+    return sql, tuple(params)
@@ -0,0 +1,314 @@
+"""Group-commit write queue for report submissions
+
+``submit`` records the report in a local SQLite journal, which is synced to
+disk before it returns, and hands back a ticket straight away. A background
+thread drains the journal into the reports table with multi-row inserts and
+one commit per batch. A batch goes out once ``max_batch`` submissions are
+waiting or the oldest has waited ``max_delay`` seconds. The report id assigned
+to each ticket is written back to the journal, where ``lookup`` finds it.
+
+Submissions survive a crash. Unflushed tickets are replayed when the queue
+starts again, and the ``ticket`` column on reports stops a batch committed
+just before the crash from being inserted twice.
+
+A batch the database keeps rejecting while it is otherwise reachable (a
+user deleted since the submission, say) is written one submission at a
+time after ``MAX_ATTEMPTS`` tries. Each submission it still rejects is
+marked failed in the journal, with the error, so the tickets behind it are
+not held up.
+"""
+
+import time
+import uuid
+import sqlite3
+import logging
+import datetime
+import threading
+
+from db_pool import PoolTimeoutError
+from storage import (
+    ISSUE_TYPES, MAX_DESCRIPTION_BYTES, MAX_LOCATION_LENGTH, SEVERITIES, StorageError, ReportRepository
+)
+
+DEFAULT_JOURNAL = "submissions.db"
+DEFAULT_MAX_BATCH = 500
+DEFAULT_MAX_DELAY = 0.2
+
+# Seconds to wait before retrying after the database rejected a batch
+RETRY_DELAY = 2.0
+
+# Failed tries of a batch before its submissions are written one at a time
+MAX_ATTEMPTS = 3
+
+# Flushed tickets are kept this long so clients can still look them up
+JOURNAL_RETENTION = datetime.timedelta(days=7)
+
+JOURNAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS submissions (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket TEXT NOT NULL UNIQUE,
+        user_id INTEGER NOT NULL,
+        issue_type TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        description TEXT NOT NULL,
+        location TEXT NOT NULL,
+        accepted_at TIMESTAMP NOT NULL,
+        report_id INTEGER,
+        flushed_at TIMESTAMP,
+        failed_at TIMESTAMP,
+        error TEXT
+    )
+"""
+
+# Added after the first release; older journals get them on open
+JOURNAL_ADDED_COLUMNS = (("failed_at", "TIMESTAMP"), ("error", "TEXT"))
+
+PENDING = "report_id IS NULL AND failed_at IS NULL"
+
+
+class WriteQueue:
+    """Accepts report submissions at once and writes them to the database in batches"""
+
+    def __init__(self, db, journal_path=DEFAULT_JOURNAL, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY):
+        if max_batch < 1:
+            raise ValueError("Batch size must be at least 1")
+        self.db = db
+        self.reports = ReportRepository(db)
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = {"accepted": 0, "flushed": 0, "batches": 0, "failures": 0, "rejected": 0}
+
+        self._journal = sqlite3.connect(
+            journal_path, isolation_level=None, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self._journal.execute("PRAGMA journal_mode = WAL")
+        # Every accepted ticket is on disk before submit() returns
+        self._journal.execute("PRAGMA synchronous = FULL")
+        self._journal.execute(JOURNAL_SCHEMA)
+        columns = {row[1] for row in self._journal.execute("PRAGMA table_info(submissions)")}
+        for column, kind in JOURNAL_ADDED_COLUMNS:
+            if column not in columns:
+                self._journal.execute(f"ALTER TABLE submissions ADD COLUMN {column} {kind}")
+        self._journal.execute("CREATE INDEX IF NOT EXISTS submissions_pending ON submissions (report_id, seq)")
+        self._journal_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Condition()
+        self._flushed = threading.Condition()
+
+        self._pending = self._journal.execute(f"SELECT COUNT(*) FROM submissions WHERE {PENDING}").fetchone()[0]
+        # Anything left over from a previous run is due immediately
+        self._oldest = time.monotonic() - max_delay if self._pending else None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        """Prune old tickets and start the background flusher"""
+        with self._journal_lock:
+            self._journal.execute(
+                "DELETE FROM submissions WHERE (report_id IS NOT NULL AND flushed_at < ?) OR failed_at < ?",
+                (datetime.datetime.now() - JOURNAL_RETENTION,) * 2
+            )
+        if self._pending:
+            logging.info(f"Write queue replaying {self._pending} unflushed submission(s)")
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, user_id, issue_type, severity, description, location):
+        """Durably accept one report and return its ticket
+
+        Raises ValueError for a submission the reports table could not hold,
+        since it would otherwise only fail once its batch is written.
+        """
+        if not isinstance(user_id, int):
+            raise ValueError(f"Invalid user id {user_id!r}")
+        if issue_type not in ISSUE_TYPES:
+            raise ValueError(f"Unknown issue type '{issue_type}'")
+        if severity not in SEVERITIES:
+            raise ValueError(f"Unknown severity '{severity}'")
+        if not isinstance(description, str) or not description.strip():
+            raise ValueError("The description must not be empty")
+        if not isinstance(location, str) or not location.strip():
+            raise ValueError("The location must not be empty")
+        if len(location) > MAX_LOCATION_LENGTH:
+            raise ValueError(f"The location is longer than {MAX_LOCATION_LENGTH} characters")
+        if len(description.encode()) > MAX_DESCRIPTION_BYTES:
+            raise ValueError(f"The description is longer than {MAX_DESCRIPTION_BYTES} bytes")
+        ticket = uuid.uuid4().hex
+        accepted_at = datetime.datetime.now().replace(microsecond=0)
+        with self._journal_lock:
+            self._journal.execute(
+                "INSERT INTO submissions (ticket, user_id, issue_type, severity, description, location, accepted_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (ticket, user_id, issue_type, severity, description, location, accepted_at)
+            )
+        with self._wake:
+            self._pending += 1
+            self.stats["accepted"] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._pending >= self.max_batch or self._pending == 1:
+                self._wake.notify()
+        return ticket
+
+    def lookup(self, ticket):
+        """Return (user_id, report_id, error) for a ticket
+
+        report_id is None until flushed; error is set instead if the database
+        rejected the submission. Raises KeyError for an unknown or expired
+        ticket.
+        """
+        with self._journal_lock:
+            row = self._journal.execute(
+                "SELECT user_id, report_id, error FROM submissions WHERE ticket = ?", (ticket,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(ticket)
+        return row
+
+    def wait_for(self, ticket, timeout):
+        """Return the report id of a ticket, waiting up to ``timeout`` seconds for its batch
+
+        Returns None at once for a rejected submission.
+        """
+        deadline = time.monotonic() + timeout
+        with self._flushed:
+            while True:
+                _, report_id, error = self.lookup(ticket)
+                remaining = deadline - time.monotonic()
+                if report_id is not None or error is not None or remaining <= 0:
+                    return report_id
+                self._flushed.wait(remaining)
+
+    @property
+    def pending(self):
+        with self._wake:
+            return self._pending
+
+    def flush(self):
+        """Write every pending submission now; returns the number flushed"""
+        total = 0
+        while True:
+            flushed = self._flush_batch()
+            total += flushed
+            if flushed < self.max_batch:
+                return total
+
+    def close(self):
+        """Stop the flusher after writing everything still pending"""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        except (StorageError, PoolTimeoutError) as err:
+            logging.error(f"Write queue closed with {self.pending} submission(s) unflushed: {err}")
+        self._journal.close()
+
+    def _due_in(self):
+        """Seconds until the next batch is due, 0 if now, None if nothing is pending"""
+        if not self._pending:
+            return None
+        if self._pending >= self.max_batch:
+            return 0
+        return max(0.0, self._oldest + self.max_delay - time.monotonic())
+
+    def _run(self):
+        attempts = 0
+        while True:
+            with self._wake:
+                while not self._stopping and self._due_in() != 0:
+                    self._wake.wait(self._due_in())
+                if self._stopping:
+                    return
+            try:
+                self._flush_batch(isolate=attempts >= MAX_ATTEMPTS and self._database_reachable())
+                attempts = 0
+            except (StorageError, PoolTimeoutError) as err:
+                attempts += 1
+                self.stats["failures"] += 1
+                logging.error(f"Write queue flush failed, retrying in {RETRY_DELAY}s: {err}")
+            except Exception:
+                # Keep the flusher alive; the journal still holds every ticket
+                attempts += 1
+                self.stats["failures"] += 1
+                logging.exception(f"Write queue flush failed unexpectedly, retrying in {RETRY_DELAY}s")
+            else:
+                continue
+            with self._wake:
+                self._wake.wait(RETRY_DELAY)
+
+    def _database_reachable(self):
+        try:
+            with self.db.cursor() as cursor:
+                self.db.execute(cursor, "SELECT 1")
+                cursor.fetchone()
+        except (StorageError, PoolTimeoutError):
+            return False
+        return True
+
+    def _flush_batch(self, isolate=False):
+        """Insert the oldest pending submissions in one transaction and record their ids
+
+        With ``isolate`` each submission gets its own transaction, and those
+        the database rejects while it is reachable are marked failed.
+        """
+        with self._flush_lock:
+            with self._journal_lock:
+                batch = self._journal.execute(
+                    "SELECT ticket, user_id, issue_type, severity, description, location, accepted_at"
+                    f" FROM submissions WHERE {PENDING} ORDER BY seq LIMIT ?",
+                    (self.max_batch,)
+                ).fetchall()
+            if not batch:
+                return 0
+
+            tickets = [row[0] for row in batch]
+            rows = [(user_id, issue_type, severity, description, location, "Pending", accepted_at, accepted_at)
+                    for _, user_id, issue_type, severity, description, location, accepted_at in batch]
+            errors = {}
+            if not isolate:
+                ids = self.reports.create_ticketed(tickets, rows)
+            else:
+                ids = {}
+                for ticket, row in zip(tickets, rows):
+                    try:
+                        ids.update(self.reports.create_ticketed([ticket], [row]))
+                    except StorageError as err:
+                        if not self._database_reachable():
+                            # An outage, not this row; what was written is found again by ticket
+                            raise
+                        errors[ticket] = str(err)
+                        logging.error(f"Write queue rejected submission {ticket}: {err}")
+
+            flushed_at = datetime.datetime.now()
+            with self._journal_lock:
+                self._journal.execute("BEGIN")
+                self._journal.executemany(
+                    "UPDATE submissions SET report_id = ?, flushed_at = ? WHERE ticket = ?",
+                    [(ids[ticket], flushed_at, ticket) for ticket in tickets if ticket not in errors]
+                )
+                self._journal.executemany(
+                    "UPDATE submissions SET failed_at = ?, error = ? WHERE ticket = ?",
+                    [(flushed_at, error, ticket) for ticket, error in errors.items()]
+                )
+                self._journal.execute("COMMIT")
+
+            with self._wake:
+                self._pending -= len(batch)
+                self.stats["flushed"] += len(batch) - len(errors)
+                self.stats["rejected"] += len(errors)
+                self.stats["batches"] += 1
+                if not self._pending:
+                    self._oldest = None
+                elif len(batch) == self.max_batch:
+                    # A backlog is waiting; keep draining without a pause
+                    self._oldest = time.monotonic() - self.max_delay
+                else:
+                    # Only submissions that arrived during this flush are left
+                    self._oldest = time.monotonic()
+            with self._flushed:
+                self._flushed.notify_all()
+            return len(batch)